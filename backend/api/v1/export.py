@@ -1,6 +1,7 @@
 """Export API endpoints."""
 
 import logging
+import os
 import re
 from datetime import datetime
 from pathlib import Path
@@ -109,12 +110,22 @@ async def download_export(filename: str):
 async def list_exports():
     """List all available export files."""
     exports = []
-    for file_path in EXPORTS_DIR.glob("*.csv"):
+    # One scandir pass with a suffix check, and one stat per export
+    try:
+        with os.scandir(EXPORTS_DIR) as entries:
+            csv_files = [
+                entry for entry in entries if entry.name.endswith(".csv") and entry.is_file()
+            ]
+    except FileNotFoundError:
+        csv_files = []
+
+    for entry in csv_files:
+        stat = entry.stat()
         exports.append({
-            "filename": file_path.name,
-            "size": file_path.stat().st_size,
-            "created_at": datetime.fromtimestamp(file_path.stat().st_ctime),
-            "download_url": f"/exports/{file_path.name}",
+            "filename": entry.name,
+            "size": stat.st_size,
+            "created_at": datetime.fromtimestamp(stat.st_ctime),
+            "download_url": f"/exports/{entry.name}",
         })
 
     return {"exports": sorted(exports, key=lambda x: x["created_at"], reverse=True)}
@@ -207,15 +218,15 @@ async def export_session_with_media(
 @router.get("/anki-connect/status", response_model=AnkiConnectStatusResponse)
 async def anki_connect_status():
     """Check if AnkiConnect is reachable and list available decks."""
-    client = AnkiConnectClient(url=ANKI_CONNECT_URL)
-    available, version = await client.is_available()
+    async with AnkiConnectClient(url=ANKI_CONNECT_URL) as client:
+        available, version = await client.is_available()
 
-    decks = []
-    if available:
-        try:
-            decks = await client.get_decks()
-        except AnkiConnectError:
-            pass
+        decks = []
+        if available:
+            try:
+                decks = await client.get_decks()
+            except AnkiConnectError:
+                pass
 
     return AnkiConnectStatusResponse(
         available=available,
@@ -234,8 +245,17 @@ async def export_to_anki_connect(
     db: Session = Depends(get_db),
 ):
     """Export cards directly to Anki via AnkiConnect."""
-    client = AnkiConnectClient(url=ANKI_CONNECT_URL)
+    async with AnkiConnectClient(url=ANKI_CONNECT_URL) as client:
+        return await _export_to_anki_connect(client, session_id, request, db)
+
 
+async def _export_to_anki_connect(
+    client: AnkiConnectClient,
+    session_id: int,
+    request: AnkiConnectExportRequest,
+    db: Session,
+) -> AnkiConnectExportResponse:
+    """Send a session's cards and media through an open AnkiConnect client."""
     # Check AnkiConnect is reachable
     available, _ = await client.is_available()
     if not available:
@@ -292,21 +312,27 @@ async def export_to_anki_connect(
     except AnkiConnectError as e:
         raise HTTPException(status_code=502, detail=f"Failed to create deck: {e}")
 
-    # 2. Store media files
-    images_sent = 0
-    for img in card_images:
-        stored = img.stored_filename
+    # 2. Store media files (batched into as few requests as possible)
+    media_files = []
+    for stored in dict.fromkeys(img.stored_filename for img in card_images):
         if not stored:
             continue
         src_path = IMAGE_STORAGE_DIR / stored
         if not src_path.exists():
             errors.append(f"Image file not found: {stored}")
             continue
-        try:
-            await client.store_media_from_path(stored, src_path)
-            images_sent += 1
-        except AnkiConnectError as e:
-            errors.append(f"Failed to store image {stored}: {e}")
+        media_files.append((stored, src_path))
+
+    images_sent = 0
+    try:
+        media_errors = await client.store_media_files(media_files)
+        images_sent = len(media_files) - len(media_errors)
+        errors.extend(
+            f"Failed to store image {stored}: {error}"
+            for stored, error in media_errors.items()
+        )
+    except AnkiConnectError as e:
+        errors.append(f"Failed to store images: {e}")
 
     # 3. Build and send notes
     image_pattern = re.compile(r'\[IMAGE:\s*([^\]]+)\]')
@@ -333,7 +359,7 @@ async def export_to_anki_connect(
         })
 
     try:
-        results = await client.add_notes(notes)
+        results = await client.add_notes_batched(notes)
     except AnkiConnectError as e:
         raise HTTPException(status_code=502, detail=f"Failed to add notes: {e}")
 
@@ -10,7 +10,7 @@ from sqlalchemy.orm import Session
 from backend.db.database import get_db
 from backend.db.models import CardImage
 from backend.db.models import Session as DBSession
-from config.settings import CARD_IMAGES_DIR
+from config.settings import CARD_IMAGES_DIR, IMAGE_MEDIA_TYPES
 
 router = APIRouter()
 
@@ -77,15 +77,9 @@ async def get_image(
         raise HTTPException(status_code=404, detail="Image not found")
 
     # Determine media type
-    suffix = image_path.suffix.lower()
-    media_types = {
-        ".png": "image/png",
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".gif": "image/gif",
-        ".webp": "image/webp",
-    }
-    media_type = media_types.get(suffix, "application/octet-stream")
+    media_type = IMAGE_MEDIA_TYPES.get(
+        image_path.suffix[1:].lower(), "application/octet-stream"
+    )
 
     return FileResponse(
         path=image_path,
@@ -131,15 +125,9 @@ async def get_original_image(
         if card_image:
             image_path = IMAGE_STORAGE_DIR / card_image.stored_filename
             if image_path.exists():
-                suffix = image_path.suffix.lower()
-                media_types = {
-                    ".png": "image/png",
-                    ".jpg": "image/jpeg",
-                    ".jpeg": "image/jpeg",
-                    ".gif": "image/gif",
-                    ".webp": "image/webp",
-                }
-                media_type = media_types.get(suffix, "application/octet-stream")
+                media_type = IMAGE_MEDIA_TYPES.get(
+                    image_path.suffix[1:].lower(), "application/octet-stream"
+                )
                 return FileResponse(
                     path=image_path,
                     media_type=media_type,
@@ -157,15 +145,9 @@ async def get_original_image(
             raise HTTPException(status_code=404, detail="Image not found")
 
     # Determine media type
-    suffix = image_path.suffix.lower()
-    media_types = {
-        ".png": "image/png",
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".gif": "image/gif",
-        ".webp": "image/webp",
-    }
-    media_type = media_types.get(suffix, "application/octet-stream")
+    media_type = IMAGE_MEDIA_TYPES.get(
+        image_path.suffix[1:].lower(), "application/octet-stream"
+    )
 
     return FileResponse(
         path=image_path,
@@ -45,7 +45,13 @@ from backend.services.session_service import (
     process_markdown_and_generate_cards,
     process_pdf_and_generate_cards,
 )
-from config.settings import CARD_IMAGES_DIR, EXPORTS_DIR, EXTRACTIONS_DIR, UPLOADS_DIR
+from config.settings import (
+    CARD_IMAGES_DIR,
+    EXPORTS_DIR,
+    EXTRACTIONS_DIR,
+    UPLOADS_DIR,
+    ensure_dir,
+)
 
 router = APIRouter()
 
@@ -66,7 +72,7 @@ async def upload_pdf(
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
     # Save uploaded file
-    file_path = UPLOAD_DIR / f"{file.filename}"
+    file_path = ensure_dir(UPLOAD_DIR) / f"{file.filename}"
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
 
@@ -102,7 +108,7 @@ async def upload_pdf_preview(
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
     # Save uploaded file
-    file_path = UPLOAD_DIR / f"{file.filename}"
+    file_path = ensure_dir(UPLOAD_DIR) / f"{file.filename}"
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
 
@@ -5,10 +5,10 @@ from collections.abc import Generator
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import Session, sessionmaker
 
-from config.settings import DATA_DIR
+from config.settings import DATA_DIR, ensure_dir
 
 # Database path
-DATABASE_URL = f"sqlite:///{DATA_DIR / 'flashcards.db'}"
+DATABASE_URL = f"sqlite:///{ensure_dir(DATA_DIR) / 'flashcards.db'}"
 
 # Create engine
 engine = create_engine(
@@ -11,7 +11,7 @@ from backend.db.database import SessionLocal, init_db
 from backend.db.models import Session as DBSession
 from backend.db.models import SessionStatus
 from backend.services.prompt_service import seed_initial_prompts
-from config.settings import EXPORTS_DIR
+from config.settings import EXPORTS_DIR, ensure_dir
 
 
 def recover_stuck_sessions():
@@ -66,7 +66,7 @@ app.add_middleware(
 app.include_router(api_router, prefix="/api/v1")
 
 # Static files for exports
-app.mount("/exports", StaticFiles(directory=str(EXPORTS_DIR)), name="exports")
+app.mount("/exports", StaticFiles(directory=str(ensure_dir(EXPORTS_DIR))), name="exports")
 
 
 @app.get("/health")
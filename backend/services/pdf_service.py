@@ -156,6 +156,31 @@ def get_pages_for_chapters(
     return sorted(page_indices)
 
 
+def extract_pages_text(
+    file_path: str | Path,
+    page_indices: list[int],
+) -> str:
+    """
+    Extract the text layer of specific PDF pages.
+
+    Args:
+        file_path: Path to the PDF file
+        page_indices: List of 0-based page indices to include
+
+    Returns:
+        Text of the selected pages joined by blank lines
+    """
+    reader = PdfReader(str(file_path))
+    num_pages = len(reader.pages)
+
+    texts = []
+    for page_idx in page_indices:
+        if 0 <= page_idx < num_pages:
+            texts.append(reader.pages[page_idx].extract_text() or "")
+
+    return "\n\n".join(texts)
+
+
 def generate_page_thumbnails(
     file_path: str | Path,
     page_indices: list[int] | None = None,
@@ -20,10 +20,53 @@ from backend.db.models import (
     Session as DBSession,
 )
 from backend.services.prompt_service import get_active_prompt
+from config.prompts import clean_prompt
 from modules.llm_interface import LLMInterface
 
 logger = logging.getLogger(__name__)
 
+ANALYSIS_PROMPT_TEMPLATE = clean_prompt("""
+    Analyze the following flashcard generation results and suggest improvements to the generation prompt.
+
+    ## Current System Prompt:
+    {system_prompt}
+
+    ## Current User Prompt Template:
+    {user_prompt_template}
+
+    ## Rejection Patterns Found:
+    {rejection_patterns}
+
+    ## Examples of APPROVED cards (good quality):
+    {approved}
+
+    ## Examples of REJECTED cards (poor quality):
+    {rejected}
+
+    ## Examples of EDITED cards (showing what users corrected):
+    {edited}
+
+    Based on this analysis, provide:
+    1. Specific issues identified with the current prompts
+    2. An improved system prompt that addresses these issues
+    3. An improved user prompt template that addresses these issues
+
+    Return ONLY valid JSON with these exact keys:
+    {{
+        "reasoning": "explanation of issues found and changes made",
+        "suggested_system_prompt": "the improved system prompt",
+        "suggested_user_prompt_template": "the improved user prompt template"
+    }}
+""")
+
+ANALYSIS_SYSTEM_PROMPT = clean_prompt("""
+    You are an expert in prompt engineering and educational content design.
+    Analyze the flashcard generation results and suggest concrete improvements
+    to the prompts used for generation. Focus on patterns in rejections and
+    how cards were edited to understand what users want.
+    Return only valid JSON.
+""")
+
 
 def analyze_session_and_generate_suggestion(
     session_id: int,
@@ -164,47 +207,14 @@ def _generate_prompt_improvement(
         for c in edited_examples
     ) if edited_examples else "None"
 
-    analysis_prompt = f"""
-    Analyze the following flashcard generation results and suggest improvements to the generation prompt.
-
-    ## Current System Prompt:
-    {current_prompt.system_prompt}
-
-    ## Current User Prompt Template:
-    {current_prompt.user_prompt_template}
-
-    ## Rejection Patterns Found:
-    {json.dumps(rejection_patterns, indent=2)}
-
-    ## Examples of APPROVED cards (good quality):
-    {approved_str}
-
-    ## Examples of REJECTED cards (poor quality):
-    {rejected_str}
-
-    ## Examples of EDITED cards (showing what users corrected):
-    {edited_str}
-
-    Based on this analysis, provide:
-    1. Specific issues identified with the current prompts
-    2. An improved system prompt that addresses these issues
-    3. An improved user prompt template that addresses these issues
-
-    Return ONLY valid JSON with these exact keys:
-    {{
-        "reasoning": "explanation of issues found and changes made",
-        "suggested_system_prompt": "the improved system prompt",
-        "suggested_user_prompt_template": "the improved user prompt template"
-    }}
-    """
-
-    system_prompt = """
-    You are an expert in prompt engineering and educational content design.
-    Analyze the flashcard generation results and suggest concrete improvements
-    to the prompts used for generation. Focus on patterns in rejections and
-    how cards were edited to understand what users want.
-    Return only valid JSON.
-    """
+    analysis_prompt = ANALYSIS_PROMPT_TEMPLATE.format(
+        system_prompt=current_prompt.system_prompt,
+        user_prompt_template=current_prompt.user_prompt_template,
+        rejection_patterns=json.dumps(rejection_patterns, indent=2),
+        approved=approved_str,
+        rejected=rejected_str,
+        edited=edited_str,
+    )
 
     try:
         llm = LLMInterface(provider=llm_provider)
@@ -215,7 +225,7 @@ def _generate_prompt_improvement(
                 "suggested_system_prompt": "string",
                 "suggested_user_prompt_template": "string",
             },
-            system_prompt=system_prompt,
+            system_prompt=ANALYSIS_SYSTEM_PROMPT,
         )
         return response
 
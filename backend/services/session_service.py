@@ -21,6 +21,7 @@ from backend.db.models import (
     Session as DBSession,
 )
 from backend.services.pdf_service import (
+    extract_pages_text,
     get_pdf_info,
 )
 from backend.services.prompt_service import get_active_prompt, update_prompt_metrics
@@ -30,8 +31,15 @@ from config.prompts import (
     GENERATION_PROMPT,
     MARKDOWN_GENERATION_PROMPT,
     PDF_GENERATION_PROMPT,
+    format_image_list,
 )
-from config.settings import CARD_IMAGES_DIR, CHUNK_SIZE, sanitize_filename
+from config.settings import (
+    CARD_IMAGES_DIR,
+    CHUNK_SIZE,
+    IMAGE_MEDIA_TYPES,
+    sanitize_filename,
+)
+from modules.coverage import should_continue
 from modules.llm_interface import LLMInterface
 from modules.markdown_processor import MarkdownProcessor
 from modules.pdf_image_extractor import (
@@ -187,10 +195,12 @@ def _process_with_native_pdf(
     deck_tag = sanitize_filename(session.display_name or session.filename)
     all_images = extract_images_from_pdf(session.file_path, selected_pages)
     image_mapping: dict[str, str] = {}
+    image_sizes: dict[str, int] = {}  # stored filename -> bytes, without re-statting
     has_images = len(all_images) > 0
 
     if has_images:
         image_mapping = save_pdf_images(all_images, CARD_IMAGES_DIR, deck_tag)
+        image_sizes = {image_mapping[img.filename]: len(img.image_bytes) for img in all_images}
         session.pdf_metadata["extracted_image_count"] = len(all_images)
         db.commit()
         logger.info(f"Extracted {len(all_images)} images from PDF for session {session.id}")
@@ -221,22 +231,15 @@ def _process_with_native_pdf(
                     page_groups: dict[int, list[str]] = {}
                     for img in batch_images:
                         page_groups.setdefault(img.page_num, []).append(img.filename)
-                    image_list = "\n".join(
-                        f"- Page {p + 1}: {', '.join(fnames)}"
+                    image_list = format_image_list(
+                        f"Page {p + 1}: {', '.join(fnames)}"
                         for p, fnames in sorted(page_groups.items())
                     )
 
                     # Encode images as base64 to send alongside the PDF
-                    ext_to_media = {
-                        "png": "image/png",
-                        "jpg": "image/jpeg",
-                        "jpeg": "image/jpeg",
-                        "gif": "image/gif",
-                        "webp": "image/webp",
-                    }
                     encoded_batch_images = []
                     for img in batch_images:
-                        media_type = ext_to_media.get(img.ext, "image/png")
+                        media_type = IMAGE_MEDIA_TYPES.get(img.ext, "image/png")
                         b64_data = base64.standard_b64encode(img.image_bytes).decode("utf-8")
                         encoded_batch_images.append((b64_data, media_type))
                 else:
@@ -287,18 +290,10 @@ def _process_with_native_pdf(
                     for img_filename in card_data.get("images", []):
                         if img_filename in image_mapping:
                             stored_name = image_mapping[img_filename]
-                            stored_path = CARD_IMAGES_DIR / stored_name
-                            file_size = stored_path.stat().st_size if stored_path.exists() else 0
-
-                            ext_to_media = {
-                                "png": "image/png",
-                                "jpg": "image/jpeg",
-                                "jpeg": "image/jpeg",
-                                "gif": "image/gif",
-                                "webp": "image/webp",
-                            }
+                            file_size = image_sizes.get(stored_name, 0)
+
                             img_ext = img_filename.rsplit(".", 1)[-1].lower()
-                            media_type = ext_to_media.get(img_ext, "image/png")
+                            media_type = IMAGE_MEDIA_TYPES.get(img_ext, "image/png")
 
                             card_image = CardImage(
                                 card_id=db_card.id,
@@ -376,6 +371,7 @@ def _process_with_text_extraction(
                 prompt=full_prompt,
                 output_format=output_format,
                 system_prompt=system_prompt,
+                source_text=chunk,
             )
 
             # Save cards to database
@@ -521,6 +517,27 @@ def continue_generation(
             pdf_info = get_pdf_info(session.file_path)
             page_indices = list(range(pdf_info["page_count"]))
 
+        # Skip the LLM entirely when existing cards already cover the document
+        if existing_cards and not focus_areas:
+            try:
+                doc_text = extract_pages_text(session.file_path, page_indices)
+            except Exception as e:
+                logger.warning(f"Could not extract text for coverage check: {e}")
+                doc_text = ""
+
+            if not should_continue(existing_cards, doc_text):
+                logger.info(
+                    f"Skipping continue generation for session {session_id}: "
+                    "existing cards already cover the document"
+                )
+                metadata["continue_generation_count"] = metadata.get("continue_generation_count", 0) + 1
+                metadata["last_continue_new_cards"] = 0
+                metadata["last_continue_skipped"] = True
+                session.status = SessionStatus.READY.value
+                session.pdf_metadata = metadata
+                db.commit()
+                return
+
         # Initialize LLM
         llm = LLMInterface(provider=session.llm_provider)
 
@@ -586,6 +603,7 @@ def continue_generation(
         session.status = SessionStatus.READY.value
         metadata["continue_generation_count"] = metadata.get("continue_generation_count", 0) + 1
         metadata["last_continue_new_cards"] = new_card_count
+        metadata["last_continue_skipped"] = False
         session.pdf_metadata = metadata
         db.commit()
 
@@ -620,8 +638,6 @@ def chunk_markdown(content: str, images: list, chunk_size: int = CHUNK_SIZE) ->
         List of dicts with 'content' (str) and 'images' (list) keys
     """
 
-    IMAGE_PATTERN = re.compile(r"!\[([^\]]*)\]\(([^)]+)\)")  # noqa: N806
-
     # Split on headings (keep heading with its section)
     sections = re.split(r"(?=^#{1,2}\s)", content, flags=re.MULTILINE)
     sections = [s for s in sections if s.strip()]
@@ -662,7 +678,7 @@ def chunk_markdown(content: str, images: list, chunk_size: int = CHUNK_SIZE) ->
     result = []
     for chunk_text in chunks:
         chunk_images = []
-        for match in IMAGE_PATTERN.finditer(chunk_text):
+        for match in MarkdownProcessor.IMAGE_PATTERN.finditer(chunk_text):
             import urllib.parse
             rel_path = urllib.parse.unquote(match.group(2))
             if rel_path in image_lookup:
@@ -740,6 +756,8 @@ def process_markdown_and_generate_cards(
         image_mapping = processor.get_image_mapping(doc, deck_tag)
         image_storage_dir = CARD_IMAGES_DIR
         processor.copy_images_to_storage(doc, image_mapping, image_storage_dir)
+        # Source image sizes, stat'ed once per image rather than per card reference
+        image_sizes: dict[str, int] = {}
 
         # Process each chunk
         card_count = 0
@@ -751,8 +769,8 @@ def process_markdown_and_generate_cards(
                 image_paths = [img.absolute_path for img in chunk_images]
 
                 # Build prompt for this chunk
-                image_list = "\n".join(
-                    f"- {img.relative_path}" for img in chunk_images
+                image_list = format_image_list(
+                    img.relative_path for img in chunk_images
                 )
                 prompt = MARKDOWN_GENERATION_PROMPT.user_prompt_template.format(
                     image_list=image_list if image_list else "(no images in this section)",
@@ -799,17 +817,12 @@ def process_markdown_and_generate_cards(
 
                         if matching_img and matching_img.relative_path in image_mapping:
                             stored_name = image_mapping[matching_img.relative_path]
-                            file_size = matching_img.absolute_path.stat().st_size if matching_img.absolute_path else 0
+                            if stored_name not in image_sizes:
+                                image_sizes[stored_name] = matching_img.absolute_path.stat().st_size
+                            file_size = image_sizes[stored_name]
 
                             suffix = matching_img.absolute_path.suffix.lower() if matching_img.absolute_path else ".png"
-                            media_types = {
-                                ".png": "image/png",
-                                ".jpg": "image/jpeg",
-                                ".jpeg": "image/jpeg",
-                                ".gif": "image/gif",
-                                ".webp": "image/webp",
-                            }
-                            media_type = media_types.get(suffix, "image/png")
+                            media_type = IMAGE_MEDIA_TYPES.get(suffix[1:], "image/png")
 
                             card_image = CardImage(
                                 card_id=db_card.id,
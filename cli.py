@@ -12,7 +12,6 @@ import time
 import click
 
 from config.settings import LOGGING_CONFIG
-from utils.pipeline import Pipeline
 
 # Configure logging
 logging.config.dictConfig(LOGGING_CONFIG)
@@ -58,6 +57,8 @@ def generate(pdf_path, output, llm, max_cards, verbose):
     click.echo(f"Processing PDF: {pdf_path}")
 
     try:
+        from utils.pipeline import Pipeline
+
         # Initialize the pipeline
         pipeline = Pipeline(llm_provider=llm, max_cards=max_cards)
 
@@ -105,7 +106,8 @@ def check_api(llm):
     from modules.llm_interface import LLMInterface
 
     try:
-        llm_interface = LLMInterface(provider=llm)
+        # Always hit the API when checking it
+        llm_interface = LLMInterface(provider=llm, cache=None, semantic_cache=None)
 
         # Simple test prompt
         response = llm_interface.generate_completion(
@@ -13,6 +13,9 @@ References:
 - SuperMemo 20 Rules: https://www.supermemo.com/en/blog/twenty-rules-of-formulating-knowledge
 """
 
+import re
+import textwrap
+from collections.abc import Iterable
 from dataclasses import dataclass, field
 
 
@@ -26,11 +29,17 @@ class PromptTemplate:
     output_format: dict = field(default_factory=dict)
 
 
+def clean_prompt(text: str) -> str:
+    """Dedent a triple-quoted prompt, strip trailing whitespace and collapse blank lines."""
+    text = re.sub(r"[ \t]+$", "", textwrap.dedent(text).strip(), flags=re.MULTILINE)
+    return re.sub(r"\n{3,}", "\n\n", text)
+
+
 # =============================================================================
 # Unified Card Generation Prompts
 # =============================================================================
 
-CARD_GENERATION_SYSTEM = """
+CARD_GENERATION_SYSTEM = clean_prompt("""
 You are an expert educational content designer specializing in spaced repetition and memory optimization.
 Your task is to create COMPREHENSIVE, high-quality Anki flashcards following SuperMemo's 20 Rules of Formulating Knowledge.
 
@@ -41,9 +50,9 @@ Key principles:
 - COMPLETE: Cover definitions, relationships, examples, applications
 
 Always return valid JSON format with no additional text.
-"""
+""")
 
-CARD_GENERATION_USER = """
+CARD_GENERATION_USER = clean_prompt("""
 Analyze this document THOROUGHLY and create comprehensive Anki flashcards for ALL important concepts.
 
 ## EXTRACTION GOALS - Be Exhaustive:
@@ -120,7 +129,7 @@ Analyze this document THOROUGHLY and create comprehensive Anki flashcards for AL
 Do NOT generate tags - tags are managed automatically.
 
 Return ONLY valid JSON with no additional text.
-"""
+""")
 
 CARD_OUTPUT_FORMAT = {
     "cards": [
@@ -132,10 +141,10 @@ CARD_OUTPUT_FORMAT = {
 }
 
 # =============================================================================
-# Image Handling Add-on (prepended to user prompt for markdown with images)
+# Image Handling Add-on (prepended to user prompt for documents with images)
 # =============================================================================
 
-IMAGE_HANDLING_SECTION = """
+_IMAGE_HANDLING_SECTION = clean_prompt("""
 ## IMAGE HANDLING:
 The document contains the following images that you can see:
 {image_list}
@@ -153,8 +162,15 @@ Images can go in EITHER the front (question) OR back (answer) depending on what
 
 Choose the placement that best tests understanding. Visual recognition cards (image in front) are excellent for diagrams.
 
+Reference images using [IMAGE: filename] format, with filenames exactly as listed above. Only reference images from that list.
 For the output format, include an "images" array listing ALL image filenames used in each card (empty array if none).
-"""
+""")
+
+# PDF-specific wording, prepended to the shared image section
+PDF_IMAGE_PREAMBLE = clean_prompt("""
+Images have been extracted from this PDF and are provided above as individual images,
+in the same order as they are listed in the IMAGE HANDLING section below.
+""")
 
 MARKDOWN_OUTPUT_FORMAT = {
     "cards": [
@@ -166,44 +182,24 @@ MARKDOWN_OUTPUT_FORMAT = {
     ]
 }
 
-# =============================================================================
-# PDF Image Handling Add-on (prepended to user prompt for PDFs with images)
-# =============================================================================
-
-PDF_IMAGE_HANDLING_SECTION = """
-## IMAGE HANDLING:
-Images have been extracted from this PDF and are provided above as individual images, in the following order:
-{image_list}
 
-The images above appear in the same order as listed. Use the filenames exactly as shown when referencing them.
-
-Images can go in EITHER the front (question) OR back (answer) depending on what makes pedagogical sense:
-
-**Image in QUESTION (front)** - Use when testing recognition/interpretation:
-- "What concept does this diagram illustrate? [IMAGE: page3_img0.png]"
-- "Identify the components shown: [IMAGE: page5_img1.png]"
-
-**Image in ANSWER (back)** - Use when the image supports/explains the answer:
-- Front: "What is the structure of X?"
-- Back: "Description here. [IMAGE: page7_img0.png]"
-
-Reference images using [IMAGE: filename] format. Only reference images from the list above.
-For the output format, include an "images" array listing ALL image filenames used in each card (empty array if none).
-"""
+def format_image_list(filenames: Iterable[str]) -> str:
+    """Render the {image_list} slot of the image handling section."""
+    return "\n".join(f"- {f}" for f in filenames)
 
 
 # =============================================================================
 # Continue Generation Prompts (for generating additional cards)
 # =============================================================================
 
-CONTINUE_GENERATION_SYSTEM = """
+CONTINUE_GENERATION_SYSTEM = clean_prompt("""
 You are an expert educational content designer. Your task is to find GAPS in existing flashcard coverage
 and create cards for missing concepts. Be thorough but avoid duplicating existing content.
 
 Always return valid JSON format with no additional text.
-"""
+""")
 
-CONTINUE_GENERATION_USER = """
+CONTINUE_GENERATION_USER = clean_prompt("""
 Analyze this document and create ADDITIONAL Anki flashcards for concepts that are MISSING.
 
 ## EXISTING CARDS (DO NOT DUPLICATE THESE):
@@ -226,21 +222,21 @@ The following cards have already been created. Do NOT create cards that test the
 - Follow SuperMemo's 20 Rules (minimum information, no sets/enumerations, etc.)
 
 Return ONLY valid JSON with no additional text.
-"""
+""")
 
 
 # =============================================================================
 # Card Validation Prompts
 # =============================================================================
 
-CARD_VALIDATION_SYSTEM = """
+CARD_VALIDATION_SYSTEM = clean_prompt("""
 You are an expert in educational psychology and spaced repetition learning.
 Your task is to review and improve flashcards for effectiveness.
 
 Return only valid JSON with the improved cards. Do not include any explanations or additional text.
-"""
+""")
 
-CARD_VALIDATION_USER = """
+CARD_VALIDATION_USER = clean_prompt("""
 Review the following flashcards for quality and effectiveness:
 
 {cards_json}
@@ -255,7 +251,7 @@ For each card, evaluate against SuperMemo's 20 Rules:
 
 Improve any cards that don't meet these criteria.
 Return only the improved cards in JSON format.
-"""
+""")
 
 VALIDATION_OUTPUT_FORMAT = {
     "improved_cards": [
@@ -271,14 +267,37 @@ VALIDATION_OUTPUT_FORMAT = {
 # Batch Context Template (for multi-batch processing)
 # =============================================================================
 
-BATCH_CONTEXT_TEMPLATE = """
-
+BATCH_CONTEXT_TEMPLATE = "\n\n" + clean_prompt("""
 ## BATCH CONTEXT:
 - This is batch {batch_num} of {total_batches}
 - Pages {context_pages} are included for context continuity (already processed)
 - Focus on generating cards for pages {new_pages} (new content)
 - Do NOT create cards for concepts already covered in context pages
-"""
+""")
+
+
+# =============================================================================
+# Multi-Chunk Add-on (appended to user prompt when several chunks share a call)
+# =============================================================================
+
+MULTI_CHUNK_SECTION = clean_prompt("""
+## MULTIPLE SECTIONS:
+The document content is split into sections, each starting with a `--- CHUNK n ---` marker.
+Create cards for each section independently and group them by section:
+`cards_by_chunk[0]` holds the cards for CHUNK 1, `cards_by_chunk[1]` for CHUNK 2, and so on.
+Return one list per section, using an empty list for a section with nothing worth learning.
+""")
+
+MULTI_CHUNK_OUTPUT_FORMAT = {
+    "cards_by_chunk": [
+        [
+            {
+                "front": "Question text goes here",
+                "back": "Answer text goes here",
+            }
+        ]
+    ]
+}
 
 
 # =============================================================================
@@ -288,33 +307,44 @@ BATCH_CONTEXT_TEMPLATE = """
 GENERATION_PROMPT = PromptTemplate(
     name="card_generation",
     description="Unified prompt for generating flashcards from any document type using SuperMemo's 20 Rules",
-    system_prompt=CARD_GENERATION_SYSTEM.strip(),
-    user_prompt_template=CARD_GENERATION_USER.strip(),
+    system_prompt=CARD_GENERATION_SYSTEM,
+    user_prompt_template=CARD_GENERATION_USER,
     output_format=CARD_OUTPUT_FORMAT,
 )
 
+# Multi-chunk prompt = same system + base user prompt with multi-chunk section appended
+MULTI_CHUNK_GENERATION_PROMPT = PromptTemplate(
+    name="multi_chunk_generation",
+    description="Generation prompt for several content chunks in one request, cards grouped per chunk",
+    system_prompt=CARD_GENERATION_SYSTEM,
+    user_prompt_template=CARD_GENERATION_USER + "\n\n" + MULTI_CHUNK_SECTION,
+    output_format=MULTI_CHUNK_OUTPUT_FORMAT,
+)
+
 CONTINUE_GENERATION_PROMPT = PromptTemplate(
     name="continue_generation",
     description="Prompt for generating additional cards while avoiding duplicates",
-    system_prompt=CONTINUE_GENERATION_SYSTEM.strip(),
-    user_prompt_template=CONTINUE_GENERATION_USER.strip(),
+    system_prompt=CONTINUE_GENERATION_SYSTEM,
+    user_prompt_template=CONTINUE_GENERATION_USER,
     output_format=CARD_OUTPUT_FORMAT,
 )
 
 VALIDATION_PROMPT = PromptTemplate(
     name="card_validation",
     description="Prompt for reviewing and improving generated flashcards",
-    system_prompt=CARD_VALIDATION_SYSTEM.strip(),
-    user_prompt_template=CARD_VALIDATION_USER.strip(),
+    system_prompt=CARD_VALIDATION_SYSTEM,
+    user_prompt_template=CARD_VALIDATION_USER,
     output_format=VALIDATION_OUTPUT_FORMAT,
 )
 
-# PDF image prompt = same system + base user prompt with PDF image section prepended
+# PDF image prompt = same system + base user prompt with PDF preamble and image section prepended
 PDF_GENERATION_PROMPT = PromptTemplate(
     name="pdf_generation",
     description="Same generation prompt with PDF image handling section for PDFs with extracted images",
-    system_prompt=CARD_GENERATION_SYSTEM.strip(),
-    user_prompt_template=(PDF_IMAGE_HANDLING_SECTION + "\n" + CARD_GENERATION_USER).strip(),
+    system_prompt=CARD_GENERATION_SYSTEM,
+    user_prompt_template=(
+        PDF_IMAGE_PREAMBLE + "\n\n" + _IMAGE_HANDLING_SECTION + "\n\n" + CARD_GENERATION_USER
+    ),
     output_format=MARKDOWN_OUTPUT_FORMAT,
 )
 
@@ -322,8 +352,8 @@ PDF_GENERATION_PROMPT = PromptTemplate(
 MARKDOWN_GENERATION_PROMPT = PromptTemplate(
     name="markdown_generation",
     description="Same generation prompt with image handling section for markdown documents",
-    system_prompt=CARD_GENERATION_SYSTEM.strip(),
-    user_prompt_template=(IMAGE_HANDLING_SECTION + "\n" + CARD_GENERATION_USER).strip(),
+    system_prompt=CARD_GENERATION_SYSTEM,
+    user_prompt_template=_IMAGE_HANDLING_SECTION + "\n\n" + CARD_GENERATION_USER,
     output_format=MARKDOWN_OUTPUT_FORMAT,
 )
 
@@ -334,6 +364,7 @@ MARKDOWN_GENERATION_PROMPT = PromptTemplate(
 
 PROMPTS = {
     "generation": GENERATION_PROMPT,
+    "multi_chunk_generation": MULTI_CHUNK_GENERATION_PROMPT,
     "continue_generation": CONTINUE_GENERATION_PROMPT,
     "validation": VALIDATION_PROMPT,
     "pdf_generation": PDF_GENERATION_PROMPT,
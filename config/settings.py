@@ -8,6 +8,7 @@ Note: Prompt templates are defined in config/prompts.py
 
 import os
 from pathlib import Path
+from types import MappingProxyType
 
 # Load environment variables
 try:
@@ -36,17 +37,17 @@ CARD_IMAGES_DIR = PROCESSING_DIR / "images"  # Stored card images
 # Legacy alias for backwards compatibility
 OUTPUT_DIR = EXPORTS_DIR
 
-# Create directories if they don't exist
-for directory in [
-    DATA_DIR,
-    INPUT_DIR,
-    EXPORTS_DIR,
-    PROCESSING_DIR,
-    UPLOADS_DIR,
-    EXTRACTIONS_DIR,
-    CARD_IMAGES_DIR,
-]:
-    directory.mkdir(parents=True, exist_ok=True)
+
+def ensure_dir(path: Path) -> Path:
+    """Create a directory (and parents) if it does not exist yet.
+
+    Directories are created lazily by the code that writes into them rather
+    than at import time. Not memoized, so a directory removed at runtime
+    (e.g. cleaned-up exports) is created again on the next call.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
 
 # API Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -80,9 +81,45 @@ ANKI_CONNECT_URL = os.getenv(
     "ANKI_CONNECT_URL", "http://host.docker.internal:8765"
 )
 
+# Media types of the image formats the app stores and sends to vision APIs,
+# by lowercase file extension
+IMAGE_MEDIA_TYPES = MappingProxyType(
+    {
+        "png": "image/png",
+        "jpg": "image/jpeg",
+        "jpeg": "image/jpeg",
+        "gif": "image/gif",
+        "webp": "image/webp",
+    }
+)
+
 # Processing options (for text extraction fallback)
 CHUNK_SIZE = 12000  # characters (~12,000 tokens)
 
+# Content chunks packed into one card-generation request; groups pay the
+# system prompt and round trip once instead of per chunk (1 disables packing)
+CHUNKS_PER_REQUEST = int(os.getenv("FLASHCARD_CHUNKS_PER_REQUEST", "1"))
+
+# Extracted PDF text, keyed by file path, mtime and size; the least recently
+# used files beyond TEXT_CACHE_MAX_FILES are removed
+TEXT_CACHE_DIR = PROCESSING_DIR / "text_cache"
+TEXT_CACHE_MAX_FILES = 256
+
+# Skip "continue generation" when existing cards already cover this fraction
+# of the document's content words
+CONTINUE_SKIP_DENSITY = float(os.getenv("FLASHCARD_CONTINUE_SKIP_DENSITY", "0.85"))
+
+# On-disk cache of LLM responses, only used for temperature-0 requests
+LLM_CACHE_ENABLED = os.getenv("FLASHCARD_LLM_CACHE", "1") != "0"
+LLM_CACHE_PATH = PROCESSING_DIR / "llm_cache.sqlite3"
+LLM_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+
+# In-memory semantic cache: reuse a response when a new prompt's embedding is
+# at least this cosine-similar to a cached one (0 disables; needs OpenAI key)
+LLM_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("FLASHCARD_SEMANTIC_CACHE_THRESHOLD", "0"))
+LLM_SEMANTIC_CACHE_SIZE = 2048  # entries
+LLM_EMBEDDING_MODEL = "text-embedding-3-small"
+
 # Logging configuration
 
 
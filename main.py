@@ -8,8 +8,6 @@ using Large Language Models.
 
 import click
 
-from utils.pipeline import Pipeline
-
 
 @click.command()
 @click.argument('pdf_path', type=click.Path(exists=True))
@@ -20,6 +18,9 @@ def main(pdf_path, output, llm, max_cards):
     """Generate Anki flashcards from a PDF document using LLMs."""
     click.echo(f"Processing PDF: {pdf_path}")
 
+    # Imported here so --help and argument errors skip the LLM/PDF import chain
+    from utils.pipeline import Pipeline
+
     # Initialize the pipeline
     pipeline = Pipeline(llm_provider=llm, max_cards=max_cards)
 
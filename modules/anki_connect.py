@@ -6,6 +6,7 @@ Communicates with Anki over its localhost HTTP API to directly
 create decks, store media, and add notes.
 """
 
+import asyncio
 import base64
 import logging
 from pathlib import Path
@@ -16,23 +17,80 @@ logger = logging.getLogger(__name__)
 
 ANKI_CONNECT_VERSION = 6
 
+# Max storeMediaFile actions bundled into one "multi" request
+MEDIA_BATCH_SIZE = 50
+
+# Notes per addNotes request when splitting large exports
+NOTE_BATCH_SIZE = 200
+
+# Actions that are safe to resend after a transient failure
+IDEMPOTENT_ACTIONS = frozenset({"deckNames", "createDeck", "storeMediaFile"})
+
+# Attempts (including the first) and base backoff for idempotent actions
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.1
+
+# AnkiConnect errors raised while the collection is briefly busy (e.g. syncing)
+_TRANSIENT_ERRORS = ("collection is not available", "database is locked")
+
+
+def _read_base64(file_path: Path) -> str:
+    """Read a file and return its base64-encoded content."""
+    return base64.b64encode(file_path.read_bytes()).decode("ascii")
+
 
 class AnkiConnectError(Exception):
     """Raised when AnkiConnect is unreachable or returns an error."""
 
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
 
 class AnkiConnectClient:
-    """Client for AnkiConnect REST API."""
+    """Client for AnkiConnect REST API.
+
+    Holds one pooled HTTP client for its lifetime; use it as an async
+    context manager (or call ``aclose()``) to release the connections.
+    """
 
     def __init__(self, url: str = "http://127.0.0.1:8765"):
         self.url = url
+        self._client = httpx.AsyncClient(
+            base_url=url,
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            # Transport-level retries only cover failed connection attempts
+            transport=httpx.AsyncHTTPTransport(
+                retries=2,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=20),
+            ),
+        )
+        # Deck name -> ID for decks created (or confirmed) through this client
+        self._known_decks: dict[str, int] = {}
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP connection pool."""
+        await self._client.aclose()
+
+    async def __aenter__(self) -> "AnkiConnectClient":
+        return self
 
-    async def _request(self, action: str, params: dict | None = None) -> any:
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def _request(
+        self, action: str, params: dict | None = None, idempotent: bool | None = None
+    ) -> any:
         """Send a request to AnkiConnect and return the result.
 
+        Idempotent actions are retried with exponential backoff when the
+        failure looks transient (connection drop, timeout, busy collection).
+
         Args:
             action: The AnkiConnect action name
             params: Optional parameters for the action
+            idempotent: Whether the request may be resent; defaults to
+                membership in IDEMPOTENT_ACTIONS
 
         Returns:
             The result field from AnkiConnect's response
@@ -44,24 +102,42 @@ class AnkiConnectClient:
         if params:
             payload["params"] = params
 
+        if idempotent is None:
+            idempotent = action in IDEMPOTENT_ACTIONS
+        attempts = RETRY_ATTEMPTS if idempotent else 1
+
+        for attempt in range(attempts):
+            try:
+                return await self._send(payload)
+            except AnkiConnectError as e:
+                if not e.retryable or attempt + 1 == attempts:
+                    raise
+                delay = RETRY_BACKOFF * 2**attempt
+                logger.warning(f"AnkiConnect {action} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _send(self, payload: dict) -> any:
+        """POST a single payload to AnkiConnect and unwrap the result."""
         try:
-            async with httpx.AsyncClient(
-                timeout=httpx.Timeout(30.0, connect=5.0)
-            ) as client:
-                response = await client.post(self.url, json=payload)
-                response.raise_for_status()
+            response = await self._client.post("", json=payload)
+            response.raise_for_status()
         except httpx.ConnectError:
             raise AnkiConnectError(
-                "Cannot connect to AnkiConnect. Is Anki running with AnkiConnect installed?"
+                "Cannot connect to AnkiConnect. Is Anki running with AnkiConnect installed?",
+                retryable=True,
             )
         except httpx.TimeoutException:
-            raise AnkiConnectError("AnkiConnect request timed out")
+            raise AnkiConnectError("AnkiConnect request timed out", retryable=True)
         except httpx.HTTPStatusError as e:
             raise AnkiConnectError(f"AnkiConnect HTTP error: {e.response.status_code}")
 
         data = response.json()
         if data.get("error"):
-            raise AnkiConnectError(f"AnkiConnect error: {data['error']}")
+            error = str(data["error"])
+            raise AnkiConnectError(
+                f"AnkiConnect error: {error}",
+                retryable=any(marker in error for marker in _TRANSIENT_ERRORS),
+            )
 
         return data.get("result")
 
@@ -84,10 +160,17 @@ class AnkiConnectClient:
     async def create_deck(self, deck_name: str) -> int:
         """Create a deck (idempotent — won't overwrite existing).
 
+        Decks already created through this client are not re-sent.
+
         Returns:
             Deck ID
         """
-        return await self._request("createDeck", {"deck": deck_name})
+        if deck_name in self._known_decks:
+            return self._known_decks[deck_name]
+
+        deck_id = await self._request("createDeck", {"deck": deck_name})
+        self._known_decks[deck_name] = deck_id
+        return deck_id
 
     async def store_media_file(self, filename: str, data_b64: str) -> str:
         """Store a media file in Anki's collection.media folder.
@@ -117,6 +200,32 @@ class AnkiConnectClient:
         """
         return await self._request("addNotes", {"notes": notes})
 
+    async def add_notes_batched(
+        self, notes: list[dict], chunk_size: int = NOTE_BATCH_SIZE
+    ) -> list[int | None]:
+        """Add notes in chunks sent concurrently over the shared connection pool.
+
+        Keeps each request body small; AnkiConnect still applies them one
+        at a time, but request encoding and parsing overlap.
+
+        Args:
+            notes: List of note dicts in AnkiConnect format
+            chunk_size: Maximum notes per addNotes request
+
+        Returns:
+            List of note IDs (None for failed notes), in input order
+        """
+        if len(notes) <= chunk_size:
+            return await self.add_notes(notes)
+
+        chunk_results = await asyncio.gather(
+            *(
+                self.add_notes(notes[i:i + chunk_size])
+                for i in range(0, len(notes), chunk_size)
+            )
+        )
+        return [note_id for chunk in chunk_results for note_id in chunk]
+
     async def store_media_from_path(self, filename: str, file_path: Path) -> str:
         """Read a file from disk and store it in Anki's media folder.
 
@@ -127,8 +236,63 @@ class AnkiConnectClient:
         Returns:
             The stored filename
         """
-        data = file_path.read_bytes()
-        data_b64 = base64.b64encode(data).decode("ascii")
+        # Read + encode off the event loop so other requests keep flowing
+        data_b64 = await asyncio.to_thread(_read_base64, file_path)
         result = await self.store_media_file(filename, data_b64)
         logger.debug(f"Stored media file: {filename}")
         return result
+
+    async def store_media_files(self, files: list[tuple[str, Path]]) -> dict[str, str]:
+        """Store several files in Anki's media folder with batched requests.
+
+        Files are read and encoded concurrently in worker threads and sent as ``storeMediaFile`` actions
+        bundled into ``multi`` requests of up to MEDIA_BATCH_SIZE files.
+
+        Args:
+            files: List of (target filename, source path) tuples
+
+        Returns:
+            Dict mapping filename -> error message for files that failed
+            (empty if every file was stored)
+
+        Raises:
+            AnkiConnectError: If AnkiConnect is unreachable or rejects a batch
+        """
+        errors: dict[str, str] = {}
+
+        for start in range(0, len(files), MEDIA_BATCH_SIZE):
+            batch = files[start:start + MEDIA_BATCH_SIZE]
+            contents = await asyncio.gather(
+                *(asyncio.to_thread(_read_base64, path) for _, path in batch),
+                return_exceptions=True,
+            )
+
+            actions = []
+            filenames = []
+            for (filename, _), data in zip(batch, contents, strict=True):
+                if isinstance(data, BaseException):
+                    errors[filename] = f"Could not read file: {data}"
+                    continue
+                actions.append({
+                    "action": "storeMediaFile",
+                    "params": {
+                        "filename": filename,
+                        "data": data,
+                        "deleteExisting": True,
+                    },
+                })
+                filenames.append(filename)
+
+            if not actions:
+                continue
+
+            # Every bundled action is storeMediaFile with deleteExisting, so
+            # resending the whole batch is safe
+            results = await self._request("multi", {"actions": actions}, idempotent=True)
+            for filename, result in zip(filenames, results, strict=True):
+                if isinstance(result, dict) and result.get("error"):
+                    errors[filename] = result["error"]
+
+            logger.debug(f"Stored {len(actions)} media files in one request")
+
+        return errors
@@ -6,16 +6,59 @@ Handles the formatting and export of flashcards for Anki.
 
 import csv
 import logging
-import os
 import re
 import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 
-from config.settings import ANKI_CONFIG, OUTPUT_DIR
+from config.settings import ANKI_CONFIG, OUTPUT_DIR, ensure_dir
 from modules.card_generation import FlashCard
 
 logger = logging.getLogger(__name__)
 
+# Matches [IMAGE: filename.ext] with optional spaces
+_IMG_RE = re.compile(r"\[IMAGE:\s*([^\]]+)\]")
+_IMG_MARKER = "[IMAGE:"
+
+# CSV quote escaping plus HTML escaping, applied in a single C-level pass
+_HTML_TABLE = str.maketrans({'"': '""', "<": "&lt;", ">": "&gt;"})
+
+# CSV quote escaping only (HTML preserved)
+_CSV_QUOTE_TABLE = str.maketrans({'"': '""'})
+
+# Write buffer for CSV exports
+CSV_BUFFER_SIZE = 1 << 20
+
+# Above this many cards, CSV fields are sanitized in one joined translate pass
+BATCH_SANITIZE_THRESHOLD = 1000
+
+# Separator used to join fields for batch sanitizing (ASCII unit separator)
+_FIELD_SEP = "\x1f"
+
+# Parallel file copies when exporting media to a folder
+COPY_WORKERS = 8
+
+# Characters not allowed in Anki tags (anything but letters, digits, _ and -)
+_TAG_DISALLOWED = re.compile(r"[^\w-]")
+
+
+@lru_cache(maxsize=4096)
+def _clean_tag(tag: str) -> str:
+    """Replace spaces with underscores and remove special characters."""
+    return _TAG_DISALLOWED.sub("", tag.replace(" ", "_"))
+
+
+@lru_cache(maxsize=512)
+def _format_tags_cached(default_tags: frozenset[str], tags: frozenset[str]) -> str:
+    """Combine, clean and join tags; cached since most cards share tag sets."""
+    # Cards tagged only with defaults (or nothing) share the defaults' union
+    all_tags = default_tags if tags <= default_tags else default_tags | tags
+    clean_tags = [clean_tag for clean_tag in map(_clean_tag, all_tags) if clean_tag]
+
+    # Join tags with spaces for Anki format
+    return " ".join(clean_tags)
+
 
 class AnkiExporter:
     """Exports flashcards to Anki-compatible formats."""
@@ -28,6 +71,9 @@ class AnkiExporter:
             config: Configuration for the exporter (or None to use default)
         """
         self.config = config or ANKI_CONFIG
+        self._default_tags_frozen = frozenset(self.config.get("default_tags", []))
+        # Formatted tags for cards without their own tags (the common case)
+        self._empty_tags_result = _format_tags_cached(self._default_tags_frozen, frozenset())
 
     def _sanitize_text(self, text: str) -> str:
         """
@@ -39,13 +85,24 @@ class AnkiExporter:
         Returns:
             Sanitized text
         """
-        # Replace characters that might cause issues in CSV
-        text = text.replace('"', '""')  # Double quotes for CSV escaping
+        # Double quotes for CSV escaping, and escape HTML tags
+        return text.translate(_HTML_TABLE)
 
-        # Handle HTML tags (could extend this for more complex sanitization)
-        text = text.replace("<", "&lt;").replace(">", "&gt;")
+    def _sanitize_batch(self, texts: list[str]) -> list[str]:
+        """
+        Sanitize many texts with a single translate call.
 
-        return text
+        Args:
+            texts: The texts to sanitize
+
+        Returns:
+            Sanitized texts, in input order
+        """
+        joined = _FIELD_SEP.join(texts)
+        # A separator inside a field would break the split; sanitize one by one
+        if joined.count(_FIELD_SEP) != len(texts) - 1:
+            return [self._sanitize_text(text) for text in texts]
+        return joined.translate(_HTML_TABLE).split(_FIELD_SEP)
 
     def _format_tags(self, tags: list[str]) -> str:
         """
@@ -57,20 +114,9 @@ class AnkiExporter:
         Returns:
             Formatted tag string
         """
-        # Combine default tags with card-specific tags
-        all_tags = set(self.config.get("default_tags", []) + tags)
-
-        # Clean tags (remove spaces, etc.)
-        clean_tags = []
-        for tag in all_tags:
-            # Replace spaces with underscores and remove special characters
-            clean_tag = tag.replace(" ", "_")
-            clean_tag = "".join(c for c in clean_tag if c.isalnum() or c in "_-")
-            if clean_tag:
-                clean_tags.append(clean_tag)
-
-        # Join tags with spaces for Anki format
-        return " ".join(clean_tags)
+        if not tags:
+            return self._empty_tags_result
+        return _format_tags_cached(self._default_tags_frozen, frozenset(tags))
 
     def export_to_csv(
         self, cards: list[FlashCard], output_path: str | Path | None = None
@@ -90,29 +136,37 @@ class AnkiExporter:
             raise ValueError("Cannot export empty card list")
 
         # Determine the output path
-        if output_path is None:
-            os.makedirs(OUTPUT_DIR, exist_ok=True)
-            output_path = OUTPUT_DIR / "anki_cards.csv"
-        else:
-            output_path = Path(output_path)
-            os.makedirs(output_path.parent, exist_ok=True)
+        output_path = Path(output_path) if output_path else OUTPUT_DIR / "anki_cards.csv"
+        ensure_dir(output_path.parent)
 
         logger.info(f"Exporting {len(cards)} cards to {output_path}")
 
-        # Write cards to CSV
-        with open(output_path, "w", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-
-            # Write header
-            writer.writerow(["front", "back", "tags"])
-
-            # Write cards
-            for card in cards:
-                sanitized_front = self._sanitize_text(card.front)
-                sanitized_back = self._sanitize_text(card.back)
-                tags = self._format_tags(card.tags)
-
-                writer.writerow([sanitized_front, sanitized_back, tags])
+        # Write cards as pre-quoted rows: sanitized fields already have their
+        # double quotes escaped, so csv.writer is only needed for the header.
+        # Rows are streamed from a generator straight into the buffered file.
+        sanitize = self._sanitize_text
+        format_tags = self._format_tags
+        with open(
+            output_path, "w", newline="", encoding="utf-8", buffering=CSV_BUFFER_SIZE
+        ) as file:
+            csv.writer(file).writerow(["front", "back", "tags"])
+            if len(cards) > BATCH_SANITIZE_THRESHOLD:
+                # Large exports: sanitize every front/back in one pass, then
+                # pair the results back up with their cards
+                fields = iter(
+                    self._sanitize_batch(
+                        [text for card in cards for text in (card.front, card.back)]
+                    )
+                )
+                file.writelines(
+                    f'"{front}","{back}","{format_tags(card.tags)}"\r\n'
+                    for card, front, back in zip(cards, fields, fields, strict=True)
+                )
+            else:
+                file.writelines(
+                    f'"{sanitize(card.front)}","{sanitize(card.back)}","{format_tags(card.tags)}"\r\n'
+                    for card in cards
+                )
 
         logger.info(f"Successfully exported {len(cards)} cards to {output_path}")
         return output_path
@@ -187,15 +241,12 @@ class AnkiExporter:
         Returns:
             Text with image references converted to HTML img tags
         """
-        # Pattern matches [IMAGE: filename.ext] with optional spaces
-        pattern = r'\[IMAGE:\s*([^\]]+)\]'
-
         def replace_image_ref(match):
             filename = match.group(1).strip()
             # Return HTML img tag that Anki can display
             return f'<img src="{filename}">'
 
-        return re.sub(pattern, replace_image_ref, text)
+        return _IMG_RE.sub(replace_image_ref, text)
 
     def _sanitize_text_with_html(self, text: str) -> str:
         """
@@ -208,13 +259,12 @@ class AnkiExporter:
             Sanitized text with HTML preserved
         """
         # First convert image references to HTML
-        text = self._convert_image_refs_to_html(text)
+        if _IMG_MARKER in text:
+            text = self._convert_image_refs_to_html(text)
 
         # Don't escape HTML since we want to preserve img tags
         # Just handle CSV escaping (double quotes)
-        text = text.replace('"', '""')
-
-        return text
+        return text.translate(_CSV_QUOTE_TABLE)
 
     def export_to_folder(
         self,
@@ -250,57 +300,76 @@ class AnkiExporter:
 
         logger.info(f"Exporting {len(cards)} cards with {len(card_images)} images to {export_dir}")
 
-        # Create a mapping from original filenames to stored filenames
-        image_filename_map = {}
-        for img in card_images:
-            original = img.get("original_filename", "")
-            stored = img.get("stored_filename", "")
-            if original and stored:
-                image_filename_map[original] = stored
-                # Also map just the basename (LLM may omit directory prefix)
-                basename = Path(original).name
-                if basename not in image_filename_map:
-                    image_filename_map[basename] = stored
-                # Also map the stored filename to itself for direct references
-                image_filename_map[stored] = stored
-
-        # Copy images directly into the export folder
-        copied_images = set()
-        for img in card_images:
-            stored_filename = img.get("stored_filename", "")
-            if stored_filename:
-                src_path = image_storage_dir / stored_filename
-                if src_path.exists():
-                    dst_path = export_dir / stored_filename
-                    shutil.copy2(src_path, dst_path)
-                    copied_images.add(stored_filename)
-                    logger.debug(f"Copied image: {stored_filename}")
-
-        logger.info(f"Copied {len(copied_images)} images to export folder")
-
-        # Write CSV file
-        csv_path = export_dir / "cards.csv"
-        with open(csv_path, "w", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            writer.writerow(["front", "back", "tags"])
-
+        # Map original filenames, their basenames (the LLM may omit the
+        # directory prefix) and stored filenames to the stored filename.
+        # Later updates take precedence; for basenames the first image wins.
+        pairs = [
+            (img.get("original_filename", ""), img.get("stored_filename", ""))
+            for img in card_images
+        ]
+        pairs = [(original, stored) for original, stored in pairs if original and stored]
+        image_filename_map = {Path(original).name: stored for original, stored in reversed(pairs)}
+        image_filename_map.update(pairs)
+        image_filename_map.update((stored, stored) for _, stored in pairs)
+
+        # Copy images directly into the export folder. Copies run in worker
+        # threads while the CSV is formatted and written below; the CSV only
+        # needs the filename map, not the copied files.
+        stored_filenames = list(
+            dict.fromkeys(img["stored_filename"] for img in card_images if img.get("stored_filename"))
+        )
+        with ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    shutil.copyfile, image_storage_dir / name, export_dir / name
+                ): name
+                for name in stored_filenames
+            }
+
+            # Convert image references to HTML, mapping to stored filenames
+            sub = _IMG_RE.sub
+            get = image_filename_map.get
+
+            def replace_with_stored(match):
+                original_name = match.group(1).strip()
+                return f'<img src="{get(original_name, original_name)}">'
+
+            rows = []
             for card in cards:
                 front = card.get("front", "")
                 back = card.get("back", "")
+                # Most cards have no images; skip the regex unless a marker is present
+                if _IMG_MARKER in front:
+                    front = sub(replace_with_stored, front)
+                if _IMG_MARKER in back:
+                    back = sub(replace_with_stored, back)
+                front = front.translate(_CSV_QUOTE_TABLE)
+                back = back.translate(_CSV_QUOTE_TABLE)
                 tags = card.get("tags", [])
 
-                # Convert image references to HTML, mapping to stored filenames
-                def replace_with_stored(match):
-                    original_name = match.group(1).strip()
-                    stored_name = image_filename_map.get(original_name, original_name)
-                    return f'<img src="{stored_name}">'
-
-                pattern = r'\[IMAGE:\s*([^\]]+)\]'
-                back = re.sub(pattern, replace_with_stored, back)
-                front = re.sub(pattern, replace_with_stored, front)
-
                 tag_str = self._format_tags(tags)
-                writer.writerow([front, back, tag_str])
+                rows.append(f'"{front}","{back}","{tag_str}"\r\n')
+
+            # Write CSV file
+            csv_path = export_dir / "cards.csv"
+            with open(
+                csv_path, "w", newline="", encoding="utf-8", buffering=CSV_BUFFER_SIZE
+            ) as file:
+                csv.writer(file).writerow(["front", "back", "tags"])
+                file.writelines(rows)
+
+            # Wait for the copies to finish
+            copied_images = set()
+            for future in as_completed(futures):
+                stored_filename = futures[future]
+                try:
+                    future.result()
+                except FileNotFoundError:
+                    logger.warning(f"Image not found in storage: {stored_filename}")
+                    continue
+                copied_images.add(stored_filename)
+                logger.debug(f"Copied image: {stored_filename}")
 
+        logger.info(f"Copied {len(copied_images)} images to export folder")
         logger.info(f"Successfully exported {len(cards)} cards and {len(copied_images)} images to {export_dir}")
         return export_dir, len(copied_images)
@@ -4,22 +4,62 @@ Card Generation Module
 Uses LLMs to generate flashcards from processed content.
 """
 
+import asyncio
+import hashlib
 import json
 import logging
+import re
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass, field
 
-from config.prompts import GENERATION_PROMPT, VALIDATION_PROMPT
+from config.prompts import (
+    GENERATION_PROMPT,
+    MULTI_CHUNK_GENERATION_PROMPT,
+    VALIDATION_PROMPT,
+)
+from config.settings import CHUNKS_PER_REQUEST
 from modules.llm_interface import LLMInterface
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # fall back to the stdlib encoder
+
 logger = logging.getLogger(__name__)
 
+# Local quality checks that decide whether a card needs the LLM validation pass
+MAX_FRONT_CHARS = 250
+MAX_BACK_CHARS = 400
+DUPLICATE_SIMILARITY = 0.9  # Jaccard similarity of front words
+
+_WORD_RE = re.compile(r"\w+")
+
+# Prompt text ahead of the document content, assembled once per process so
+# each chunk only pays for a single concatenation
+_CONTENT_HEADER = "\n\n## Document Content:\n"
+_GENERATION_PREFIX = GENERATION_PROMPT.user_prompt_template + _CONTENT_HEADER
+_MULTI_CHUNK_PREFIX = MULTI_CHUNK_GENERATION_PROMPT.user_prompt_template + _CONTENT_HEADER
+
+
+def _dumps_compact(data) -> str:
+    """Serialize to compact JSON for embedding in prompts (no pretty-printing)."""
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
 
+@dataclass(slots=True)
 class FlashCard:
     """Represents a single Anki flashcard."""
 
-    def __init__(self, front: str, back: str, tags: list[str] = None):
-        self.front = front
-        self.back = back
-        self.tags = tags or []
+    front: str
+    back: str
+    tags: list[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        # Callers historically pass tags=None for "no tags"
+        if self.tags is None:
+            self.tags = []
 
     def to_dict(self) -> dict:
         return {"front": self.front, "back": self.back, "tags": self.tags}
@@ -43,70 +83,394 @@ class CardGenerator:
     ):
         self.llm = llm_interface or LLMInterface(provider=llm_provider)
 
+    @staticmethod
+    def _generation_request(content: str) -> dict:
+        """Build the structured-output arguments for a content chunk."""
+        return {
+            "prompt": _GENERATION_PREFIX + content,
+            "output_format": GENERATION_PROMPT.output_format,
+            "system_prompt": GENERATION_PROMPT.system_prompt,
+            "source_text": content,
+        }
+
+    @staticmethod
+    def _multi_chunk_request(chunks: list[str]) -> dict:
+        """Build the structured-output arguments for several chunks in one call."""
+        sections = "\n\n".join(
+            f"--- CHUNK {i} ---\n{chunk}" for i, chunk in enumerate(chunks, start=1)
+        )
+        return {
+            "prompt": _MULTI_CHUNK_PREFIX + sections,
+            "output_format": MULTI_CHUNK_GENERATION_PROMPT.output_format,
+            "system_prompt": MULTI_CHUNK_GENERATION_PROMPT.system_prompt,
+            "source_text": sections,
+        }
+
+    @staticmethod
+    def _validation_request(cards: list[FlashCard]) -> dict:
+        """Build the structured-output arguments for validating cards."""
+        cards_json = _dumps_compact([card.to_dict() for card in cards])
+        return {
+            "prompt": VALIDATION_PROMPT.user_prompt_template.format(cards_json=cards_json),
+            "output_format": VALIDATION_PROMPT.output_format,
+            "system_prompt": VALIDATION_PROMPT.system_prompt,
+            "source_text": cards_json,
+        }
+
     def generate_cards_from_chunk(
         self, content: str, metadata: dict
     ) -> list[FlashCard]:
         """Generate flashcards from a single content chunk using centralized prompts."""
         logger.info("Generating cards from content chunk")
 
-        system_prompt = GENERATION_PROMPT.system_prompt
-        user_prompt = GENERATION_PROMPT.user_prompt_template
-        output_format = GENERATION_PROMPT.output_format
+        try:
+            response = self.llm.generate_structured_output(**self._generation_request(content))
+            cards = _parse_generated_cards(response)
+        except Exception as e:
+            logger.error(f"Error generating cards: {e}")
+            return []
 
-        # Append the document content to the prompt
-        full_prompt = f"{user_prompt}\n\n## Document Content:\n{content}"
+        logger.info(f"Generated {len(cards)} cards from chunk")
+        return cards
+
+    async def agenerate_cards_from_chunk(
+        self, content: str, metadata: dict
+    ) -> list[FlashCard]:
+        """Async version of generate_cards_from_chunk."""
+        logger.info("Generating cards from content chunk")
 
         try:
-            response = self.llm.generate_structured_output(
-                prompt=full_prompt,
-                output_format=output_format,
-                system_prompt=system_prompt,
+            response = await self.llm.agenerate_structured_output(
+                **self._generation_request(content)
             )
+            cards = _parse_generated_cards(response)
+        except Exception as e:
+            logger.error(f"Error generating cards: {e}")
+            return []
+
+        logger.info(f"Generated {len(cards)} cards from chunk")
+        return cards
 
-            cards = []
-            for card_data in response.get("cards", []):
-                card = FlashCard(
-                    front=card_data.get("front", ""),
-                    back=card_data.get("back", ""),
-                    tags=[],
-                )
-                cards.append(card)
+    async def agenerate_cards_from_chunks(
+        self, chunks: list[str], metadata: dict
+    ) -> list[list[FlashCard]]:
+        """
+        Generate flashcards for several chunks in a single LLM call.
 
-            logger.info(f"Generated {len(cards)} cards from chunk")
-            return cards
+        The chunks are delimited in one prompt, so the system prompt and round
+        trip are paid once for the group instead of once per chunk.
 
+        Args:
+            chunks: Content chunks to generate cards from
+            metadata: Document metadata
+
+        Returns:
+            One list of cards per chunk, in chunk order
+        """
+        if len(chunks) == 1:
+            return [await self.agenerate_cards_from_chunk(chunks[0], metadata)]
+
+        logger.info(f"Generating cards from {len(chunks)} chunks in one request")
+
+        try:
+            response = await self.llm.agenerate_structured_output(
+                **self._multi_chunk_request(chunks)
+            )
+            cards_by_chunk = _parse_cards_by_chunk(response, len(chunks))
         except Exception as e:
             logger.error(f"Error generating cards: {e}")
-            return []
+            return [[] for _ in chunks]
+
+        logger.info(f"Generated {sum(map(len, cards_by_chunk))} cards from {len(chunks)} chunks")
+        return cards_by_chunk
 
     def validate_cards(self, cards: list[FlashCard]) -> list[FlashCard]:
-        """Validate and improve generated cards using centralized prompts."""
+        """
+        Validate and improve generated cards using centralized prompts.
+
+        Near-duplicate cards are dropped locally, and only cards that fail
+        the local checks (see _local_validate) are sent to the LLM; if every
+        card passes, no LLM call is made.
+        """
         if not cards:
             return []
 
-        logger.info(f"Validating {len(cards)} cards")
+        passed, flagged = _prefilter_cards(cards)
+        if not flagged:
+            logger.info(f"All {len(passed)} cards passed local validation")
+            return passed
+
+        logger.info(f"Validating {len(flagged)} of {len(cards)} cards")
+
+        try:
+            response = self.llm.generate_structured_output(**self._validation_request(flagged))
+            improved_cards = _parse_improved_cards(response)
+        except Exception as e:
+            logger.error(f"Error validating cards: {e}")
+            return passed + flagged
+
+        logger.info(f"Validated and improved {len(improved_cards)} cards")
+        return passed + improved_cards
 
-        system_prompt = VALIDATION_PROMPT.system_prompt
-        output_format = VALIDATION_PROMPT.output_format
+    def iter_validated_cards(self, cards: list[FlashCard]) -> Iterator[FlashCard]:
+        """
+        Streaming version of validate_cards.
 
-        cards_json = json.dumps([card.to_dict() for card in cards], indent=2)
-        user_prompt = VALIDATION_PROMPT.user_prompt_template.format(cards_json=cards_json)
+        Cards that pass the local checks are yielded immediately; improved
+        cards are yielded one by one as the LLM streams them back, so a
+        caller can display results before the whole response has arrived.
+        """
+        passed, flagged = _prefilter_cards(cards)
+        yield from passed
+        if not flagged:
+            return
 
+        logger.info(f"Streaming validation of {len(flagged)} of {len(cards)} cards")
+
+        improved = 0
         try:
-            response = self.llm.generate_structured_output(
-                prompt=user_prompt,
-                output_format=output_format,
-                system_prompt=system_prompt,
-            )
+            for card_data in self.llm.stream_structured_items(
+                array_key="improved_cards", **self._validation_request(flagged)
+            ):
+                improved += 1
+                yield FlashCard.from_dict(card_data)
+        except Exception as e:
+            logger.error(f"Error validating cards: {e}")
+            if not improved:
+                yield from flagged
+            return
+
+        logger.info(f"Validated and improved {improved} cards")
+
+    async def avalidate_cards(self, cards: list[FlashCard]) -> list[FlashCard]:
+        """Async version of validate_cards."""
+        if not cards:
+            return []
 
-            improved_cards = []
-            for card_data in response.get("improved_cards", []):
-                card = FlashCard.from_dict(card_data)
-                improved_cards.append(card)
+        passed, flagged = _prefilter_cards(cards)
+        if not flagged:
+            logger.info(f"All {len(passed)} cards passed local validation")
+            return passed
 
-            logger.info(f"Validated and improved {len(improved_cards)} cards")
-            return improved_cards
+        logger.info(f"Validating {len(flagged)} of {len(cards)} cards")
 
+        try:
+            response = await self.llm.agenerate_structured_output(
+                **self._validation_request(flagged)
+            )
+            improved_cards = _parse_improved_cards(response)
         except Exception as e:
             logger.error(f"Error validating cards: {e}")
-            return cards
+            return passed + flagged
+
+        logger.info(f"Validated and improved {len(improved_cards)} cards")
+        return passed + improved_cards
+
+    async def iter_generate_all(
+        self,
+        chunks: list[str],
+        metadata: dict,
+        max_concurrency: int = 8,
+        validate: bool = True,
+        chunks_per_request: int = CHUNKS_PER_REQUEST,
+    ) -> AsyncIterator[list[FlashCard]]:
+        """
+        Generate (and optionally validate) cards for many chunks concurrently,
+        yielding each chunk's cards in chunk order.
+
+        Chunks are sent in groups of chunks_per_request per LLM call. Up to
+        max_concurrency requests are in flight at once, and the next starts
+        as soon as any one finishes. Closing the iterator early (e.g. once
+        enough cards have arrived) cancels the requests still in flight, so
+        wrap it in contextlib.aclosing() when breaking out of the loop.
+
+        Chunks that repeat an earlier one are not sent and get no cards.
+
+        Args:
+            chunks: Content chunks to generate cards from
+            metadata: Document metadata passed to each generation call
+            max_concurrency: Maximum number of requests in flight at once
+            validate: Whether to run the validation pass on each chunk's cards
+            chunks_per_request: Maximum chunks packed into one request
+
+        Yields:
+            One list of cards per chunk, in chunk order
+        """
+
+        async def process(group: list[str]) -> list[list[FlashCard]]:
+            cards_by_chunk = await self.agenerate_cards_from_chunks(group, metadata)
+            if validate:
+                cards_by_chunk = [await self.avalidate_cards(cards) for cards in cards_by_chunk]
+            return cards_by_chunk
+
+        unique, positions = _dedupe_chunks(chunks)
+        group_size = max(1, chunks_per_request)
+        groups = [unique[i:i + group_size] for i in range(0, len(unique), group_size)]
+        tasks: list[asyncio.Task] = []
+        closed = False
+
+        def launch(_finished: asyncio.Task | None = None) -> None:
+            # Also used as a done callback: each finished request starts the next
+            if closed or len(tasks) >= len(groups):
+                return
+            task = asyncio.ensure_future(process(groups[len(tasks)]))
+            tasks.append(task)
+            task.add_done_callback(launch)
+
+        try:
+            for _ in range(min(max_concurrency, len(groups))):
+                launch()
+            for position in positions:
+                if position is None:
+                    yield []
+                    continue
+                group_index, offset = divmod(position, group_size)
+                while len(tasks) <= group_index:
+                    launch()
+                yield (await tasks[group_index])[offset]
+        finally:
+            closed = True
+            for task in tasks:
+                task.cancel()
+
+    async def generate_all(
+        self,
+        chunks: list[str],
+        metadata: dict,
+        max_concurrency: int = 8,
+        validate: bool = True,
+        chunks_per_request: int = CHUNKS_PER_REQUEST,
+    ) -> list[list[FlashCard]]:
+        """
+        Generate (and optionally validate) cards for many chunks concurrently.
+
+        Chunks that repeat an earlier one are not sent and get no cards.
+
+        Args:
+            chunks: Content chunks to generate cards from
+            metadata: Document metadata passed to each generation call
+            max_concurrency: Maximum number of requests in flight at once
+            validate: Whether to run the validation pass on each chunk's cards
+            chunks_per_request: Maximum chunks packed into one request
+
+        Returns:
+            One list of cards per chunk, in chunk order
+        """
+        return [
+            cards
+            async for cards in self.iter_generate_all(
+                chunks, metadata, max_concurrency, validate, chunks_per_request
+            )
+        ]
+
+def _chunk_key(content: str) -> bytes:
+    """Content hash of a chunk, ignoring differences in whitespace."""
+    normalized = " ".join(content.split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+def _dedupe_chunks(chunks: list[str]) -> tuple[list[str], list[int | None]]:
+    """
+    Collapse repeated chunks (running headers, boilerplate pages, ...).
+
+    Returns:
+        Tuple of (unique chunks in first-seen order, and for each input chunk
+        its index into the unique list, or None if it repeats an earlier one)
+    """
+    seen: set[bytes] = set()
+    unique: list[str] = []
+    positions: list[int | None] = []
+
+    for chunk in chunks:
+        key = _chunk_key(chunk)
+        if key in seen:
+            positions.append(None)
+            continue
+        seen.add(key)
+        positions.append(len(unique))
+        unique.append(chunk)
+
+    if len(unique) < len(chunks):
+        logger.info(f"Skipping {len(chunks) - len(unique)} duplicate chunks")
+    return unique, positions
+
+
+def _local_validate(card: FlashCard) -> list[str]:
+    """
+    Run cheap rule-based quality checks on a card.
+
+    Args:
+        card: The card to check
+
+    Returns:
+        Issue codes (empty if the card looks fine)
+    """
+    issues = []
+    front = card.front.strip()
+    back = card.back.strip()
+
+    if not front:
+        issues.append("empty_front")
+    elif "?" not in front:
+        issues.append("no_question_mark")
+    if not back:
+        issues.append("empty_back")
+    if len(front) > MAX_FRONT_CHARS:
+        issues.append("front_too_long")
+    if len(back) > MAX_BACK_CHARS:
+        issues.append("back_too_long")
+
+    return issues
+
+
+def _prefilter_cards(cards: list[FlashCard]) -> tuple[list[FlashCard], list[FlashCard]]:
+    """
+    Drop near-duplicate cards and split the rest by local validation.
+
+    Returns:
+        Tuple of (cards that passed, cards flagged for LLM review)
+    """
+    passed: list[FlashCard] = []
+    flagged: list[FlashCard] = []
+    seen: list[frozenset[str]] = []
+
+    for card in cards:
+        words = frozenset(_WORD_RE.findall(card.front.lower()))
+        if words and any(
+            len(words & other) / len(words | other) >= DUPLICATE_SIMILARITY for other in seen
+        ):
+            logger.debug(f"Dropping duplicate card: {card.front[:50]}")
+            continue
+        seen.append(words)
+
+        issues = _local_validate(card)
+        if issues:
+            logger.debug(f"Card flagged for validation ({', '.join(issues)}): {card.front[:50]}")
+            flagged.append(card)
+        else:
+            passed.append(card)
+
+    return passed, flagged
+
+
+def _parse_generated_cards(response: dict) -> list[FlashCard]:
+    """Build FlashCards from a generation response."""
+    # Generated cards are untagged; the default factory supplies the list
+    return [
+        FlashCard(card_data.get("front", ""), card_data.get("back", ""))
+        for card_data in response.get("cards", [])
+    ]
+
+
+def _parse_cards_by_chunk(response: dict, chunk_count: int) -> list[list[FlashCard]]:
+    """Build per-chunk FlashCard lists from a multi-chunk response."""
+    groups = response.get("cards_by_chunk", [])[:chunk_count]
+    if len(groups) < chunk_count:
+        logger.warning(f"Expected cards for {chunk_count} chunks, got {len(groups)}")
+        groups += [[] for _ in range(chunk_count - len(groups))]
+    return [_parse_generated_cards({"cards": group}) for group in groups]
+
+
+def _parse_improved_cards(response: dict) -> list[FlashCard]:
+    """Build FlashCards from a validation response."""
+    return [FlashCard.from_dict(card_data) for card_data in response.get("improved_cards", [])]
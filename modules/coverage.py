@@ -0,0 +1,99 @@
+"""
+Coverage Module
+---------------
+Cheap local estimate of how well existing cards already cover a document.
+
+Used to skip the continue-generation LLM call when the previous passes
+have already covered (nearly) every concept in the source text.
+"""
+
+import logging
+import re
+from collections.abc import Iterable
+
+from config.settings import CONTINUE_SKIP_DENSITY
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"[a-z][a-z0-9'-]{2,}")
+
+# Suffixes stripped by the crude stemmer, longest first
+SUFFIXES = ("ations", "ation", "ments", "ment", "ness", "ings", "ing", "ies", "ed", "es", "ly", "s")
+
+STOPWORDS = frozenset(
+    """
+    about above after again against also among and another any are because been
+    before being below between both but can cannot could did does doing down
+    during each either even every few for from further had has have having her
+    here hers him his how however into its itself just may might more most
+    much must not now off once only other our ours out over own same shall she
+    should since some such than that the their theirs them then there these
+    they this those through thus too under until upon very was were what when
+    where whether which while who whom whose why will with within without would
+    yet you your yours
+    """.split()
+)
+
+
+def _stem(word: str) -> str:
+    """Strip a common English suffix, keeping at least a 3-letter stem."""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def content_terms(text: str) -> set[str]:
+    """Return the set of stemmed content words in a piece of text."""
+    return {
+        _stem(word)
+        for word in WORD_PATTERN.findall(text.lower())
+        if word not in STOPWORDS
+    }
+
+
+def coverage_ratio(existing_cards: Iterable, doc_text: str) -> float:
+    """
+    Fraction of the document's content terms that already appear in cards.
+
+    Args:
+        existing_cards: Objects with ``front`` and ``back`` attributes
+        doc_text: Source document text
+
+    Returns:
+        Coverage between 0.0 and 1.0 (1.0 for documents without content terms)
+    """
+    doc_terms = content_terms(doc_text)
+    if not doc_terms:
+        return 1.0
+
+    card_terms: set[str] = set()
+    for card in existing_cards:
+        card_terms |= content_terms(f"{card.front}\n{card.back}")
+
+    return len(doc_terms & card_terms) / len(doc_terms)
+
+
+def should_continue(
+    existing_cards: Iterable,
+    doc_text: str,
+    threshold: float = CONTINUE_SKIP_DENSITY,
+) -> bool:
+    """
+    Decide whether another generation pass is worth an LLM call.
+
+    Args:
+        existing_cards: Cards already generated for the document
+        doc_text: Source document text
+        threshold: Coverage at or above which generation is skipped
+
+    Returns:
+        True if coverage is below the threshold (or unknown), False otherwise
+    """
+    if not doc_text.strip():
+        # No local text to compare against (e.g. scanned PDF) - let the LLM decide
+        return True
+
+    ratio = coverage_ratio(existing_cards, doc_text)
+    logger.info(f"Existing cards cover {ratio:.0%} of document terms (threshold {threshold:.0%})")
+    return ratio < threshold
@@ -0,0 +1,241 @@
+"""
+LLM Cache Module
+----------------
+Persistent, content-addressed cache for deterministic LLM responses.
+
+Responses are keyed by a SHA-256 of everything that determines the output
+(provider, model, prompts, sampling parameters) and stored in SQLite, so
+re-running a document with unchanged prompts skips the API entirely. The
+producing model is stored alongside each entry so a model's responses can
+be purged when it is retired or misbehaves.
+
+SemanticCache is an optional second tier that matches paraphrased prompts
+by embedding similarity.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from array import array
+from collections import deque
+from functools import cache
+from pathlib import Path
+
+from config.settings import (
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+    LLM_SEMANTIC_CACHE_SIZE,
+    LLM_SEMANTIC_CACHE_THRESHOLD,
+    ensure_dir,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """SQLite-backed key/value store for LLM responses with per-entry expiry."""
+
+    def __init__(self, path: str | Path, ttl: int = LLM_CACHE_TTL):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: Path to the SQLite database file
+            ttl: Default time-to-live for new entries, in seconds
+        """
+        self.path = Path(path)
+        self.ttl = ttl
+        ensure_dir(self.path.parent)
+
+        # Shared across threads (FastAPI runs sync endpoints in a pool);
+        # the lock serializes access to the single connection
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    response BLOB NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    expires_at INTEGER NOT NULL,
+                    model TEXT
+                )
+                """
+            )
+            # Databases created before the model column existed
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(llm_cache)")}
+            if "model" not in columns:
+                self._conn.execute("ALTER TABLE llm_cache ADD COLUMN model TEXT")
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """
+        Canonicalize prompt text for hashing.
+
+        Line endings are unified and surrounding whitespace is dropped, so
+        prompts that differ only in those respects share a cache entry.
+        """
+        return text.replace("\r\n", "\n").replace("\r", "\n").strip()
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        """
+        Build a cache key from the values that determine an LLM response.
+
+        String values are normalized with normalize_text() first.
+
+        Args:
+            **parts: JSON-serializable request fields (provider, model, prompts, ...)
+
+        Returns:
+            Hex SHA-256 digest of the canonical JSON encoding
+        """
+        parts = {
+            name: LLMCache.normalize_text(value) if isinstance(value, str) else value
+            for name, value in parts.items()
+        }
+        canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Cache key from make_key()
+
+        Returns:
+            The cached response, or None if missing or expired
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND expires_at > ?",
+                (key, int(time.time())),
+            ).fetchone()
+        return row[0].decode("utf-8") if row else None
+
+    def set(
+        self, key: str, response: str, ttl: int | None = None, model: str | None = None
+    ) -> None:
+        """
+        Store a response.
+
+        Args:
+            key: Cache key from make_key()
+            response: The LLM response text
+            ttl: Time-to-live in seconds (defaults to the cache's ttl)
+            model: Model that produced the response, for purge()
+        """
+        now = int(time.time())
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, created_at, expires_at, model) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response.encode("utf-8"), now, expires_at, model),
+            )
+
+    def purge(self, model: str | None = None) -> int:
+        """
+        Delete expired entries, or every entry produced by a model.
+
+        Args:
+            model: If given, remove all of this model's responses instead
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock, self._conn:
+            if model is None:
+                cursor = self._conn.execute(
+                    "DELETE FROM llm_cache WHERE expires_at <= ?", (int(time.time()),)
+                )
+            else:
+                cursor = self._conn.execute("DELETE FROM llm_cache WHERE model = ?", (model,))
+        return cursor.rowcount
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+class SemanticCache:
+    """
+    In-memory nearest-neighbour cache keyed by prompt embeddings.
+
+    Entries are grouped by scope (a hash of provider, model, system prompt
+    and sampling parameters); a lookup only matches prompts within the same
+    scope, so a response is never reused under different instructions.
+    """
+
+    def __init__(self, threshold: float, max_entries: int = LLM_SEMANTIC_CACHE_SIZE):
+        """
+        Create an empty cache.
+
+        Args:
+            threshold: Minimum cosine similarity for a hit (0-1)
+            max_entries: Oldest entries are evicted beyond this count
+        """
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: deque[tuple[str, array, str]] = deque(maxlen=max_entries)
+
+    @staticmethod
+    def _unit(vector: list[float]) -> array:
+        """Return vector scaled to unit length, so dot product is cosine."""
+        norm = math.sqrt(math.fsum(x * x for x in vector)) or 1.0
+        return array("f", (x / norm for x in vector))
+
+    def get(self, scope: str, embedding: list[float]) -> str | None:
+        """
+        Find the most similar cached prompt in a scope.
+
+        Args:
+            scope: Scope key from LLMCache.make_key()
+            embedding: Embedding of the new prompt
+
+        Returns:
+            The cached response, or None if nothing reaches the threshold
+        """
+        query = self._unit(embedding)
+        best_score, best_response = self.threshold, None
+        with self._lock:
+            entries = [(vector, response) for s, vector, response in self._entries if s == scope]
+        for vector, response in entries:
+            score = math.sumprod(query, vector)
+            if score >= best_score:
+                best_score, best_response = score, response
+        if best_response is not None:
+            logger.debug(f"Semantic cache hit (similarity {best_score:.3f})")
+        return best_response
+
+    def set(self, scope: str, embedding: list[float], response: str) -> None:
+        """
+        Add a prompt embedding and its response.
+
+        Args:
+            scope: Scope key from LLMCache.make_key()
+            embedding: Embedding of the prompt
+            response: The LLM response text
+        """
+        with self._lock:
+            self._entries.append((scope, self._unit(embedding), response))
+
+
+@cache
+def get_default_cache() -> LLMCache:
+    """Return the process-wide cache stored at LLM_CACHE_PATH."""
+    logger.debug(f"Opening LLM response cache at {LLM_CACHE_PATH}")
+    return LLMCache(LLM_CACHE_PATH)
+
+
+@cache
+def get_default_semantic_cache() -> SemanticCache:
+    """Return the process-wide semantic cache (LLM_SEMANTIC_CACHE_THRESHOLD)."""
+    return SemanticCache(LLM_SEMANTIC_CACHE_THRESHOLD)
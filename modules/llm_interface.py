@@ -4,53 +4,687 @@ LLM Interface Module
 Provides a unified interface for communicating with different LLM providers.
 """
 
-import base64
+import asyncio
+import binascii
+import hashlib
 import json
 import logging
+import mmap
+import os
+import random
+import re
+import threading
 import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
+from functools import cache, lru_cache
 from pathlib import Path
+from typing import NamedTuple
 
-import httpx
+import anthropic
 import openai
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # fall back to the stdlib json module
+
+try:
+    import h2  # noqa: F401  (lets the SDK HTTP clients negotiate HTTP/2)
+
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+from config import settings
 from config.settings import (
-    ANTHROPIC_API_KEY,
-    DEFAULT_LLM_PROVIDER,
+    IMAGE_MEDIA_TYPES,
+    LLM_CACHE_ENABLED,
     LLM_CONFIG,
-    OPENAI_API_KEY,
+    LLM_EMBEDDING_MODEL,
+    LLM_SEMANTIC_CACHE_THRESHOLD,
+)
+from modules.llm_cache import (
+    LLMCache,
+    SemanticCache,
+    get_default_cache,
+    get_default_semantic_cache,
 )
 
 logger = logging.getLogger(__name__)
 
+# Request timeout for every SDK client: long reads for big generations, fast
+# failure when the API host is unreachable. Each SDK gets its own Timeout
+# class since newer releases ship their own HTTP client package.
+LLM_READ_TIMEOUT = 600.0  # seconds
+LLM_CONNECT_TIMEOUT = 5.0  # seconds
+
+
+@cache
+def _shared_http_client(provider: str):
+    """
+    Return the process-wide pooled HTTP client for a provider's sync SDK.
+
+    LLMInterface is created per request in the backend; sharing the client
+    keeps TCP/TLS connections to the API alive between them. (Async clients
+    are bound to an event loop, so those stay per instance.) HTTP/2 is used
+    when the optional h2 package is installed.
+    """
+    if provider == "openai":
+        return openai.DefaultHttpxClient(http2=_HTTP2)
+    return anthropic.DefaultHttpxClient(http2=_HTTP2)
+
+
+# Request parameters used when LLM_CONFIG does not set them
+_PROVIDER_DEFAULTS = {
+    "openai": {"model": "gpt-4", "temperature": 0.3, "max_tokens": 1000},
+    "anthropic": {"model": "claude-sonnet-4-5-20250514", "temperature": 0.3, "max_tokens": 4096},
+}
+
+# Name of the tool Anthropic is forced to call to return structured output
+_JSON_TOOL_NAME = "emit_json"
+
+# (provider, model) pairs that reject native JSON output. Seeded with models
+# known to lack json_schema support and extended whenever a request is
+# rejected, so the fallback round trip is paid at most once per process
+_NATIVE_JSON_UNSUPPORTED: set[tuple[str, str]] = {
+    ("openai", "gpt-4"),
+    ("openai", "gpt-4-turbo"),
+    ("openai", "gpt-3.5-turbo"),
+}
+
+
+# Worker threads for reading/encoding images sent alongside markdown
+IMAGE_ENCODE_WORKERS = 8
+
+# Read size for streaming base64 encoding; a multiple of 3 so chunks encode
+# without padding and concatenate into one valid base64 string
+_B64_READ_SIZE = 3 * 64 * 1024
+
+
+def _b64encode_file(path: Path) -> str:
+    """
+    Base64-encode a file without holding a second copy of its bytes.
+
+    The file is memory-mapped and encoded chunk by chunk into a buffer
+    preallocated at the exact output size.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ""  # mmap cannot map an empty file
+
+        encoded = bytearray((size + 2) // 3 * 4)
+        pos = 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            for start in range(0, size, _B64_READ_SIZE):
+                chunk = binascii.b2a_base64(view[start:start + _B64_READ_SIZE], newline=False)
+                encoded[pos:pos + len(chunk)] = chunk
+                pos += len(chunk)
+    return encoded.decode("ascii")
+
+
+# Encoded images keyed by (path, mtime, size), least recently used first.
+# Shared across instances (the backend builds one LLMInterface per request)
+# and bounded by total encoded size.
+IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_image_cache: OrderedDict[tuple[str, int, int], tuple[str, str]] = OrderedDict()
+_image_cache_bytes = 0
+_image_cache_lock = threading.Lock()
+
+
+def _cached_image(key: tuple[str, int, int]) -> tuple[str, str] | None:
+    """Look up an encoded image, marking it recently used."""
+    with _image_cache_lock:
+        entry = _image_cache.get(key)
+        if entry is not None:
+            _image_cache.move_to_end(key)
+        return entry
+
+
+def _cache_image(key: tuple[str, int, int], entry: tuple[str, str]) -> None:
+    """Store an encoded image, evicting the least recently used beyond the budget."""
+    global _image_cache_bytes
+    size = len(entry[0])
+    if size > IMAGE_CACHE_MAX_BYTES:
+        return
+    with _image_cache_lock:
+        previous = _image_cache.pop(key, None)
+        if previous is not None:
+            _image_cache_bytes -= len(previous[0])
+        _image_cache[key] = entry
+        _image_cache_bytes += size
+        while _image_cache_bytes > IMAGE_CACHE_MAX_BYTES:
+            _, (evicted, _) = _image_cache.popitem(last=False)
+            _image_cache_bytes -= len(evicted)
+
+
+@lru_cache(maxsize=4)
+def _pdf_fallback_text(pdf_path: str, mtime_ns: int, size: int) -> str:
+    """
+    Extract a PDF's text for providers without native PDF input.
+
+    Memoized on (path, mtime, size): page batches and JSON retries over the
+    same document would otherwise re-run the (slow) extraction every call.
+    """
+    from modules.pdf_processor import PDFProcessor
+
+    chunks, _ = PDFProcessor().process_pdf(pdf_path)
+    return "\n\n".join(chunks)
+
+
+# Slice size for hashing large base64 strings without encoding a full copy
+_HASH_SLICE_CHARS = 1024 * 1024
+
+
+def _text_sha256(text: str) -> str:
+    """SHA-256 of an ASCII string (e.g. base64 data), encoded one slice at a time."""
+    digest = hashlib.sha256()
+    for start in range(0, len(text), _HASH_SLICE_CHARS):
+        digest.update(text[start:start + _HASH_SLICE_CHARS].encode("ascii"))
+    return digest.hexdigest()
+
+
+def _page_runs(pages: list[int]) -> list[tuple[int, int]]:
+    """Group page indices into (first, last) runs of consecutive pages, keeping order."""
+    runs: list[tuple[int, int]] = []
+    for page in pages:
+        if runs and page == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], page)
+        else:
+            runs.append((page, page))
+    return runs
+
+
+# Anthropic prompt-caching marker: the prefix up to this block is cached
+# server-side for a few minutes and billed at a fraction on reuse
+_EPHEMERAL_CACHE = {"type": "ephemeral"}
+
+
+def _cached_system(system_prompt: str) -> list[dict]:
+    """Wrap an Anthropic system prompt as a cacheable content block."""
+    return [{"type": "text", "text": system_prompt, "cache_control": _EPHEMERAL_CACHE}]
+
+
+# Requests in flight at once for generate_completions_batch
+BATCH_CONCURRENCY = 16
+
+# Retry policy for rate-limited LLM calls: wait as long as the provider asks
+# (Retry-After), else exponential backoff with jitter
+RATE_LIMIT_MAX_ATTEMPTS = 6
+RATE_LIMIT_BACKOFF_INITIAL = 1.0  # seconds
+RATE_LIMIT_BACKOFF_MAX = 60.0  # seconds
+RATE_LIMIT_MIN_DELAY = 0.25  # seconds; floor for header-driven waits
+CONNECTION_RETRY_DELAY = 1.0  # seconds; timeouts and dropped connections
+
+_API_STATUS_ERRORS = (openai.APIStatusError, anthropic.APIStatusError)
+_RATE_LIMIT_ERRORS = (openai.RateLimitError, anthropic.RateLimitError)
+_CONNECTION_ERRORS = (openai.APIConnectionError, anthropic.APIConnectionError)
+_RETRYABLE_ERRORS = _API_STATUS_ERRORS + _CONNECTION_ERRORS
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    """Whether an API error is a rate-limit error worth retrying."""
+    return isinstance(error, _RATE_LIMIT_ERRORS) or (
+        isinstance(error, _API_STATUS_ERRORS) and error.status_code == 429
+    )
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Delay before retry number attempt + 1: exponential, capped, plus jitter."""
+    return min(RATE_LIMIT_BACKOFF_MAX, RATE_LIMIT_BACKOFF_INITIAL * 2**attempt) + random.random()
+
+
+def _retry_after(error: Exception) -> float | None:
+    """
+    Read the provider's requested wait from a rate-limit response.
+
+    Checks retry-after-ms, retry-after (seconds) and Anthropic's
+    anthropic-ratelimit-requests-reset (RFC 3339 timestamp).
+
+    Returns:
+        Seconds to wait, or None if the response carries no usable hint
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value) * scale
+        except (TypeError, ValueError):
+            pass  # HTTP-date form; fall through to the reset timestamp
+
+    reset = headers.get("anthropic-ratelimit-requests-reset")
+    if reset:
+        try:
+            reset_at = datetime.fromisoformat(reset.replace("Z", "+00:00"))
+        except (TypeError, ValueError):
+            return None
+        return (reset_at - datetime.now(UTC)).total_seconds()
+    return None
+
+
+def _retry_delay(error: Exception, attempt: int) -> float | None:
+    """
+    Decide whether and how long to wait before retrying a failed call.
+
+    Returns:
+        Seconds to sleep, or None if the error should not be retried
+    """
+    if attempt >= RATE_LIMIT_MAX_ATTEMPTS - 1:
+        return None
+    if isinstance(error, _CONNECTION_ERRORS):
+        return CONNECTION_RETRY_DELAY
+    if not _is_rate_limit(error):
+        return None
+
+    requested = _retry_after(error)
+    if requested is None:
+        return _backoff_delay(attempt)
+    return min(RATE_LIMIT_BACKOFF_MAX, max(requested, RATE_LIMIT_MIN_DELAY))
+
+
+def _retry_on_rate_limit(call, *args, **kwargs):
+    """Call an SDK method, retrying rate limits and connection failures."""
+    for attempt in range(RATE_LIMIT_MAX_ATTEMPTS):
+        try:
+            return call(*args, **kwargs)
+        except _RETRYABLE_ERRORS as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                raise
+            logger.info(f"{type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{RATE_LIMIT_MAX_ATTEMPTS})")
+            time.sleep(delay)
+
+
+async def _aretry_on_rate_limit(call, *args, **kwargs):
+    """Async version of _retry_on_rate_limit; sleeps without blocking the loop."""
+    for attempt in range(RATE_LIMIT_MAX_ATTEMPTS):
+        try:
+            return await call(*args, **kwargs)
+        except _RETRYABLE_ERRORS as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                raise
+            logger.info(f"{type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{RATE_LIMIT_MAX_ATTEMPTS})")
+            await asyncio.sleep(delay)
+
+
+# Anthropic requests with large output budgets are streamed: the first bytes
+# arrive sooner, and the SDK refuses long non-streaming requests outright
+ANTHROPIC_STREAM_MIN_TOKENS = 8192
+
+
+def _stream_anthropic_message(client, **params):
+    """Run a Messages request via the streaming API and return the final message."""
+    with client.messages.stream(**params) as stream:
+        return stream.get_final_message()
+
+
+async def _astream_anthropic_message(client, **params):
+    """Async version of _stream_anthropic_message."""
+    async with client.messages.stream(**params) as stream:
+        return await stream.get_final_message()
+
+
+def _anthropic_message(client, **params):
+    """
+    Send an Anthropic Messages request, retrying rate limits.
+
+    Streams when max_tokens is at least ANTHROPIC_STREAM_MIN_TOKENS; the
+    returned message is the same either way.
+    """
+    if params["max_tokens"] >= ANTHROPIC_STREAM_MIN_TOKENS:
+        return _retry_on_rate_limit(_stream_anthropic_message, client, **params)
+    return _retry_on_rate_limit(client.messages.create, **params)
+
+
+async def _aanthropic_message(client, **params):
+    """Async version of _anthropic_message."""
+    if params["max_tokens"] >= ANTHROPIC_STREAM_MIN_TOKENS:
+        return await _aretry_on_rate_limit(_astream_anthropic_message, client, **params)
+    return await _aretry_on_rate_limit(client.messages.create, **params)
+
+
+def _json_loads(text: str | bytes):
+    """Parse JSON, using orjson when available (raises json.JSONDecodeError)."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+# Appended to the system prompt when a response parses but has the wrong shape
+_SHAPE_RETRY_NOTE = "\nYOUR PREVIOUS RESPONSE DID NOT MATCH THE REQUIRED FORMAT ({problem}). FOLLOW THE FORMAT EXACTLY."
+
+# A response wrapped in a markdown code fence (```json ... ``` or ``` ... ```);
+# the closing fence is optional so a reply cut off at max_tokens still parses
+_FENCE_RE = re.compile(r"\A\s*```(?:json)?\s*(?P<body>.*?)\s*(?:```\s*)?\Z", re.DOTALL)
+
+
+def _strip_fences(response: str) -> str:
+    """Return the payload of a fenced response, or the stripped response."""
+    if match := _FENCE_RE.match(response):
+        return match.group("body")
+    return response.strip()
+
+
+def _extract_json_object(text: str) -> str | None:
+    """
+    Find the first balanced {...} object in text (e.g. JSON wrapped in prose).
+
+    A single pass tracks brace depth, skipping braces inside strings.
+
+    Returns:
+        The object's text, or None if no balanced object is found
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+
+    depth = 0
+    in_string = escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def _json_dumps(data) -> str:
+    """Serialize to compact JSON text, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data, ensure_ascii=False)
+
+
+# Output formats are almost always the module-level dicts in config.prompts,
+# so their rendered forms are memoized by identity. Entries hold a reference
+# to the dict, which keeps its id from being reused while cached.
+_FORMAT_CACHE_SIZE = 32
+_format_cache: dict[int, tuple[dict, "_FormatArtifacts"]] = {}
+
+
+class _FormatArtifacts(NamedTuple):
+    """Derived forms of an output format, computed once per format."""
+
+    description: str  # indented JSON for prompts
+    schema: dict  # strict JSON Schema for native JSON modes
+    check: Callable[[object], str | None]  # shape check for parsed responses
+
+
+def _compile_shape_check(output_format: dict) -> Callable[[object], str | None]:
+    """
+    Build a checker for the top-level shape of responses to output_format.
+
+    The expected keys and container types are resolved once here, so each
+    check is a flat loop rather than a walk over the example document.
+
+    Returns:
+        Function taking a parsed response and returning a description of the
+        first mismatch, or None if the shape is right
+    """
+    expected = tuple(
+        (key, dict if isinstance(value, dict) else list if isinstance(value, list) else None)
+        for key, value in output_format.items()
+    )
+
+    def check(result) -> str | None:
+        if not isinstance(result, dict):
+            return "expected a JSON object"
+        for key, kind in expected:
+            if key not in result:
+                return f'missing key "{key}"'
+            if kind is not None and not isinstance(result[key], kind):
+                return f'"{key}" must be {"an object" if kind is dict else "an array"}'
+        return None
+
+    return check
+
+
+def _format_artifacts(output_format: dict) -> _FormatArtifacts:
+    """Return the description, schema and shape check for an output format."""
+    entry = _format_cache.get(id(output_format))
+    if entry is not None and entry[0] is output_format:
+        return entry[1]
+
+    if orjson is not None:
+        description = orjson.dumps(output_format, option=orjson.OPT_INDENT_2).decode()
+    else:
+        description = json.dumps(output_format, indent=2)
+    artifacts = _FormatArtifacts(
+        description, json_schema_from_example(output_format), _compile_shape_check(output_format)
+    )
+
+    if len(_format_cache) >= _FORMAT_CACHE_SIZE:
+        _format_cache.pop(next(iter(_format_cache)))
+    _format_cache[id(output_format)] = (output_format, artifacts)
+    return artifacts
+
+
+def iter_json_array_items(chunks: Iterable[str], key: str) -> Iterator:
+    """
+    Incrementally parse the items of a top-level JSON array from text chunks.
+
+    Each element of response[key] is yielded as soon as its closing bracket
+    has arrived, so callers can act on early items while the rest of the
+    response is still streaming. Leading markdown fences or other text
+    before the key are ignored.
+
+    Args:
+        chunks: Pieces of a JSON document, in order (e.g. streamed tokens)
+        key: Name of the array whose items should be yielded
+
+    Yields:
+        Parsed array items
+    """
+    decoder = json.JSONDecoder()
+    marker = json.dumps(key)
+    buffer = ""
+    pos = -1  # index just past the array's "[" once found
+
+    for chunk in chunks:
+        buffer += chunk
+        if pos < 0:
+            start = buffer.find(marker)
+            bracket = buffer.find("[", start + len(marker)) if start >= 0 else -1
+            if bracket < 0:
+                continue
+            pos = bracket + 1
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer) or buffer[pos] == "]":
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # item incomplete; wait for more text
+            if end == len(buffer) and not isinstance(item, (dict, list, str)):
+                break  # a number or literal may continue in the next chunk
+            pos = end
+            yield item
+
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+
+
+def _format_description(output_format: dict) -> str:
+    """Render an output format example as indented JSON for prompts."""
+    return _format_artifacts(output_format).description
+
+
+@lru_cache(maxsize=64)
+def _json_system_prompt(system_prompt: str, format_description: str) -> str:
+    """Append JSON output instructions to a system prompt (memoized)."""
+    return (
+        f"{system_prompt}\n\n"
+        f"You must respond with a valid JSON object using the following format:\n"
+        f"{format_description}\n\n"
+        f"Do not include any text outside of the JSON object."
+    )
+
+
+def _structured_system_prompt(system_prompt: str, output_format: dict) -> str:
+    """System prompt instructing the model to answer in output_format's JSON shape."""
+    return _json_system_prompt(system_prompt, _format_description(output_format))
+
+
+def json_schema_from_example(example) -> dict:
+    """
+    Infer a strict JSON Schema from an example value.
+
+    The output_format dicts used throughout the app are example documents
+    (e.g. {"cards": [{"front": "...", "back": "..."}]}); every key is treated
+    as required and lists take their item schema from the first element.
+
+    Args:
+        example: Example JSON value
+
+    Returns:
+        JSON Schema dict
+    """
+    if isinstance(example, dict):
+        return {
+            "type": "object",
+            "properties": {key: json_schema_from_example(value) for key, value in example.items()},
+            "required": list(example),
+            "additionalProperties": False,
+        }
+    if isinstance(example, list):
+        return {"type": "array", "items": json_schema_from_example(example[0]) if example else {}}
+    if isinstance(example, bool):
+        return {"type": "boolean"}
+    if isinstance(example, int):
+        return {"type": "integer"}
+    if isinstance(example, float):
+        return {"type": "number"}
+    if example is None:
+        return {"type": "null"}
+    return {"type": "string"}
+
+
+# Default for LLMInterface's cache arguments: use the shared caches.
+# Passing None instead disables that cache.
+_DEFAULT_CACHE = object()
+
 
 class LLMInterface:
     """Interface for communicating with Large Language Models."""
 
-    def __init__(self, provider: str = DEFAULT_LLM_PROVIDER):
+    def __init__(
+        self,
+        provider: str | None = None,
+        cache: LLMCache | None = _DEFAULT_CACHE,
+        semantic_cache: SemanticCache | None = _DEFAULT_CACHE,
+    ):
         """
         Initialize the LLM interface.
 
         Args:
-            provider: The LLM provider to use ('openai' or 'anthropic')
+            provider: The LLM provider to use ('openai' or 'anthropic');
+                defaults to DEFAULT_LLM_PROVIDER
+            cache: Response cache for temperature-0 completions, or None to
+                disable caching; defaults to the shared on-disk cache when
+                LLM_CACHE_ENABLED
+            semantic_cache: Embedding-similarity cache consulted after an
+                exact-cache miss, or None to disable it; defaults to the shared
+                in-memory cache when LLM_SEMANTIC_CACHE_THRESHOLD is set and an
+                OpenAI key exists
         """
+        provider = provider or settings.DEFAULT_LLM_PROVIDER
         self.provider = provider.lower()
         self.config = LLM_CONFIG.get(self.provider, {})
+        # Effective request parameters, merged once; calls without overrides
+        # use this dict as-is
+        self._defaults = {**_PROVIDER_DEFAULTS.get(self.provider, {}), **self.config}
+        if cache is _DEFAULT_CACHE:
+            cache = get_default_cache() if LLM_CACHE_ENABLED else None
+        self.cache = cache
+        if semantic_cache is _DEFAULT_CACHE:
+            semantic_cache = (
+                get_default_semantic_cache()
+                if LLM_SEMANTIC_CACHE_THRESHOLD > 0 and settings.OPENAI_API_KEY
+                else None
+            )
+        self.semantic_cache = semantic_cache
+        self._embedding_client = None  # created on first semantic-cache lookup
 
         # Initialize the appropriate client
         if self.provider == "openai":
-            if not OPENAI_API_KEY:
+            api_key = settings.OPENAI_API_KEY
+            if not api_key:
                 raise ValueError("OpenAI API key is required but not provided")
-            self.client = openai.OpenAI(api_key=OPENAI_API_KEY)
+            timeout = openai.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+            self.client = openai.OpenAI(
+                api_key=api_key,
+                timeout=timeout,
+                http_client=_shared_http_client(self.provider),
+            )
+            self.aclient = openai.AsyncOpenAI(
+                api_key=api_key,
+                timeout=timeout,
+                http_client=openai.DefaultAsyncHttpxClient(http2=_HTTP2),
+            )
         elif self.provider == "anthropic":
-            if not ANTHROPIC_API_KEY:
+            api_key = settings.ANTHROPIC_API_KEY
+            if not api_key:
                 raise ValueError("Anthropic API key is required but not provided")
-            self.client = Anthropic(api_key=ANTHROPIC_API_KEY)
+            timeout = anthropic.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+            self.client = Anthropic(
+                api_key=api_key,
+                timeout=timeout,
+                http_client=_shared_http_client(self.provider),
+            )
+            self.aclient = AsyncAnthropic(
+                api_key=api_key,
+                timeout=timeout,
+                http_client=anthropic.DefaultAsyncHttpxClient(http2=_HTTP2),
+            )
         else:
             raise ValueError(f"Unsupported LLM provider: {provider}")
 
+        # Resolve provider dispatch once instead of branching on every call
+        self._completer = {
+            "openai": self._call_openai,
+            "anthropic": self._call_anthropic,
+        }[self.provider]
+        self._acompleter = {
+            "openai": self._acall_openai,
+            "anthropic": self._acall_anthropic,
+        }[self.provider]
+        self._streamer = {
+            "openai": self._stream_openai,
+            "anthropic": self._stream_anthropic,
+        }[self.provider]
+        self._supports_pdf = self.provider == "anthropic"
+
         logger.info(f"Initialized LLM interface with provider: {self.provider}")
 
+    def _request_params(self, kwargs: dict) -> dict:
+        """Merge per-call overrides into the default request parameters."""
+        return {**self._defaults, **kwargs} if kwargs else self._defaults
+
     def _call_openai(self, prompt: str, system_prompt: str, **kwargs) -> str:
         """
         Call the OpenAI API with the given prompts.
@@ -63,25 +697,22 @@ class LLMInterface:
         Returns:
             The LLM response as a string
         """
-        params = {**self.config, **kwargs}
+        params = self._request_params(kwargs)
 
         try:
-            response = self.client.chat.completions.create(
-                model=params.get("model", "gpt-4"),
+            response = _retry_on_rate_limit(
+                self.client.chat.completions.create,
+                model=params["model"],
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": prompt},
                 ],
-                temperature=params.get("temperature", 0.3),
-                max_tokens=params.get("max_tokens", 1000),
+                temperature=params["temperature"],
+                max_tokens=params["max_tokens"],
             )
             return response.choices[0].message.content
         except Exception as e:
             logger.error(f"Error calling OpenAI API: {e}")
-            if "rate limit" in str(e).lower():
-                logger.info("Rate limit hit, backing off and retrying...")
-                time.sleep(5)
-                return self._call_openai(prompt, system_prompt, **kwargs)
             raise
 
     def _call_anthropic(self, prompt: str, system_prompt: str, **kwargs) -> str:
@@ -96,99 +727,573 @@ class LLMInterface:
         Returns:
             The LLM response as a string
         """
-        params = {**self.config, **kwargs}
+        params = self._request_params(kwargs)
+
+        try:
+            response = _anthropic_message(
+                self.client,
+                model=params["model"],
+                system=_cached_system(system_prompt),
+                messages=[{"role": "user", "content": prompt}],
+                temperature=params["temperature"],
+                max_tokens=params["max_tokens"],
+            )
+            return response.content[0].text
+        except Exception as e:
+            logger.error(f"Error calling Anthropic API: {e}")
+            raise
+
+    async def _acall_openai(self, prompt: str, system_prompt: str, **kwargs) -> str:
+        """Async counterpart of _call_openai."""
+        params = self._request_params(kwargs)
+
+        try:
+            response = await _aretry_on_rate_limit(
+                self.aclient.chat.completions.create,
+                model=params["model"],
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=params["temperature"],
+                max_tokens=params["max_tokens"],
+            )
+            return response.choices[0].message.content
+        except Exception as e:
+            logger.error(f"Error calling OpenAI API: {e}")
+            raise
+
+    async def _acall_anthropic(self, prompt: str, system_prompt: str, **kwargs) -> str:
+        """Async counterpart of _call_anthropic."""
+        params = self._request_params(kwargs)
 
         try:
-            response = self.client.messages.create(
-                model=params.get("model", "claude-3-opus-20240229"),
-                system=system_prompt,
+            response = await _aanthropic_message(
+                self.aclient,
+                model=params["model"],
+                system=_cached_system(system_prompt),
                 messages=[{"role": "user", "content": prompt}],
-                temperature=params.get("temperature", 0.3),
-                max_tokens=params.get("max_tokens", 1000),
-                timeout=httpx.Timeout(600.0, connect=5.0),
+                temperature=params["temperature"],
+                max_tokens=params["max_tokens"],
             )
             return response.content[0].text
         except Exception as e:
             logger.error(f"Error calling Anthropic API: {e}")
-            if "rate limit" in str(e).lower():
-                logger.info("Rate limit hit, backing off and retrying...")
-                time.sleep(5)
-                return self._call_anthropic(prompt, system_prompt, **kwargs)
             raise
 
+    def _deterministic(self, kwargs: dict) -> bool:
+        """Whether a request with these overrides is reproducible (temperature 0)."""
+        return self._request_params(kwargs)["temperature"] <= 0
+
+    def _cacheable(self, kwargs: dict) -> bool:
+        """Whether a request with these parameter overrides may use the cache."""
+        return self.cache is not None and self._deterministic(kwargs)
+
+    def _cache_key(
+        self, prompt: str, system_prompt: str, kwargs: dict, **extra
+    ) -> str | None:
+        """
+        Compute the response-cache key for a completion request.
+
+        Args:
+            prompt: The user prompt
+            system_prompt: The system prompt
+            kwargs: Provider parameter overrides
+            **extra: Additional request fields that change the response
+
+        Returns:
+            The key, or None if caching is disabled or the request is sampled
+            (temperature > 0) and therefore not reproducible
+        """
+        if self.cache is None:
+            return None
+        return self._request_key(prompt, system_prompt, kwargs, **extra)
+
+    def _request_key(
+        self, prompt: str, system_prompt: str, kwargs: dict, **extra
+    ) -> str | None:
+        """
+        Hash everything that determines a completion's response.
+
+        Used as the exact-cache key and, with an empty prompt, as the
+        semantic-cache scope; independent of which caches are enabled.
+
+        Returns:
+            The key, or None if the request is sampled (temperature > 0)
+        """
+        if not self._deterministic(kwargs):
+            return None
+
+        params = self._request_params(kwargs)
+        return LLMCache.make_key(
+            provider=self.provider,
+            model=params["model"],
+            system=system_prompt,
+            user=prompt,
+            temperature=params["temperature"],
+            max_tokens=params["max_tokens"],
+            **extra,
+        )
+
+    def _cache_store(self, cache_key: str, response: str, kwargs: dict) -> None:
+        """Store a response in the cache, tagged with the model that produced it."""
+        model = self._request_params(kwargs)["model"]
+        self.cache.set(cache_key, response, model=model)
+
+    def _embed(self, text: str) -> list[float]:
+        """Embed text with the OpenAI embeddings API (used by the semantic cache)."""
+        if self._embedding_client is None:
+            if self.provider == "openai":
+                self._embedding_client = self.client
+            else:
+                self._embedding_client = openai.OpenAI(
+                    api_key=settings.OPENAI_API_KEY,
+                    http_client=_shared_http_client("openai"),
+                )
+        response = _retry_on_rate_limit(
+            self._embedding_client.embeddings.create,
+            model=LLM_EMBEDDING_MODEL,
+            input=LLMCache.normalize_text(text),
+        )
+        return response.data[0].embedding
+
+    def _semantic_lookup(
+        self, prompt: str, system_prompt: str, kwargs: dict, source_text: str | None = None
+    ) -> tuple[str | None, tuple[str, list[float]] | None]:
+        """
+        Look up a paraphrase of the prompt in the semantic cache.
+
+        Args:
+            prompt: The user prompt
+            system_prompt: The system prompt
+            kwargs: Provider parameter overrides
+            source_text: The variable content inside the prompt (e.g. a
+                document chunk). When given, only it is embedded and the rest
+                of the prompt joins the scope, so chunks sharing a long
+                template are not mistaken for paraphrases of each other
+
+        Returns:
+            Tuple of (cached response or None, and the (scope, embedding) to
+            store the new response under, or None if the lookup was skipped)
+        """
+        # Scope excludes the embedded text: hits must share everything else.
+        # Like the exact cache, only deterministic requests are eligible.
+        if self.semantic_cache is None:
+            return None, None
+        template = ""
+        if source_text and source_text in prompt:
+            template, prompt = prompt.replace(source_text, ""), source_text
+        scope = self._request_key(template, system_prompt, kwargs)
+        if scope is None:
+            return None, None
+
+        try:
+            embedding = self._embed(prompt)
+        except openai.OpenAIError as e:
+            logger.warning(f"Skipping semantic cache, embedding failed: {e}")
+            return None, None
+        return self.semantic_cache.get(scope, embedding), (scope, embedding)
+
     def generate_completion(
-        self, prompt: str, system_prompt: str = "You are a helpful assistant.", **kwargs
+        self,
+        prompt: str,
+        system_prompt: str = "You are a helpful assistant.",
+        source_text: str | None = None,
+        **kwargs,
     ) -> str:
         """
         Generate a completion using the configured LLM provider.
 
+        Deterministic (temperature 0) requests are served from the response
+        cache when an identical request has been made before, or, when the
+        semantic cache is enabled, when a near-identical prompt has.
+
         Args:
             prompt: The prompt to send to the LLM
             system_prompt: The system prompt for context
+            source_text: The variable content inside the prompt, matched on
+                its own by the semantic cache (see _semantic_lookup)
             **kwargs: Additional parameters to pass to the provider
 
         Returns:
             The LLM response as a string
         """
+        response, store = self._completion(prompt, system_prompt, kwargs, source_text)
+        if store:
+            store()
+        return response
+
+    def _remember(
+        self,
+        cache_key: str | None,
+        semantic_entry: tuple[str, list[float]] | None,
+        response: str,
+        kwargs: dict,
+    ) -> Callable[[], None] | None:
+        """Return a callable that stores a fresh response in the enabled caches."""
+        if not cache_key and not semantic_entry:
+            return None
+
+        def store() -> None:
+            if cache_key:
+                self._cache_store(cache_key, response, kwargs)
+            if semantic_entry:
+                self.semantic_cache.set(*semantic_entry, response)
+
+        return store
+
+    def _completion(
+        self, prompt: str, system_prompt: str, kwargs: dict, source_text: str | None = None
+    ) -> tuple[str, Callable[[], None] | None]:
+        """
+        Serve a completion from the caches or the provider, without storing it.
+
+        Structured callers store the response only once it has parsed, so a
+        malformed reply is never served from the cache.
+
+        Returns:
+            Tuple of (response, callable that caches it, or None for cache
+            hits and uncacheable requests)
+        """
+        cache_key = self._cache_key(prompt, system_prompt, kwargs)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Returning cached completion")
+                return cached, None
+
+        similar, semantic_entry = self._semantic_lookup(
+            prompt, system_prompt, kwargs, source_text
+        )
+        if similar is not None:
+            return similar, None
+
         logger.debug(f"Generating completion with provider: {self.provider}")
 
+        response = self._completer(prompt, system_prompt, **kwargs)
+        return response, self._remember(cache_key, semantic_entry, response, kwargs)
+
+    async def agenerate_completion(
+        self,
+        prompt: str,
+        system_prompt: str = "You are a helpful assistant.",
+        source_text: str | None = None,
+        **kwargs,
+    ) -> str:
+        """
+        Async version of generate_completion, for running many calls concurrently.
+
+        Uses the same exact and semantic caches as generate_completion.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            system_prompt: The system prompt for context
+            source_text: The variable content inside the prompt, matched on
+                its own by the semantic cache (see _semantic_lookup)
+            **kwargs: Additional parameters to pass to the provider
+
+        Returns:
+            The LLM response as a string
+        """
+        response, store = await self._acompletion(prompt, system_prompt, kwargs, source_text)
+        if store:
+            store()
+        return response
+
+    async def _acompletion(
+        self, prompt: str, system_prompt: str, kwargs: dict, source_text: str | None = None
+    ) -> tuple[str, Callable[[], None] | None]:
+        """Async version of _completion."""
+        cache_key = self._cache_key(prompt, system_prompt, kwargs)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Returning cached completion")
+                return cached, None
+
+        semantic_entry = None
+        if self.semantic_cache is not None:
+            # The embedding request is blocking; keep it off the event loop
+            similar, semantic_entry = await asyncio.to_thread(
+                self._semantic_lookup, prompt, system_prompt, kwargs, source_text
+            )
+            if similar is not None:
+                return similar, None
+
+        logger.debug(f"Generating async completion with provider: {self.provider}")
+
+        response = await self._acompleter(prompt, system_prompt, **kwargs)
+        return response, self._remember(cache_key, semantic_entry, response, kwargs)
+
+    def generate_completions_batch(
+        self,
+        prompts: list[str],
+        system_prompt: str = "You are a helpful assistant.",
+        concurrency: int = BATCH_CONCURRENCY,
+        **kwargs,
+    ) -> list[str]:
+        """
+        Generate completions for many prompts concurrently.
+
+        Requests run on a bounded thread pool over the shared, pooled sync
+        client, so wall time approaches the slowest call rather than the sum.
+        (A fresh event loop per batch would strand the async client's
+        connections.)
+
+        Args:
+            prompts: The prompts to send to the LLM
+            system_prompt: The system prompt shared by every request
+            concurrency: Maximum requests in flight at once
+            **kwargs: Additional parameters to pass to the provider
+
+        Returns:
+            One response per prompt, in prompt order
+        """
+        if not prompts:
+            return []
+        workers = min(concurrency, len(prompts))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(
+                executor.map(
+                    lambda prompt: self.generate_completion(prompt, system_prompt, **kwargs),
+                    prompts,
+                )
+            )
+
+    async def agenerate_completions_batch(
+        self,
+        prompts: list[str],
+        system_prompt: str = "You are a helpful assistant.",
+        concurrency: int = BATCH_CONCURRENCY,
+        **kwargs,
+    ) -> list[str]:
+        """Async version of generate_completions_batch, using the async client."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def complete(prompt: str) -> str:
+            async with semaphore:
+                return await self.agenerate_completion(prompt, system_prompt, **kwargs)
+
+        return await asyncio.gather(*(complete(prompt) for prompt in prompts))
+
+    @staticmethod
+    def _build_structured_prompts(
+        prompt: str, output_format: dict, system_prompt: str
+    ) -> tuple[str, str]:
+        """Add JSON formatting instructions to the user and system prompts."""
+        enhanced_system_prompt = _structured_system_prompt(system_prompt, output_format)
+        enhanced_prompt = (
+            f"{prompt}\n\n"
+            f"Remember to respond with only a valid JSON object according to the specified format."
+        )
+        return enhanced_prompt, enhanced_system_prompt
+
+    def _native_json_params(
+        self, prompt: str, system_prompt: str, output_format: dict, kwargs: dict
+    ) -> dict:
+        """
+        Build API parameters that make the provider return schema-valid JSON.
+
+        OpenAI uses response_format with a strict JSON schema; Anthropic is
+        forced to call a single tool whose input schema is the output format.
+        """
+        params = self._request_params(kwargs)
+        schema = _format_artifacts(output_format).schema
+
         if self.provider == "openai":
-            return self._call_openai(prompt, system_prompt, **kwargs)
-        elif self.provider == "anthropic":
-            return self._call_anthropic(prompt, system_prompt, **kwargs)
+            return {
+                "model": params["model"],
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                "temperature": params["temperature"],
+                "max_tokens": params["max_tokens"],
+                "response_format": {
+                    "type": "json_schema",
+                    "json_schema": {"name": "structured_output", "schema": schema, "strict": True},
+                },
+            }
+
+        return {
+            "model": params["model"],
+            "system": _cached_system(system_prompt),
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": params["temperature"],
+            "max_tokens": params["max_tokens"],
+            "tools": [
+                {
+                    "name": _JSON_TOOL_NAME,
+                    "description": "Return the response as structured JSON.",
+                    "input_schema": schema,
+                }
+            ],
+            "tool_choice": {"type": "tool", "name": _JSON_TOOL_NAME},
+        }
+
+    def _native_json_result(self, response) -> dict:
+        """Extract the JSON object from a native-JSON API response."""
+        if self.provider == "openai":
+            return _json_loads(response.choices[0].message.content)
+
+        for block in response.content:
+            if block.type == "tool_use":
+                return block.input
+        raise ValueError("Anthropic response did not include the JSON tool call")
+
+    def _native_json_supported(self, kwargs: dict) -> bool:
+        """Whether the request's model has not been seen rejecting native JSON."""
+        model = self._request_params(kwargs)["model"]
+        return (self.provider, model) not in _NATIVE_JSON_UNSUPPORTED
+
+    def _native_json_failed(self, error: Exception, kwargs: dict) -> None:
+        """Log a native-JSON failure and stop using it if the model rejects it."""
+        if isinstance(error, (openai.BadRequestError, anthropic.BadRequestError)):
+            logger.info(f"Native JSON output not supported ({error}); using prompt-based JSON")
+            _NATIVE_JSON_UNSUPPORTED.add((self.provider, self._request_params(kwargs)["model"]))
         else:
-            raise ValueError(f"Unsupported LLM provider: {self.provider}")
+            logger.warning(f"Native JSON request failed ({error}); retrying with prompt-based JSON")
+
+    def _generate_native_json(
+        self, prompt: str, system_prompt: str, output_format: dict, kwargs: dict
+    ) -> dict | None:
+        """
+        Request schema-constrained JSON from the provider.
+
+        Returns:
+            The parsed object, or None if native JSON is unavailable or failed
+        """
+        cache_key = self._cache_key(prompt, system_prompt, kwargs, output_format=output_format)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return _json_loads(cached)
+
+        api_params = self._native_json_params(prompt, system_prompt, output_format, kwargs)
+        try:
+            if self.provider == "openai":
+                response = _retry_on_rate_limit(self.client.chat.completions.create, **api_params)
+            else:
+                response = _anthropic_message(self.client, **api_params)
+            result = self._native_json_result(response)
+        except (openai.APIError, anthropic.APIError, TypeError, ValueError) as e:
+            self._native_json_failed(e, kwargs)
+            return None
+
+        if cache_key:
+            self._cache_store(cache_key, _json_dumps(result), kwargs)
+        return result
+
+    async def _agenerate_native_json(
+        self, prompt: str, system_prompt: str, output_format: dict, kwargs: dict
+    ) -> dict | None:
+        """Async version of _generate_native_json."""
+        cache_key = self._cache_key(prompt, system_prompt, kwargs, output_format=output_format)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return _json_loads(cached)
+
+        api_params = self._native_json_params(prompt, system_prompt, output_format, kwargs)
+        try:
+            if self.provider == "openai":
+                response = await _aretry_on_rate_limit(self.aclient.chat.completions.create, **api_params)
+            else:
+                response = await _aanthropic_message(self.aclient, **api_params)
+            result = self._native_json_result(response)
+        except (openai.APIError, anthropic.APIError, TypeError, ValueError) as e:
+            self._native_json_failed(e, kwargs)
+            return None
+
+        if cache_key:
+            self._cache_store(cache_key, _json_dumps(result), kwargs)
+        return result
+
+    @staticmethod
+    def _shape_problem(result, output_format: dict, attempt: int, max_retries: int) -> str | None:
+        """
+        Check a parsed prompt-based response against the output format.
+
+        Returns:
+            The mismatch, or None if the result matches. On the last attempt
+            callers still return a mismatched result as the best effort, but
+            do not cache it
+        """
+        problem = _format_artifacts(output_format).check(result)
+        if problem is None:
+            return None
+        if attempt == max_retries - 1:
+            logger.warning(f"Structured response has the wrong shape ({problem}); using it anyway")
+            return problem
+        logger.warning(f"Structured response has the wrong shape (attempt {attempt+1}/{max_retries}): {problem}")
+        return problem
+
+    @staticmethod
+    def _parse_json_response(response: str) -> dict:
+        """
+        Parse a JSON object from a response.
+
+        Optional ```json fences are stripped; if the text still is not valid
+        JSON, the first balanced object inside it is tried before giving up,
+        which saves a re-prompt when the model wraps JSON in prose.
+        """
+        text = _strip_fences(response)
+        try:
+            return _json_loads(text)
+        except json.JSONDecodeError:
+            extracted = _extract_json_object(text)
+            if extracted is None or extracted == text:
+                raise
+            logger.debug("Recovered JSON object from surrounding text")
+            return _json_loads(extracted)
 
     def generate_structured_output(
         self,
         prompt: str,
         output_format: dict,
         system_prompt: str = "You are a helpful assistant that outputs structured JSON.",
+        source_text: str | None = None,
         **kwargs,
     ) -> dict:
         """
         Generate structured output (JSON) using the LLM.
 
+        Uses the provider's native JSON mode (OpenAI json_schema response
+        format, Anthropic forced tool use) when the model supports it, and
+        falls back to prompt instructions plus parsing otherwise.
+
         Args:
             prompt: The prompt to send to the LLM
             output_format: Dictionary specifying the expected output format
             system_prompt: The system prompt for context
+            source_text: The variable content inside the prompt, matched on
+                its own by the semantic cache (see _semantic_lookup)
             **kwargs: Additional parameters to pass to the provider
 
         Returns:
             The parsed structured response as a dictionary
         """
-        # Enhance the system prompt with formatting instructions
-        format_description = json.dumps(output_format, indent=2)
-        enhanced_system_prompt = (
-            f"{system_prompt}\n\n"
-            f"You must respond with a valid JSON object using the following format:\n"
-            f"{format_description}\n\n"
-            f"Do not include any text outside of the JSON object."
+        enhanced_prompt, enhanced_system_prompt = self._build_structured_prompts(
+            prompt, output_format, system_prompt
         )
 
-        # Enhance the user prompt to emphasize JSON output
-        enhanced_prompt = (
-            f"{prompt}\n\n"
-            f"Remember to respond with only a valid JSON object according to the specified format."
-        )
+        # Prefer provider-enforced JSON; fall back to prompting + parsing
+        if self._native_json_supported(kwargs):
+            result = self._generate_native_json(
+                enhanced_prompt, enhanced_system_prompt, output_format, kwargs
+            )
+            if result is not None:
+                return result
 
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = self.generate_completion(
-                    enhanced_prompt, enhanced_system_prompt, **kwargs
+                response, store = self._completion(
+                    enhanced_prompt, enhanced_system_prompt, kwargs, source_text
                 )
 
-                # Extract JSON from response (in case there's surrounding text)
-                response = response.strip()
-                if response.startswith("```json"):
-                    response = response.split("```json")[1]
-                if response.endswith("```"):
-                    response = response.rsplit("```", 1)[0]
-
-                # Parse the JSON response
-                return json.loads(response)
+                # Extract and parse JSON (in case there's surrounding text)
+                result = self._parse_json_response(response)
 
             except json.JSONDecodeError as e:
                 logger.warning(
@@ -203,6 +1308,166 @@ class LLMInterface:
 
                 # Add more explicit instructions for retry
                 enhanced_system_prompt += "\nYOUR PREVIOUS RESPONSE WAS NOT VALID JSON. ENSURE YOU RETURN ONLY VALID JSON WITH NO MARKDOWN OR OTHER TEXT."
+                continue
+
+            # Only validated responses are cached; a bad reply would
+            # otherwise be replayed on every re-run
+            problem = self._shape_problem(result, output_format, attempt, max_retries)
+            if problem is None:
+                if store:
+                    store()
+                return result
+            if attempt == max_retries - 1:
+                return result
+            enhanced_system_prompt += _SHAPE_RETRY_NOTE.format(problem=problem)
+
+    async def agenerate_structured_output(
+        self,
+        prompt: str,
+        output_format: dict,
+        system_prompt: str = "You are a helpful assistant that outputs structured JSON.",
+        source_text: str | None = None,
+        **kwargs,
+    ) -> dict:
+        """
+        Async version of generate_structured_output.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            output_format: Dictionary specifying the expected output format
+            system_prompt: The system prompt for context
+            source_text: The variable content inside the prompt, matched on
+                its own by the semantic cache (see _semantic_lookup)
+            **kwargs: Additional parameters to pass to the provider
+
+        Returns:
+            The parsed structured response as a dictionary
+        """
+        enhanced_prompt, enhanced_system_prompt = self._build_structured_prompts(
+            prompt, output_format, system_prompt
+        )
+
+        if self._native_json_supported(kwargs):
+            result = await self._agenerate_native_json(
+                enhanced_prompt, enhanced_system_prompt, output_format, kwargs
+            )
+            if result is not None:
+                return result
+
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                response, store = await self._acompletion(
+                    enhanced_prompt, enhanced_system_prompt, kwargs, source_text
+                )
+                result = self._parse_json_response(response)
+
+            except json.JSONDecodeError as e:
+                logger.warning(
+                    f"Failed to parse JSON response (attempt {attempt+1}/{max_retries}): {e}"
+                )
+
+                if attempt == max_retries - 1:
+                    logger.error(
+                        f"JSON parsing failed after {max_retries} attempts. Last response: {response}"
+                    )
+                    raise
+
+                enhanced_system_prompt += "\nYOUR PREVIOUS RESPONSE WAS NOT VALID JSON. ENSURE YOU RETURN ONLY VALID JSON WITH NO MARKDOWN OR OTHER TEXT."
+                continue
+
+            problem = self._shape_problem(result, output_format, attempt, max_retries)
+            if problem is None:
+                if store:
+                    store()
+                return result
+            if attempt == max_retries - 1:
+                return result
+            enhanced_system_prompt += _SHAPE_RETRY_NOTE.format(problem=problem)
+
+    def generate_stream(
+        self, prompt: str, system_prompt: str = "You are a helpful assistant.", **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream a completion from the configured LLM provider.
+
+        Streamed responses bypass the response cache.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            system_prompt: The system prompt for context
+            **kwargs: Additional parameters to pass to the provider
+
+        Returns:
+            Iterator over pieces of response text as they arrive
+        """
+        logger.debug(f"Streaming completion with provider: {self.provider}")
+        return self._streamer(prompt, system_prompt, **kwargs)
+
+    def _stream_openai(self, prompt: str, system_prompt: str, **kwargs) -> Iterator[str]:
+        """Streaming counterpart of _call_openai."""
+        params = self._request_params(kwargs)
+        stream = _retry_on_rate_limit(
+            self.client.chat.completions.create,
+            model=params["model"],
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=params["temperature"],
+            max_tokens=params["max_tokens"],
+            stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _stream_anthropic(self, prompt: str, system_prompt: str, **kwargs) -> Iterator[str]:
+        """Streaming counterpart of _call_anthropic."""
+        params = self._request_params(kwargs)
+        stream = _retry_on_rate_limit(
+            self.client.messages.create,
+            model=params["model"],
+            system=_cached_system(system_prompt),
+            messages=[{"role": "user", "content": prompt}],
+            temperature=params["temperature"],
+            max_tokens=params["max_tokens"],
+            stream=True,
+        )
+        for event in stream:
+            if event.type == "content_block_delta" and event.delta.type == "text_delta":
+                yield event.delta.text
+
+    def stream_structured_items(
+        self,
+        prompt: str,
+        output_format: dict,
+        array_key: str,
+        system_prompt: str = "You are a helpful assistant.",
+        **kwargs,
+    ) -> Iterator:
+        """
+        Stream a structured response and yield items of one of its arrays.
+
+        Uses prompt-based JSON (native JSON modes return the object in one
+        piece), and yields each element of response[array_key] as soon as
+        it is complete.
+
+        Args:
+            prompt: The prompt to send to the LLM
+            output_format: Example of the expected JSON structure
+            array_key: Top-level key of the array to stream
+            system_prompt: The system prompt for context
+            **kwargs: Additional parameters to pass to the provider
+
+        Yields:
+            Parsed items of the array
+        """
+        enhanced_prompt, enhanced_system_prompt = self._build_structured_prompts(
+            prompt, output_format, system_prompt
+        )
+        chunks = self.generate_stream(enhanced_prompt, enhanced_system_prompt, **kwargs)
+        yield from iter_json_array_items(chunks, array_key)
 
     def supports_native_pdf(self) -> bool:
         """
@@ -211,7 +1476,7 @@ class LLMInterface:
         Returns:
             True if the provider can process PDFs natively, False otherwise
         """
-        return self.provider == "anthropic"
+        return self._supports_pdf
 
     def _encode_pdf_to_base64(self, pdf_path: str | Path) -> str:
         """
@@ -223,9 +1488,40 @@ class LLMInterface:
         Returns:
             Base64-encoded string of the PDF content
         """
-        pdf_path = Path(pdf_path)
-        with open(pdf_path, "rb") as f:
-            return base64.standard_b64encode(f.read()).decode("utf-8")
+        return _b64encode_file(Path(pdf_path))
+
+    def _encode_pdf_pages_to_base64(
+        self, pdf_path: str | Path, page_indices: list[int]
+    ) -> tuple[str, list[int]]:
+        """
+        Encode only the selected pages of a PDF to base64.
+
+        Runs of consecutive pages are copied into a new document with
+        insert_pdf(), leaving the shared source document untouched, and the
+        result is garbage-collected and deflated to shrink the upload.
+
+        Args:
+            pdf_path: Path to the PDF file
+            page_indices: 0-based page indices to keep, in order
+
+        Returns:
+            Tuple of (base64-encoded PDF, page indices actually included)
+        """
+        import fitz
+
+        from modules.pdf_image_extractor import open_pdf
+
+        # The source document is shared (and cached), so copy the pages
+        # into a new document instead of select()-ing them in place
+        with open_pdf(pdf_path) as doc:
+            pages = [p for p in page_indices if 0 <= p < doc.page_count]
+            if pages == list(range(doc.page_count)):
+                return self._encode_pdf_to_base64(pdf_path), pages
+            with fitz.open() as subset:
+                for first, last in _page_runs(pages):
+                    subset.insert_pdf(doc, from_page=first, to_page=last)
+                pdf_bytes = subset.tobytes(garbage=3, deflate=True)
+        return binascii.b2a_base64(pdf_bytes, newline=False).decode("ascii"), pages
 
     def _call_anthropic_with_pdf(
         self,
@@ -246,7 +1542,7 @@ class LLMInterface:
                     extracted images to send alongside the PDF
             **kwargs: Additional parameters
         """
-        params = {**self.config, **kwargs}
+        params = self._request_params(kwargs)
 
         # Build content: PDF first, then individual images, then text prompt
         content = [
@@ -257,6 +1553,8 @@ class LLMInterface:
                     "media_type": "application/pdf",
                     "data": pdf_data,
                 },
+                # Batches of the same document reuse the processed PDF
+                "cache_control": _EPHEMERAL_CACHE,
             },
         ]
 
@@ -281,23 +1579,17 @@ class LLMInterface:
         )
 
         try:
-            response = self.client.messages.create(
-                model=params.get("model", "claude-sonnet-4-5-20250514"),
-                system=system_prompt,
+            response = _anthropic_message(
+                self.client,
+                model=params["model"],
+                system=_cached_system(system_prompt),
                 messages=[{"role": "user", "content": content}],
-                temperature=params.get("temperature", 0.3),
-                max_tokens=params.get("max_tokens", 4096),
-                timeout=httpx.Timeout(600.0, connect=5.0),
+                temperature=params["temperature"],
+                max_tokens=params["max_tokens"],
             )
             return response.content[0].text
         except Exception as e:
             logger.error(f"Error calling Anthropic API with PDF: {e}")
-            if "rate limit" in str(e).lower():
-                logger.info("Rate limit hit, backing off and retrying...")
-                time.sleep(5)
-                return self._call_anthropic_with_pdf(
-                    pdf_data, prompt, system_prompt, images=images, **kwargs
-                )
             raise
 
     def generate_from_pdf(
@@ -332,31 +1624,106 @@ class LLMInterface:
         logger.debug(f"Generating from PDF with provider: {self.provider}")
 
         if self.supports_native_pdf():
-            # Use native PDF support for Anthropic
-            pdf_data = self._encode_pdf_to_base64(pdf_path)
-            return self._call_anthropic_with_pdf(
-                pdf_data, prompt, system_prompt, images=images, **kwargs
+            # Use native PDF support for Anthropic, sending only the requested pages
+            pdf_data, prompt, fingerprint = self._prepare_native_pdf(
+                pdf_path, prompt, page_indices
             )
+            response, store = self._complete_native_pdf(
+                pdf_data, fingerprint, prompt, system_prompt, images, kwargs
+            )
+            if store:
+                store()
+            return response
         else:
             # Fall back to text extraction for other providers
-            from modules.pdf_processor import PDFProcessor
+            enhanced_prompt = self._pdf_text_prompt(pdf_path, prompt)
+            return self.generate_completion(enhanced_prompt, system_prompt, **kwargs)
+
+    @staticmethod
+    def _pdf_text_prompt(pdf_path: str | Path, prompt: str) -> str:
+        """
+        Append a PDF's extracted text to the prompt, for providers without native PDF input.
+
+        Page subsets are not applied here: text chunks don't map 1:1 to
+        pages, so the whole document is sent.
+        """
+        stat = Path(pdf_path).stat()
+        combined_text = _pdf_fallback_text(str(pdf_path), stat.st_mtime_ns, stat.st_size)
+        return f"{prompt}\n\nDocument content:\n{combined_text}"
+
+    def _prepare_native_pdf(
+        self, pdf_path: str | Path, prompt: str, page_indices: list[int] | None
+    ) -> tuple[str, str, list]:
+        """
+        Encode a PDF (or a page subset) for a native-PDF request.
 
-            processor = PDFProcessor()
-            chunks, metadata = processor.process_pdf(str(pdf_path))
+        Args:
+            pdf_path: Path to the PDF file
+            prompt: The prompt to send with the PDF
+            page_indices: Optional list of 0-based page indices to send
 
-            # If page_indices specified, filter chunks (approximate by chunk index)
-            if page_indices is not None:
-                # This is approximate since chunks don't map 1:1 to pages
-                # For better control, the PDF processor would need enhancement
-                pass
+        Returns:
+            Tuple of (base64_pdf_data, prompt, fingerprint); the prompt gains
+            a note listing the original page numbers when a subset is sent,
+            and the fingerprint (path, mtime, size, pages) identifies the
+            encoded document for the response cache without hashing it
+        """
+        stat = Path(pdf_path).stat()
+        fingerprint = [str(pdf_path), stat.st_mtime_ns, stat.st_size]
+        if page_indices is None:
+            return self._encode_pdf_to_base64(pdf_path), prompt, [*fingerprint, None]
+
+        pdf_data, pages = self._encode_pdf_pages_to_base64(pdf_path, page_indices)
+        page_list = ", ".join(str(p + 1) for p in pages)
+        prompt = (
+            f"{prompt}\n\n(The attached PDF contains only pages {page_list} "
+            f"of the original document, in that order.)"
+        )
+        return pdf_data, prompt, [*fingerprint, pages]
 
-            # Combine chunks into a single text
-            combined_text = "\n\n".join(chunks)
+    def _complete_native_pdf(
+        self,
+        pdf_data: str,
+        pdf_fingerprint: list,
+        prompt: str,
+        system_prompt: str,
+        images: list[tuple[str, str]] | None,
+        kwargs: dict,
+    ) -> tuple[str, Callable[[], None] | None]:
+        """
+        Send an already-encoded PDF, going through the response cache.
 
-            # Create an enhanced prompt with the extracted text
-            enhanced_prompt = f"{prompt}\n\nDocument content:\n{combined_text}"
+        Args:
+            pdf_data: Base64-encoded PDF from _prepare_native_pdf()
+            pdf_fingerprint: The PDF's fingerprint from _prepare_native_pdf()
+            prompt: The prompt to send with the PDF
+            system_prompt: The system prompt for context
+            images: Optional list of (base64_data, media_type) tuples
+            kwargs: Additional parameters to pass to the provider
 
-            return self.generate_completion(enhanced_prompt, system_prompt, **kwargs)
+        Returns:
+            Tuple of (response, callable that caches it, or None), as
+            returned by _completion()
+        """
+        # Re-runs over the same document are served from the response cache
+        cache_key = None
+        if self._cacheable(kwargs):
+            cache_key = self._cache_key(
+                prompt,
+                system_prompt,
+                kwargs,
+                pdf=pdf_fingerprint,
+                image_sha256=[_text_sha256(img_data) for img_data, _ in images or ()],
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Returning cached PDF completion")
+                return cached, None
+
+        response = self._call_anthropic_with_pdf(
+            pdf_data, prompt, system_prompt, images=images, **kwargs
+        )
+        return response, self._remember(cache_key, None, response, kwargs)
 
     def generate_structured_from_pdf(
         self,
@@ -384,41 +1751,41 @@ class LLMInterface:
         Returns:
             The parsed structured response as a dictionary
         """
-        # Enhance the system prompt with formatting instructions
-        format_description = json.dumps(output_format, indent=2)
-        enhanced_system_prompt = (
-            f"{system_prompt}\n\n"
-            f"You must respond with a valid JSON object using the following format:\n"
-            f"{format_description}\n\n"
-            f"Do not include any text outside of the JSON object."
+        enhanced_prompt, enhanced_system_prompt = self._build_structured_prompts(
+            prompt, output_format, system_prompt
         )
 
-        # Enhance the user prompt to emphasize JSON output
-        enhanced_prompt = (
-            f"{prompt}\n\n"
-            f"Remember to respond with only a valid JSON object according to the specified format."
-        )
+        # Encode the document once; retries only change the system prompt
+        pdf_data = fingerprint = None
+        if self.supports_native_pdf():
+            pdf_data, enhanced_prompt, fingerprint = self._prepare_native_pdf(
+                pdf_path, enhanced_prompt, page_indices
+            )
+        else:
+            enhanced_prompt = self._pdf_text_prompt(pdf_path, enhanced_prompt)
 
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                response = self.generate_from_pdf(
-                    pdf_path=pdf_path,
-                    prompt=enhanced_prompt,
-                    system_prompt=enhanced_system_prompt,
-                    page_indices=page_indices,
-                    images=images,
-                    **kwargs,
-                )
-
-                # Extract JSON from response
-                response = response.strip()
-                if response.startswith("```json"):
-                    response = response.split("```json")[1]
-                if response.endswith("```"):
-                    response = response.rsplit("```", 1)[0]
+                if pdf_data is not None:
+                    response, store = self._complete_native_pdf(
+                        pdf_data,
+                        fingerprint,
+                        enhanced_prompt,
+                        enhanced_system_prompt,
+                        images,
+                        kwargs,
+                    )
+                else:
+                    response, store = self._completion(
+                        enhanced_prompt, enhanced_system_prompt, kwargs
+                    )
 
-                return json.loads(response)
+                # Extract JSON from response; cache the reply only once it parses
+                result = self._parse_json_response(response)
+                if store:
+                    store()
+                return result
 
             except json.JSONDecodeError as e:
                 logger.warning(
@@ -437,26 +1804,24 @@ class LLMInterface:
         """
         Encode an image file to base64 and determine its media type.
 
+        Results are cached until the file's mtime or size changes.
+
         Args:
             image_path: Path to the image file
 
         Returns:
             Tuple of (base64_data, media_type)
         """
-        suffix = image_path.suffix.lower()
-        media_types = {
-            ".png": "image/png",
-            ".jpg": "image/jpeg",
-            ".jpeg": "image/jpeg",
-            ".gif": "image/gif",
-            ".webp": "image/webp",
-        }
-        media_type = media_types.get(suffix, "image/png")
-
-        with open(image_path, "rb") as f:
-            data = base64.standard_b64encode(f.read()).decode("utf-8")
+        stat = image_path.stat()
+        key = (str(image_path), stat.st_mtime_ns, stat.st_size)
+        cached = _cached_image(key)
+        if cached is not None:
+            return cached
 
-        return data, media_type
+        media_type = IMAGE_MEDIA_TYPES.get(image_path.suffix[1:].lower(), "image/png")
+        entry = (_b64encode_file(image_path), media_type)
+        _cache_image(key, entry)
+        return entry
 
     def _call_anthropic_with_images(
         self,
@@ -477,7 +1842,7 @@ class LLMInterface:
         Returns:
             The LLM response as a string
         """
-        params = {**self.config, **kwargs}
+        params = self._request_params(kwargs)
 
         # Build content array with images first, then text
         content = []
@@ -500,23 +1865,17 @@ class LLMInterface:
         )
 
         try:
-            response = self.client.messages.create(
-                model=params.get("model", "claude-sonnet-4-5-20250514"),
-                system=system_prompt,
+            response = _anthropic_message(
+                self.client,
+                model=params["model"],
+                system=_cached_system(system_prompt),
                 messages=[{"role": "user", "content": content}],
-                temperature=params.get("temperature", 0.3),
-                max_tokens=params.get("max_tokens", 4096),
-                timeout=httpx.Timeout(600.0, connect=5.0),
+                temperature=params["temperature"],
+                max_tokens=params["max_tokens"],
             )
             return response.content[0].text
         except Exception as e:
             logger.error(f"Error calling Anthropic API with images: {e}")
-            if "rate limit" in str(e).lower():
-                logger.info("Rate limit hit, backing off and retrying...")
-                time.sleep(5)
-                return self._call_anthropic_with_images(
-                    text_content, images, system_prompt, **kwargs
-                )
             raise
 
     def generate_structured_from_markdown(
@@ -551,12 +1910,15 @@ class LLMInterface:
         if not self.supports_native_pdf():
             raise ValueError("Image support requires Anthropic provider")
 
-        # Encode all images
+        # Encode all images concurrently (file reads release the GIL);
+        # map() keeps them in document order
+        existing_images = [img_path for img_path in images if img_path.exists()]
         encoded_images = []
-        for img_path in images:
-            if img_path.exists():
-                data, media_type = self._encode_image_to_base64(img_path)
-                encoded_images.append((data, media_type))
+        if existing_images:
+            workers = min(IMAGE_ENCODE_WORKERS, len(existing_images))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                encoded_images = list(executor.map(self._encode_image_to_base64, existing_images))
+            for img_path, (_, media_type) in zip(existing_images, encoded_images, strict=True):
                 logger.debug(f"Encoded image: {img_path.name} ({media_type})")
 
         logger.info(f"Sending {len(encoded_images)} images with markdown to Claude")
@@ -565,13 +1927,7 @@ class LLMInterface:
         full_prompt = f"{prompt}\n\n## Document Content:\n{markdown_content}"
 
         # Add output format instructions
-        format_desc = json.dumps(output_format, indent=2)
-        enhanced_system = (
-            f"{system_prompt}\n\n"
-            f"You must respond with a valid JSON object using the following format:\n"
-            f"{format_desc}\n\n"
-            f"Do not include any text outside of the JSON object."
-        )
+        enhanced_system = _structured_system_prompt(system_prompt, output_format)
 
         max_retries = 3
         for attempt in range(max_retries):
@@ -581,13 +1937,7 @@ class LLMInterface:
                 )
 
                 # Parse JSON response
-                response = response.strip()
-                if response.startswith("```json"):
-                    response = response.split("```json")[1]
-                if response.endswith("```"):
-                    response = response.rsplit("```", 1)[0]
-
-                return json.loads(response)
+                return self._parse_json_response(response)
 
             except json.JSONDecodeError as e:
                 logger.warning(
@@ -4,11 +4,17 @@ Markdown Processor Module
 Handles parsing markdown files and extracting image references.
 """
 
+import contextlib
+import hashlib
 import logging
+import mmap
+import os
+import posixpath
 import re
 import shutil
 import urllib.parse
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
 
@@ -16,6 +22,18 @@ from config.settings import sanitize_filename
 
 logger = logging.getLogger(__name__)
 
+# Extensions recognised as markdown when searching an archive
+MARKDOWN_EXTENSIONS = frozenset({".md", ".markdown", ".mdown", ".mkd"})
+
+# Worker threads for hashing and copying images into storage (I/O bound)
+IMAGE_COPY_WORKERS = 8
+
+
+def _file_digest(path: Path) -> bytes:
+    """Return a 128-bit BLAKE2b digest of a file's contents."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).digest()
+
 
 @dataclass
 class MarkdownImage:
@@ -31,8 +49,8 @@ class MarkdownImage:
 class MarkdownDocument:
     """Represents a parsed markdown document with images."""
 
-    content: str
-    title: str | None
+    content: str | None = None
+    title: str | None = None
     images: list[MarkdownImage] = field(default_factory=list)
     source_path: Path | None = None
     base_dir: Path | None = None
@@ -44,6 +62,12 @@ class MarkdownProcessor:
     # Regex pattern for markdown image syntax: ![alt](path)
     IMAGE_PATTERN = re.compile(r"!\[([^\]]*)\]\(([^)]+)\)")
 
+    # First-level headings and images, matched in a single pass over the raw
+    # (undecoded) file bytes
+    MARKDOWN_PATTERN = re.compile(
+        rb"^#\s+(?P<title>.+)$|!\[(?P<alt>[^\]]*)\]\((?P<path>[^)]+)\)", re.MULTILINE
+    )
+
     def __init__(self):
         pass
 
@@ -57,14 +81,15 @@ class MarkdownProcessor:
         Returns:
             MarkdownDocument with content and image references
         """
-        content = md_path.read_text(encoding="utf-8")
+        raw = md_path.read_bytes()
+        # Universal newlines, as read_text() would give
+        content = raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
         base_dir = md_path.parent
 
-        # Extract title from first H1
-        title = self._extract_title(content)
-
-        # Find all image references
-        images = self._extract_images(content, base_dir)
+        # Title (first H1) and image references come from one scan of the
+        # raw bytes read above
+        title, image_refs = self._scan(raw)
+        images = self._extract_images(image_refs, base_dir)
 
         logger.info(
             f"Parsed markdown: {md_path.name}, title='{title}', "
@@ -79,28 +104,72 @@ class MarkdownProcessor:
             base_dir=base_dir,
         )
 
-    def _extract_title(self, content: str) -> str | None:
-        """Extract title from first H1 heading."""
-        match = re.search(r"^#\s+(.+)$", content, re.MULTILINE)
-        return match.group(1).strip() if match else None
+    def _scan_file(self, md_path: Path) -> tuple[str | None, list[tuple[str, str]]]:
+        """
+        Scan a markdown file memory-mapped, without reading it into a string.
+
+        Returns:
+            Same as _scan()
+        """
+        with open(md_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None, []  # mmap cannot map an empty file
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return self._scan(data)
+
+    def _scan(self, content: bytes | mmap.mmap) -> tuple[str | None, list[tuple[str, str]]]:
+        """
+        Find the title and image references in one pass over UTF-8 content.
+
+        Only the matched groups are decoded.
+
+        Returns:
+            Tuple of (first H1 heading or None, list of (alt_text, raw_path)
+            image references in document order)
+        """
+        title = None
+        image_refs = []
 
-    def _extract_images(self, content: str, base_dir: Path) -> list[MarkdownImage]:
-        """Extract all image references from markdown content."""
+        for match in self.MARKDOWN_PATTERN.finditer(content):
+            if match.group("title") is None:
+                image_refs.append(
+                    (match.group("alt").decode("utf-8"), match.group("path").decode("utf-8"))
+                )
+                continue
+            heading = match.group("title").decode("utf-8")
+            if title is None:
+                title = heading.strip()
+            # A heading match consumes its line, including any inline images
+            image_refs.extend(self.IMAGE_PATTERN.findall(heading))
+
+        return title, image_refs
+
+    def _extract_images(
+        self, image_refs: list[tuple[str, str]], base_dir: Path
+    ) -> list[MarkdownImage]:
+        """Build MarkdownImage entries for image references found by _scan()."""
         images = []
+        seen_raw = set()
         seen_paths = set()
+        # Directory listings, keyed by path relative to base_dir; one scandir
+        # per referenced directory replaces a stat call per image
+        listings: dict[str, frozenset[str]] = {}
 
-        for match in self.IMAGE_PATTERN.finditer(content):
-            alt_text = match.group(1)
-            relative_path = urllib.parse.unquote(match.group(2))
+        for alt_text, raw_path in image_refs:
+            # Skip repeats of the same reference before decoding it
+            if raw_path in seen_raw:
+                continue
+            seen_raw.add(raw_path)
+            relative_path = urllib.parse.unquote(raw_path)
 
-            # Skip duplicates
+            # Skip differently encoded duplicates
             if relative_path in seen_paths:
                 continue
             seen_paths.add(relative_path)
 
             # Resolve absolute path
             absolute_path = base_dir / relative_path
-            exists = absolute_path.exists() if absolute_path else False
+            exists = self._listed(base_dir, relative_path, listings)
 
             images.append(
                 MarkdownImage(
@@ -113,6 +182,39 @@ class MarkdownProcessor:
 
         return images
 
+    @staticmethod
+    def _listed(
+        base_dir: Path, relative_path: str, listings: dict[str, frozenset[str]]
+    ) -> bool:
+        """
+        Check whether relative_path names a file under base_dir.
+
+        Args:
+            base_dir: Directory the markdown file lives in
+            relative_path: Decoded image path from the markdown
+            listings: Per-call cache of directory listings, filled as needed
+
+        Returns:
+            True if the file exists
+        """
+        key = posixpath.normpath(Path(relative_path).as_posix())
+        if key.startswith("../") or key == ".." or posixpath.isabs(key):
+            # Outside base_dir: not worth listing, stat it directly
+            return (base_dir / relative_path).is_file()
+
+        directory, _, name = key.rpartition("/")
+        names = listings.get(directory)
+        if names is None:
+            try:
+                with os.scandir(base_dir / directory) as entries:
+                    names = frozenset(entry.name for entry in entries if entry.is_file())
+            except OSError:
+                names = frozenset()
+            listings[directory] = names
+        # A listing miss may still be a hit on a case-insensitive filesystem
+        # (Image.PNG vs image.png), so confirm misses with a stat
+        return name in names or (base_dir / relative_path).is_file()
+
     def process_zip(self, zip_path: Path, extract_dir: Path) -> MarkdownDocument:
         """
         Extract and process a markdown ZIP archive.
@@ -129,50 +231,97 @@ class MarkdownProcessor:
         """
         logger.info(f"Processing ZIP: {zip_path} -> {extract_dir}")
 
-        # Extract ZIP
-        with zipfile.ZipFile(zip_path, "r") as zf:
-            # Log contents for debugging
-            contents = zf.namelist()
-            logger.info(f"ZIP contains {len(contents)} files: {contents[:10]}...")
-            zf.extractall(extract_dir)
-
-        # Check for nested ZIP files (common in Notion exports) and extract them
-        nested_zips = list(extract_dir.rglob("*.zip"))
-        for nested_zip in nested_zips:
-            logger.info(f"Found nested ZIP: {nested_zip}, extracting...")
-            nested_extract_dir = nested_zip.parent / nested_zip.stem
-            nested_extract_dir.mkdir(exist_ok=True)
-            try:
-                with zipfile.ZipFile(nested_zip, "r") as nzf:
-                    nzf.extractall(nested_extract_dir)
-                logger.info(f"Extracted nested ZIP to: {nested_extract_dir}")
-            except zipfile.BadZipFile:
-                logger.warning(f"Could not extract nested ZIP: {nested_zip}")
-
-        # Find markdown files - check multiple extensions
-        md_files = []
-        for pattern in ["*.md", "*.markdown", "*.mdown", "*.mkd"]:
-            md_files.extend(extract_dir.rglob(pattern))
-
-        # Log what we found
-        all_files = list(extract_dir.rglob("*"))
-        logger.info(f"Extracted {len(all_files)} items, found {len(md_files)} markdown files")
-
-        if not md_files:
-            # Log all file extensions found to help debug
-            extensions = set(f.suffix.lower() for f in all_files if f.is_file())
-            logger.error(f"No markdown files found. File extensions in ZIP: {extensions}")
-            raise ValueError(
-                f"No markdown file found in ZIP. Found extensions: {extensions}. "
-                "Please ensure your ZIP contains a .md file."
+        with contextlib.ExitStack() as stack:
+            zf = stack.enter_context(zipfile.ZipFile(zip_path, "r"))
+            # Log contents for debugging; infolist() is the archive's own list,
+            # so only the first few names are materialized
+            entries = zf.infolist()
+            logger.info(
+                f"ZIP contains {len(entries)} files: "
+                f"{[info.filename for info in entries[:10]]}..."
             )
 
-        # Use the largest markdown file as primary (usually the main content)
-        main_md = max(md_files, key=lambda p: p.stat().st_size)
-        logger.info(f"Found primary markdown: {main_md}")
+            # (archive, directory its members extract into); nested ZIPs are
+            # common in Notion exports and unpack next to themselves
+            archives = [(zf, extract_dir)]
+            for info in entries:
+                if info.is_dir() or not info.filename.lower().endswith(".zip"):
+                    continue
+                nested_zip = Path(zf.extract(info, extract_dir))
+                logger.info(f"Found nested ZIP: {nested_zip}, inspecting...")
+                try:
+                    nested = stack.enter_context(zipfile.ZipFile(nested_zip, "r"))
+                except zipfile.BadZipFile:
+                    logger.warning(f"Could not open nested ZIP: {nested_zip}")
+                    continue
+                archives.append((nested, nested_zip.parent / nested_zip.stem))
+
+            # Pick the primary markdown from the archive listings, before
+            # anything else is written to disk
+            md_entries = [
+                (info.file_size, index, info)
+                for index, (archive, _) in enumerate(archives)
+                for info in archive.infolist()
+                if not info.is_dir()
+                and posixpath.splitext(info.filename)[1].lower() in MARKDOWN_EXTENSIONS
+            ]
+            logger.info(f"Found {len(md_entries)} markdown files in {len(archives)} archive(s)")
+
+            if not md_entries:
+                # Log all file extensions found to help debug
+                extensions = {
+                    posixpath.splitext(info.filename)[1].lower()
+                    for archive, _ in archives
+                    for info in archive.infolist()
+                    if not info.is_dir()
+                }
+                logger.error(f"No markdown files found. File extensions in ZIP: {extensions}")
+                raise ValueError(
+                    f"No markdown file found in ZIP. Found extensions: {extensions}. "
+                    "Please ensure your ZIP contains a .md file."
+                )
+
+            # Use the largest markdown file as primary (usually the main content)
+            _, index, md_info = max(md_entries, key=lambda entry: entry[0])
+            archive, target_dir = archives[index]
+            main_md = Path(archive.extract(md_info, target_dir))
+            logger.info(f"Found primary markdown: {main_md}")
+
+            # Extract only the images the primary markdown references
+            self._extract_referenced_images(archive, md_info, main_md, target_dir)
 
         return self.parse_markdown(main_md)
 
+    def _extract_referenced_images(
+        self,
+        archive: zipfile.ZipFile,
+        md_info: zipfile.ZipInfo,
+        md_path: Path,
+        target_dir: Path,
+    ) -> None:
+        """
+        Extract the archive members referenced as images by a markdown file.
+
+        Args:
+            archive: Archive containing the markdown file
+            md_info: Archive entry of the markdown file
+            md_path: Where the markdown file was extracted
+            target_dir: Directory the archive's members extract into
+        """
+        _, image_refs = self._scan_file(md_path)
+        members = set(archive.namelist())
+        md_dir = posixpath.dirname(md_info.filename)
+
+        extracted = 0
+        for member in {
+            posixpath.normpath(posixpath.join(md_dir, urllib.parse.unquote(raw_path)))
+            for raw_path in {raw_path for _, raw_path in image_refs}
+        }:
+            if member in members:
+                archive.extract(member, target_dir)
+                extracted += 1
+        logger.info(f"Extracted {extracted} of {len(image_refs)} referenced images")
+
     def get_image_mapping(
         self, doc: MarkdownDocument, deck_prefix: str
     ) -> dict[str, str]:
@@ -184,14 +333,24 @@ class MarkdownProcessor:
             deck_prefix: Deck tag to prefix filenames with (e.g. "gachapter_2")
 
         Returns:
-            Dict mapping relative_path -> stored_filename
+            Dict mapping relative_path -> stored_filename. Images with
+            identical contents share the stored filename of the first one,
+            so copy_images_to_storage() writes them once.
         """
+        images = [img for img in doc.images if img.exists and img.absolute_path]
+        if not images:
+            return {}
+
+        workers = min(IMAGE_COPY_WORKERS, len(images))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            digests = list(executor.map(_file_digest, (img.absolute_path for img in images)))
+
         mapping = {}
-        for img in doc.images:
-            if img.exists and img.absolute_path:
-                safe_name = sanitize_filename(img.absolute_path.name)
-                stored_name = f"{deck_prefix}_{safe_name}"
-                mapping[img.relative_path] = stored_name
+        stored_by_digest: dict[bytes, str] = {}
+        for img, digest in zip(images, digests, strict=True):
+            safe_name = sanitize_filename(img.absolute_path.name)
+            stored_name = stored_by_digest.setdefault(digest, f"{deck_prefix}_{safe_name}")
+            mapping[img.relative_path] = stored_name
         return mapping
 
     def copy_images_to_storage(
@@ -212,14 +371,24 @@ class MarkdownProcessor:
             List of paths to copied images
         """
         storage_dir.mkdir(parents=True, exist_ok=True)
-        copied = []
-
-        for img in doc.images:
-            if img.exists and img.absolute_path and img.relative_path in image_mapping:
-                dest = storage_dir / image_mapping[img.relative_path]
-                shutil.copy2(img.absolute_path, dest)
-                copied.append(dest)
-                logger.debug(f"Copied image: {img.absolute_path} -> {dest}")
+        copies = [
+            (img.absolute_path, storage_dir / image_mapping[img.relative_path])
+            for img in doc.images
+            if img.exists and img.absolute_path and img.relative_path in image_mapping
+        ]
+
+        # Copy concurrently, one job per destination: images with identical
+        # contents share a stored name (see get_image_mapping); for other
+        # name clashes the last one wins, as with sequential copies
+        jobs = {dest: src for src, dest in copies}
+        if jobs:
+            workers = min(IMAGE_COPY_WORKERS, len(jobs))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(shutil.copy2, jobs.values(), jobs.keys()))
+
+        for src, dest in copies:
+            logger.debug(f"Copied image: {src} -> {dest}")
+        copied = [dest for _, dest in copies]
 
         logger.info(f"Copied {len(copied)} images to {storage_dir}")
         return copied
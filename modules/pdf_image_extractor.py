@@ -1,13 +1,93 @@
 """Extract embedded images from PDF files using PyMuPDF."""
 
+import contextlib
+import hashlib
 import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
+from itertools import repeat
 from pathlib import Path
 
 import fitz
 
 logger = logging.getLogger(__name__)
 
+# Worker processes for image extraction on large documents; each worker
+# takes a contiguous range of at least PAGES_PER_EXTRACT_WORKER pages
+EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
+PAGES_PER_EXTRACT_WORKER = 64
+
+# Worker threads for writing extracted images to storage (I/O bound)
+IMAGE_SAVE_WORKERS = 16
+
+# Open documents kept by open_pdf(), keyed by (path, mtime_ns, size); each
+# has its own lock since PyMuPDF documents must not be used concurrently
+PDF_DOC_CACHE_SIZE = 8
+_doc_cache: OrderedDict[tuple[str, int, int], tuple[fitz.Document, threading.Lock]] = (
+    OrderedDict()
+)
+_doc_cache_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def open_pdf(pdf_path: str | Path) -> Iterator[fitz.Document]:
+    """
+    Borrow a cached, open PyMuPDF document.
+
+    Image extraction and page-subset encoding for the same file reuse one
+    parsed document instead of re-reading the xref table on every call.
+    The document is locked while borrowed; callers must not modify it
+    (use insert_pdf() into a new document instead of select()).
+
+    Args:
+        pdf_path: Path to the PDF file.
+
+    Yields:
+        The open document.
+    """
+    pdf_path = str(pdf_path)
+    stat = os.stat(pdf_path)
+    key = (pdf_path, stat.st_mtime_ns, stat.st_size)
+
+    with _doc_cache_lock:
+        entry = _doc_cache.get(key)
+        if entry is not None:
+            _doc_cache.move_to_end(key)
+
+    if entry is None:
+        # Parse outside the cache lock so lookups for other files don't wait
+        opened = (fitz.open(pdf_path), threading.Lock())
+        evicted = []
+        with _doc_cache_lock:
+            entry = _doc_cache.get(key)
+            if entry is None:
+                entry = _doc_cache[key] = opened
+                while len(_doc_cache) > PDF_DOC_CACHE_SIZE:
+                    evicted.append(_doc_cache.popitem(last=False)[1])
+            else:
+                # Another thread opened the same file first; use its copy
+                _doc_cache.move_to_end(key)
+                evicted.append(opened)
+
+        # Close evicted documents once whoever is borrowing them is done
+        for doc, lock in evicted:
+            with lock:
+                doc.close()
+
+    doc, lock = entry
+    with lock:
+        if doc.is_closed:
+            # Evicted and closed between the lookup and acquiring the lock
+            with fitz.open(pdf_path) as doc:
+                yield doc
+        else:
+            yield doc
+
 
 @dataclass
 class PDFImage:
@@ -22,6 +102,90 @@ class PDFImage:
     height: int
 
 
+def _page_images(
+    doc: fitz.Document,
+    page_num: int,
+    min_size: int,
+    extracted_by_xref: dict[int, dict | None],
+) -> list[PDFImage]:
+    """
+    Extract the images on one page of an open document.
+
+    Args:
+        doc: Open PyMuPDF document.
+        page_num: 0-based page index.
+        min_size: Minimum width/height in pixels (see extract_images_from_pdf).
+        extracted_by_xref: Per-document memo of doc.extract_image() results,
+                           so images repeated across pages are decoded once.
+
+    Returns:
+        List of PDFImage objects for the page.
+    """
+    images: list[PDFImage] = []
+    img_index = 0
+
+    for img_info in doc[page_num].get_images(full=True):
+        xref = img_info[0]
+        if xref in extracted_by_xref:
+            extracted = extracted_by_xref[xref]
+        else:
+            try:
+                extracted = doc.extract_image(xref)
+            except Exception:
+                logger.debug(f"Could not extract image xref={xref} on page {page_num}")
+                extracted = None
+            extracted_by_xref[xref] = extracted
+
+        if not extracted or not extracted.get("image"):
+            continue
+
+        width = extracted.get("width", 0)
+        height = extracted.get("height", 0)
+
+        # Skip tiny images (decorative icons, bullets, etc.)
+        if width < min_size and height < min_size:
+            continue
+
+        ext = extracted.get("ext", "png")
+        # Normalize jpeg extension
+        if ext == "jpeg":
+            ext = "jpg"
+
+        # 1-based page number for human readability
+        filename = f"page{page_num + 1}_img{img_index}.{ext}"
+
+        images.append(
+            PDFImage(
+                page_num=page_num,
+                img_index=img_index,
+                filename=filename,
+                image_bytes=extracted["image"],
+                ext=ext,
+                width=width,
+                height=height,
+            )
+        )
+        img_index += 1
+
+    return images
+
+
+def _doc_images(doc: fitz.Document, page_nums: list[int], min_size: int) -> list[PDFImage]:
+    """Extract images from the given (valid) pages of an open document, in order."""
+    extracted_by_xref: dict[int, dict | None] = {}
+    return [
+        image
+        for page_num in page_nums
+        for image in _page_images(doc, page_num, min_size, extracted_by_xref)
+    ]
+
+
+def _extract_pages(pdf_path: str, page_nums: list[int], min_size: int) -> list[PDFImage]:
+    """Worker entry point: open the PDF and run _doc_images() on a page range."""
+    with fitz.open(pdf_path) as doc:
+        return _doc_images(doc, page_nums, min_size)
+
+
 def extract_images_from_pdf(
     pdf_path: str | Path,
     page_indices: list[int] | None = None,
@@ -30,6 +194,10 @@ def extract_images_from_pdf(
     """
     Extract embedded images from a PDF file.
 
+    Large page selections are split into contiguous ranges that worker
+    processes extract concurrently (PyMuPDF is not thread-safe, so each
+    worker opens its own handle).
+
     Args:
         pdf_path: Path to the PDF file.
         page_indices: 0-based page indices to extract from. None = all pages.
@@ -39,63 +207,28 @@ def extract_images_from_pdf(
     Returns:
         List of PDFImage objects.
     """
-    images: list[PDFImage] = []
-    doc = fitz.open(str(pdf_path))
-
-    try:
+    pdf_path = str(pdf_path)
+    with open_pdf(pdf_path) as doc:
         pages_to_process = page_indices if page_indices is not None else range(len(doc))
-
-        for page_num in pages_to_process:
-            if page_num >= len(doc):
-                continue
-
-            page = doc[page_num]
-            page_images = page.get_images(full=True)
-            img_index = 0
-
-            for img_info in page_images:
-                xref = img_info[0]
-                try:
-                    extracted = doc.extract_image(xref)
-                except Exception:
-                    logger.debug(f"Could not extract image xref={xref} on page {page_num}")
-                    continue
-
-                if not extracted or not extracted.get("image"):
-                    continue
-
-                width = extracted.get("width", 0)
-                height = extracted.get("height", 0)
-
-                # Skip tiny images (decorative icons, bullets, etc.)
-                if width < min_size and height < min_size:
-                    continue
-
-                ext = extracted.get("ext", "png")
-                # Normalize jpeg extension
-                if ext == "jpeg":
-                    ext = "jpg"
-
-                # 1-based page number for human readability
-                filename = f"page{page_num + 1}_img{img_index}.{ext}"
-
-                images.append(
-                    PDFImage(
-                        page_num=page_num,
-                        img_index=img_index,
-                        filename=filename,
-                        image_bytes=extracted["image"],
-                        ext=ext,
-                        width=width,
-                        height=height,
-                    )
-                )
-                img_index += 1
-
-        logger.info(f"Extracted {len(images)} images from {pdf_path}")
-    finally:
-        doc.close()
-
+        page_nums = [page_num for page_num in pages_to_process if page_num < len(doc)]
+
+        workers = min(EXTRACT_WORKERS, len(page_nums) // PAGES_PER_EXTRACT_WORKER)
+        if workers < 2:
+            images = _doc_images(doc, page_nums, min_size)
+
+    if workers >= 2:
+        batch_size = -(-len(page_nums) // workers)
+        batches = [page_nums[i : i + batch_size] for i in range(0, len(page_nums), batch_size)]
+        # spawn: forking a process that runs threads (e.g. the API server) is unsafe
+        with ProcessPoolExecutor(
+            max_workers=len(batches), mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results = executor.map(
+                _extract_pages, repeat(pdf_path), batches, repeat(min_size)
+            )
+            images = [image for batch in results for image in batch]
+
+    logger.info(f"Extracted {len(images)} images from {pdf_path}")
     return images
 
 
@@ -113,19 +246,36 @@ def save_pdf_images(
         deck_prefix: Deck name prefix for stored filenames.
 
     Returns:
-        Mapping of {original_filename: stored_filename}.
+        Mapping of {original_filename: stored_filename}. Images with
+        identical bytes share the stored file of the first one.
     """
     storage_dir.mkdir(parents=True, exist_ok=True)
     mapping: dict[str, str] = {}
+    stored_by_digest: dict[bytes, str] = {}
+    contents: dict[str, bytes] = {}  # stored_filename -> bytes to write
 
     for img in images:
-        stored_name = f"{deck_prefix}_{img.filename}"
-        out_path = storage_dir / stored_name
-        out_path.write_bytes(img.image_bytes)
+        digest = hashlib.blake2b(img.image_bytes, digest_size=16).digest()
+        stored_name = stored_by_digest.get(digest)
+        if stored_name is None:
+            stored_name = f"{deck_prefix}_{img.filename}"
+            stored_by_digest[digest] = stored_name
+            contents[stored_name] = img.image_bytes
         mapping[img.filename] = stored_name
-        logger.debug(f"Saved PDF image: {stored_name} ({img.width}x{img.height})")
 
-    logger.info(f"Saved {len(mapping)} PDF images with prefix '{deck_prefix}'")
+    if contents:
+        workers = min(IMAGE_SAVE_WORKERS, len(contents))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            paths = [storage_dir / stored_name for stored_name in contents]
+            list(executor.map(Path.write_bytes, paths, contents.values()))
+
+    for img in images:
+        logger.debug(f"Saved PDF image: {mapping[img.filename]} ({img.width}x{img.height})")
+
+    logger.info(
+        f"Saved {len(contents)} PDF images ({len(mapping)} referenced) "
+        f"with prefix '{deck_prefix}'"
+    )
     return mapping
 
 
@@ -4,14 +4,18 @@ PDF Processing Module
 Handles extraction and preprocessing of text from PDF documents.
 """
 
+import hashlib
 import logging
+import os
+import re
+from collections.abc import Callable
 from pathlib import Path
 
-import PyPDF2
 from pdfminer.high_level import extract_text
 from pdfminer.layout import LAParams
 
-from config.settings import CHUNK_SIZE
+from config.settings import CHUNK_SIZE, TEXT_CACHE_DIR, TEXT_CACHE_MAX_FILES, ensure_dir
+from modules.pdf_image_extractor import open_pdf
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +23,13 @@ logger = logging.getLogger(__name__)
 class PDFProcessor:
     """Processes PDF documents for content extraction and preparation."""
 
+    # A whole line (and its newline) that is just a number (likely a page
+    # number) or shorter than 10 characters once stripped (header/footer
+    # candidates). [^\S\n] is whitespace other than the line break.
+    ARTIFACT_LINE_PATTERN = re.compile(
+        r"^[^\S\n]*(?:\d+|\S(?:[^\n]{0,7}\S)?)[^\S\n]*(?:\n|\Z)", re.MULTILINE
+    )
+
     def __init__(self, chunk_size: int = CHUNK_SIZE):
         """
         Initialize the PDF processor.
@@ -28,16 +39,78 @@ class PDFProcessor:
         """
         self.chunk_size = chunk_size
 
+    def _cached_text(
+        self, pdf_path: Path, method: str, extract: Callable[[Path], str]
+    ) -> str:
+        """
+        Return extracted text from the on-disk text cache, extracting on a miss.
+
+        Entries are keyed by the file's path, mtime and size plus the
+        extraction method, so an edited or replaced PDF is re-extracted.
+        Empty (failed) extractions are not cached.
+
+        Args:
+            pdf_path: Path to the PDF file
+            method: Name of the extraction method (part of the key)
+            extract: Function performing the extraction
+
+        Returns:
+            Extracted text as a string
+        """
+        try:
+            stat = os.stat(pdf_path)
+        except OSError:
+            return extract(pdf_path)
+
+        key = f"{Path(pdf_path).resolve()}|{stat.st_mtime_ns}|{stat.st_size}|{method}"
+        cache_file = TEXT_CACHE_DIR / f"{hashlib.sha1(key.encode()).hexdigest()}.txt"
+        try:
+            text = cache_file.read_text(encoding="utf-8")
+            os.utime(cache_file)  # mark as recently used
+            logger.debug(f"Using cached {method} text for {pdf_path}")
+            return text
+        except OSError:
+            pass
+
+        text = extract(pdf_path)
+        if text:
+            try:
+                self._store_text(cache_file, text)
+            except OSError as e:
+                logger.warning(f"Could not cache extracted text: {e}")
+        return text
+
+    @staticmethod
+    def _store_text(cache_file: Path, text: str) -> None:
+        """Write a text cache entry atomically and evict the oldest beyond the limit."""
+        ensure_dir(cache_file.parent)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(text, encoding="utf-8")
+        os.replace(tmp_file, cache_file)
+
+        with os.scandir(cache_file.parent) as entries:
+            cached = [entry for entry in entries if entry.name.endswith(".txt")]
+        if len(cached) > TEXT_CACHE_MAX_FILES:
+            cached.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in cached[: len(cached) - TEXT_CACHE_MAX_FILES]:
+                Path(entry.path).unlink(missing_ok=True)
+
     def extract_text_pdfminer(self, pdf_path: Path) -> str:
         """
         Extract text using PDFMiner for better text extraction quality.
 
+        Results are cached on disk (see _cached_text).
+
         Args:
             pdf_path: Path to the PDF file
 
         Returns:
             Extracted text as a string
         """
+        return self._cached_text(pdf_path, "pdfminer", self._extract_text_pdfminer)
+
+    def _extract_text_pdfminer(self, pdf_path: Path) -> str:
+        """Uncached body of extract_text_pdfminer."""
         try:
             laparams = LAParams(
                 line_margin=0.5,
@@ -49,9 +122,13 @@ class PDFProcessor:
             logger.error(f"Error extracting text with PDFMiner: {e}")
             return ""
 
-    def extract_text_pypdf(self, pdf_path: Path) -> str:
+    def extract_text_pymupdf(self, pdf_path: Path) -> str:
         """
-        Extract text using PyPDF2 as a fallback method.
+        Extract text using PyMuPDF as a fallback method.
+
+        The document is borrowed from open_pdf(), so metadata extraction and
+        image extraction reuse the same parse. Results are cached on disk
+        (see _cached_text).
 
         Args:
             pdf_path: Path to the PDF file
@@ -59,15 +136,16 @@ class PDFProcessor:
         Returns:
             Extracted text as a string
         """
+        return self._cached_text(pdf_path, "pymupdf", self._extract_text_pymupdf)
+
+    def _extract_text_pymupdf(self, pdf_path: Path) -> str:
+        """Uncached body of extract_text_pymupdf."""
         try:
-            text = ""
-            with open(pdf_path, "rb") as file:
-                reader = PyPDF2.PdfReader(file)
-                for page in reader.pages:
-                    text += page.extract_text() + "\n\n"
-            return text
+            with open_pdf(pdf_path) as doc:
+                # One join instead of growing the string page by page
+                return "".join(f"{page.get_text()}\n\n" for page in doc)
         except Exception as e:
-            logger.error(f"Error extracting text with PyPDF2: {e}")
+            logger.error(f"Error extracting text with PyMuPDF: {e}")
             return ""
 
     def extract_metadata(self, pdf_path: Path) -> dict:
@@ -89,15 +167,14 @@ class PDFProcessor:
         }
 
         try:
-            with open(pdf_path, "rb") as file:
-                reader = PyPDF2.PdfReader(file)
-                info = reader.metadata
-                if info:
-                    metadata["title"] = info.get("/Title", None)
-                    metadata["author"] = info.get("/Author", None)
-                    metadata["subject"] = info.get("/Subject", None)
-                    metadata["creation_date"] = info.get("/CreationDate", None)
-                metadata["page_count"] = len(reader.pages)
+            with open_pdf(pdf_path) as doc:
+                # PyMuPDF reports missing fields as empty strings
+                info = doc.metadata or {}
+                metadata["title"] = info.get("title") or None
+                metadata["author"] = info.get("author") or None
+                metadata["subject"] = info.get("subject") or None
+                metadata["creation_date"] = info.get("creationDate") or None
+                metadata["page_count"] = doc.page_count
         except Exception as e:
             logger.error(f"Error extracting metadata: {e}")
 
@@ -116,22 +193,8 @@ class PDFProcessor:
         if not text:
             return ""
 
-        # Remove page numbers (simple heuristic)
-        lines = text.split("\n")
-        cleaned_lines = []
-
-        for line in lines:
-            # Skip lines that are just numbers (likely page numbers)
-            if line.strip().isdigit():
-                continue
-
-            # Skip header/footer candidates (short lines at the top/bottom of pages)
-            if len(line.strip()) < 10 and line.strip():
-                continue
-
-            cleaned_lines.append(line)
-
-        cleaned_text = "\n".join(cleaned_lines)
+        # Remove page numbers and header/footer candidates in one pass
+        cleaned_text = self.ARTIFACT_LINE_PATTERN.sub("", text)
 
         # Remove excessive whitespace
         cleaned_text = " ".join(cleaned_text.split())
@@ -158,20 +221,25 @@ class PDFProcessor:
             return []
 
         chunks = []
-        current_chunk = ""
+        # Paragraphs of the chunk being built, and its length counting the
+        # "\n\n" separator after each paragraph
+        current_parts = []
+        current_len = 0
 
         paragraphs = text.split("\n\n")
 
         for paragraph in paragraphs:
-            if len(current_chunk) + len(paragraph) <= self.chunk_size:
-                current_chunk += paragraph + "\n\n"
+            if current_len + len(paragraph) <= self.chunk_size:
+                current_parts.append(paragraph)
+                current_len += len(paragraph) + 2
             else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = paragraph + "\n\n"
+                if current_parts:
+                    chunks.append("\n\n".join(current_parts).strip())
+                current_parts = [paragraph]
+                current_len = len(paragraph) + 2
 
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        if current_parts:
+            chunks.append("\n\n".join(current_parts).strip())
 
         return chunks
 
@@ -190,10 +258,10 @@ class PDFProcessor:
         # First try with PDFMiner for better quality
         text = self.extract_text_pdfminer(pdf_path)
 
-        # Fall back to PyPDF2 if needed
+        # Fall back to PyMuPDF if needed
         if not text:
-            logger.info("Falling back to PyPDF2 for text extraction")
-            text = self.extract_text_pypdf(pdf_path)
+            logger.info("Falling back to PyMuPDF for text extraction")
+            text = self.extract_text_pymupdf(pdf_path)
 
         # Extract metadata
         metadata = self.extract_metadata(pdf_path)
@@ -4,43 +4,72 @@ Unit Tests
 Tests for the Anki Flashcard Generator.
 """
 
+import asyncio
+import csv
+import json
 from pathlib import Path
-from unittest.mock import MagicMock, mock_open, patch
+from unittest.mock import MagicMock, patch
 
+import httpx
+import openai
+import pytest
+
+from config.prompts import clean_prompt, format_image_list
+from modules.anki_connect import AnkiConnectClient, AnkiConnectError
 from modules.anki_integration import AnkiExporter
-from modules.card_generation import FlashCard
+from modules.card_generation import CardGenerator, FlashCard
+from modules.coverage import should_continue
+from modules.llm_cache import LLMCache, SemanticCache
+from modules.llm_interface import (
+    LLMInterface,
+    _b64encode_file,
+    _format_artifacts,
+    _retry_delay,
+    _retry_on_rate_limit,
+    _strip_fences,
+    iter_json_array_items,
+    json_schema_from_example,
+)
+from modules.markdown_processor import MarkdownProcessor
+from modules.pdf_image_extractor import (
+    PDFImage,
+    extract_images_from_pdf,
+    open_pdf,
+    save_pdf_images,
+)
 from modules.pdf_processor import PDFProcessor
 
 
 class TestPDFProcessor:
     """Tests for the PDF processor module."""
 
-    @patch("PyPDF2.PdfReader")
-    def test_extract_metadata(self, mock_reader):
+    @patch("modules.pdf_processor.open_pdf")
+    def test_extract_metadata(self, mock_open_pdf):
         # Setup mock
-        mock_instance = MagicMock()
-        mock_instance.metadata = {
-            "/Title": "Test Document",
-            "/Author": "Test Author",
-            "/Subject": "Test Subject",
-            "/CreationDate": "D:20220101000000",
+        mock_doc = MagicMock()
+        mock_doc.metadata = {
+            "title": "Test Document",
+            "author": "Test Author",
+            "subject": "Test Subject",
+            "creationDate": "D:20220101000000",
+            "keywords": "",
         }
-        mock_instance.pages = [MagicMock(), MagicMock()]  # Mock two pages
-        mock_reader.return_value = mock_instance
+        mock_doc.page_count = 2
+        mock_open_pdf.return_value.__enter__.return_value = mock_doc
 
         # Create test file path
         test_path = Path("test_document.pdf")
 
-        # Mock open function
-        with patch("builtins.open", mock_open()) as mock_file:
-            processor = PDFProcessor()
-            metadata = processor.extract_metadata(test_path)
+        processor = PDFProcessor()
+        metadata = processor.extract_metadata(test_path)
 
-            # Verify results
-            assert metadata["title"] == "Test Document"
-            assert metadata["author"] == "Test Author"
-            assert metadata["subject"] == "Test Subject"
-            assert metadata["page_count"] == 2
+        # Verify results
+        mock_open_pdf.assert_called_once_with(test_path)
+        assert metadata["title"] == "Test Document"
+        assert metadata["author"] == "Test Author"
+        assert metadata["subject"] == "Test Subject"
+        assert metadata["creation_date"] == "D:20220101000000"
+        assert metadata["page_count"] == 2
 
     def test_clean_text(self):
         # Test input text with various artifacts
@@ -77,6 +106,21 @@ class TestPDFProcessor:
         assert "This is the main content of the document." in cleaned_text
         assert "The document continues here with more content." in cleaned_text
 
+    def test_extracted_text_is_cached_until_the_file_changes(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("modules.pdf_processor.TEXT_CACHE_DIR", tmp_path / "cache")
+        pdf_path = tmp_path / "doc.pdf"
+        pdf_path.write_bytes(b"%PDF-1.4 test")
+        processor = PDFProcessor()
+
+        with patch("modules.pdf_processor.extract_text", return_value="text") as extract:
+            assert processor.extract_text_pdfminer(pdf_path) == "text"
+            assert processor.extract_text_pdfminer(pdf_path) == "text"
+            assert extract.call_count == 1
+
+            pdf_path.write_bytes(b"%PDF-1.4 changed")
+            processor.extract_text_pdfminer(pdf_path)
+            assert extract.call_count == 2
+
     def test_segment_content(self):
         # Create a long piece of text
         paragraphs = ["Paragraph " + str(i) * 100 for i in range(1, 11)]
@@ -94,6 +138,171 @@ class TestPDFProcessor:
             assert len(chunk) <= 500
 
 
+class TestMarkdownProcessor:
+    """Tests for the markdown processor module."""
+
+    def test_parse_markdown_finds_title_and_images(self, tmp_path):
+        (tmp_path / "images").mkdir()
+        (tmp_path / "images" / "a b.png").write_bytes(b"png")
+        md_path = tmp_path / "notes.md"
+        md_path.write_text(
+            "Intro ![logo](logo.png)\n"
+            "# Chapter 1 ![icon](images/a%20b.png)\n"
+            "# Chapter 2\n"
+            "![again](images/a%20b.png) ![missing](images/none.png)\n"
+            "![dot](./images/a%20b.png) ![dir](images)\n",
+            encoding="utf-8",
+        )
+
+        doc = MarkdownProcessor().parse_markdown(md_path)
+
+        assert doc.title == "Chapter 1 ![icon](images/a%20b.png)"
+        assert [(img.relative_path, img.exists) for img in doc.images] == [
+            ("logo.png", False),
+            ("images/a b.png", True),
+            ("images/none.png", False),
+            ("./images/a b.png", True),
+            ("images", False),
+        ]
+
+    def test_parse_markdown_decodes_utf8_and_empty_files(self, tmp_path):
+        md_path = tmp_path / "notes.md"
+        md_path.write_text("# Café ☕\n![ünï](img/ü.png)\n", encoding="utf-8")
+        empty_path = tmp_path / "empty.md"
+        empty_path.write_bytes(b"")
+        processor = MarkdownProcessor()
+
+        doc = processor.parse_markdown(md_path)
+
+        assert doc.title == "Café ☕"
+        assert [(img.alt_text, img.relative_path) for img in doc.images] == [("ünï", "img/ü.png")]
+        assert doc.content == "# Café ☕\n![ünï](img/ü.png)\n"
+        empty = processor.parse_markdown(empty_path)
+        assert (empty.title, empty.images, empty.content) == (None, [], "")
+
+    def test_copy_images_to_storage(self, tmp_path):
+        for name in ("a.png", "b.png", "copy_of_a.png"):
+            (tmp_path / name).write_bytes(name[-5:].encode())
+        md_path = tmp_path / "notes.md"
+        md_path.write_text(
+            "![a](a.png) ![b](b.png) ![gone](c.png) ![dup](copy_of_a.png)", encoding="utf-8"
+        )
+        processor = MarkdownProcessor()
+        doc = processor.parse_markdown(md_path)
+        mapping = processor.get_image_mapping(doc, "deck")
+
+        copied = processor.copy_images_to_storage(doc, mapping, tmp_path / "store")
+
+        assert mapping == {
+            "a.png": "deck_a.png",
+            "b.png": "deck_b.png",
+            "copy_of_a.png": "deck_a.png",
+        }
+        assert [path.name for path in copied] == ["deck_a.png", "deck_b.png", "deck_a.png"]
+        assert sorted(path.name for path in (tmp_path / "store").iterdir()) == [
+            "deck_a.png",
+            "deck_b.png",
+        ]
+        assert (tmp_path / "store" / "deck_b.png").read_bytes() == b"b.png"
+
+    def test_process_zip_picks_largest_markdown_including_nested(self, tmp_path):
+        import io
+        import zipfile
+
+        nested = io.BytesIO()
+        with zipfile.ZipFile(nested, "w") as zf:
+            zf.writestr("export/Big Page.md", "# Big\n![fig](img/a%20b.png)\n" + "text " * 100)
+            zf.writestr("export/img/a b.png", b"png")
+            zf.writestr("export/img/unused.png", b"png")
+        zip_path = tmp_path / "upload.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("notes/small.md", "# Small\n")
+            zf.writestr("notes/export.zip", nested.getvalue())
+            zf.writestr("notes/image.png", b"png")
+
+        doc = MarkdownProcessor().process_zip(zip_path, tmp_path)
+
+        assert doc.title == "Big"
+        assert doc.source_path == tmp_path / "notes" / "export" / "export" / "Big Page.md"
+        assert [(img.relative_path, img.exists) for img in doc.images] == [("img/a b.png", True)]
+        assert not (doc.base_dir / "img" / "unused.png").exists()
+        assert not (tmp_path / "notes" / "small.md").exists()
+
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("image.png", b"png")
+        with pytest.raises(ValueError, match=".png"):
+            MarkdownProcessor().process_zip(zip_path, tmp_path / "empty")
+
+
+class TestPDFImageExtractor:
+    """Tests for the PDF image extractor module."""
+
+    def test_extract_images_in_process_and_in_workers(self, monkeypatch, tmp_path):
+        import fitz
+
+        from modules import pdf_image_extractor
+
+        png = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 60, 60), False).tobytes("png")
+        pdf_path = tmp_path / "doc.pdf"
+        with fitz.open() as doc:
+            for number in range(4):
+                page = doc.new_page()
+                if number != 1:
+                    page.insert_image(fitz.Rect(0, 0, 60, 60), stream=png)
+            doc.save(pdf_path)
+
+        images = extract_images_from_pdf(pdf_path, [3, 0, 1, 9])
+
+        assert [image.filename for image in images] == ["page4_img0.png", "page1_img0.png"]
+
+        monkeypatch.setattr(pdf_image_extractor, "EXTRACT_WORKERS", 2)
+        monkeypatch.setattr(pdf_image_extractor, "PAGES_PER_EXTRACT_WORKER", 1)
+        assert extract_images_from_pdf(pdf_path, [3, 0, 1, 9]) == images
+
+    def test_open_pdf_reuses_document_until_file_changes(self, tmp_path):
+        import os
+
+        import fitz
+
+        pdf_path = tmp_path / "doc.pdf"
+        with fitz.open() as doc:
+            doc.new_page()
+            doc.save(pdf_path)
+
+        with open_pdf(pdf_path) as first:
+            pass
+        with open_pdf(pdf_path) as second:
+            assert second is first
+
+        with fitz.open() as doc:
+            doc.new_page()
+            doc.new_page()
+            doc.save(pdf_path)
+        os.utime(pdf_path, ns=(0, 0))
+        with open_pdf(pdf_path) as changed:
+            assert changed is not first
+            assert changed.page_count == 2
+
+    def test_save_pdf_images_writes_identical_images_once(self, tmp_path):
+        images = [
+            PDFImage(0, 0, "page1_img0.png", b"logo", "png", 60, 60),
+            PDFImage(1, 0, "page2_img0.png", b"chart", "png", 60, 60),
+            PDFImage(2, 0, "page3_img0.png", b"logo", "png", 60, 60),
+        ]
+
+        mapping = save_pdf_images(images, tmp_path, "deck")
+
+        assert mapping == {
+            "page1_img0.png": "deck_page1_img0.png",
+            "page2_img0.png": "deck_page2_img0.png",
+            "page3_img0.png": "deck_page1_img0.png",
+        }
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "deck_page1_img0.png",
+            "deck_page2_img0.png",
+        ]
+
+
 class TestFlashCard:
     """Tests for the FlashCard class."""
 
@@ -114,6 +323,13 @@ class TestFlashCard:
         assert "python" in card_dict["tags"]
         assert "programming" in card_dict["tags"]
 
+    def test_instances_are_slotted(self):
+        card = FlashCard(front="Q", back="A")
+
+        assert not hasattr(card, "__dict__")
+        assert card.tags == []
+        assert FlashCard(front="Q", back="A", tags=None).tags == []
+
     def test_from_dict(self):
         # Create a test dictionary
         card_dict = {
@@ -134,6 +350,108 @@ class TestFlashCard:
         assert "software engineering" in card.tags
 
 
+class TestCardGenerator:
+    """Tests for the CardGenerator class."""
+
+    def test_generate_all_bounds_concurrency_and_keeps_order(self):
+        in_flight = 0
+        peak = 0
+
+        class FakeLLM:
+            async def agenerate_structured_output(self, prompt, **kwargs):
+                nonlocal in_flight, peak
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+                chunk = prompt.rsplit("\n", 1)[-1]
+                return {"cards": [{"front": chunk, "back": "answer"}]}
+
+        generator = CardGenerator(llm_interface=FakeLLM())
+        chunks = [f"chunk {i}" for i in range(5)]
+
+        results = asyncio.run(
+            generator.generate_all(chunks, {}, max_concurrency=2, validate=False)
+        )
+
+        assert [cards[0].front for cards in results] == chunks
+        assert peak == 2
+
+    def test_iter_generate_all_stops_dispatching_when_closed(self):
+        import contextlib
+
+        started = []
+
+        class FakeLLM:
+            async def agenerate_structured_output(self, prompt, **kwargs):
+                chunk = prompt.rsplit("\n", 1)[-1]
+                started.append(chunk)
+                await asyncio.sleep(0.01)
+                return {"cards": [{"front": chunk, "back": "answer"}]}
+
+        generator = CardGenerator(llm_interface=FakeLLM())
+
+        async def first_two():
+            received = []
+            results = generator.iter_generate_all(
+                [f"chunk {i}" for i in range(10)], {}, max_concurrency=2, validate=False
+            )
+            async with contextlib.aclosing(results):
+                async for cards in results:
+                    received.append(cards[0].front)
+                    if len(received) == 2:
+                        break
+            await asyncio.sleep(0.05)
+            return received
+
+        assert asyncio.run(first_two()) == ["chunk 0", "chunk 1"]
+        assert len(started) <= 4
+
+    def test_validate_cards_only_sends_flagged_cards(self):
+        llm = MagicMock()
+        llm.generate_structured_output.return_value = {
+            "improved_cards": [{"front": "What is a stack?", "back": "A LIFO structure"}]
+        }
+        generator = CardGenerator(llm_interface=llm)
+        good = FlashCard(front="What is a queue?", back="A FIFO structure")
+        duplicate = FlashCard(front="What is a queue ?", back="First in, first out")
+        vague = FlashCard(front="Stack", back="A LIFO structure")
+
+        assert generator.validate_cards([good, duplicate]) == [good]
+        llm.generate_structured_output.assert_not_called()
+
+        result = generator.validate_cards([good, vague])
+
+        prompt = llm.generate_structured_output.call_args.kwargs["prompt"]
+        assert "Stack" in prompt and "queue" not in prompt
+        assert [card.front for card in result] == ["What is a queue?", "What is a stack?"]
+
+    def test_generate_all_packs_chunks_into_requests(self):
+        prompts = []
+
+        class FakeLLM:
+            async def agenerate_structured_output(self, prompt, **kwargs):
+                prompts.append(prompt)
+                if "--- CHUNK" in prompt:
+                    return {"cards_by_chunk": [[{"front": "Q1", "back": "A1"}], []]}
+                return {"cards": [{"front": "Q4", "back": "A4"}]}
+
+        generator = CardGenerator(llm_interface=FakeLLM())
+
+        results = asyncio.run(
+            generator.generate_all(
+                ["one", "two", "one ", "three", "four"], {}, validate=False, chunks_per_request=3
+            )
+        )
+
+        assert len(prompts) == 2
+        assert "--- CHUNK 3 ---\nthree" in prompts[0]
+        assert prompts[0].count("\none\n") == 1
+        assert [[card.front for card in cards] for cards in results] == [
+            ["Q1"], [], [], [], ["Q4"]
+        ]
+
+
 class TestAnkiExporter:
     """Tests for the Anki exporter module."""
 
@@ -144,3 +462,478 @@ class TestAnkiExporter:
         # Test text with special characters
         test_text = 'Text with "quotes" and <html> tags'
         sanitized = exporter._sanitize_text(test_text)
+
+        assert sanitized == 'Text with ""quotes"" and &lt;html&gt; tags'
+
+    def test_sanitize_batch_matches_per_text(self):
+        exporter = AnkiExporter()
+        texts = ['Say "hi"', "<b>bold</b>", "", "plain"]
+
+        assert exporter._sanitize_batch(texts) == [exporter._sanitize_text(t) for t in texts]
+        # Texts containing the separator fall back to per-text sanitizing
+        assert exporter._sanitize_batch(['a\x1f"b"', "c"]) == ['a\x1f""b""', "c"]
+
+    def test_export_to_folder_writes_valid_csv(self, tmp_path):
+        exporter = AnkiExporter(config={"default_tags": ["deck"]})
+        cards = [
+            {"front": 'Say "hi"\nnow', "back": "See [IMAGE: fig.png]", "tags": []},
+            {"front": "Plain", "back": "Answer, with comma", "tags": ["extra tag"]},
+        ]
+        images = [{"original_filename": "fig.png", "stored_filename": "deck_fig.png"}]
+        (tmp_path / "deck_fig.png").write_bytes(b"png")
+
+        export_dir, image_count = exporter.export_to_folder(
+            cards, images, tmp_path, tmp_path / "export"
+        )
+
+        with open(export_dir / "cards.csv", newline="", encoding="utf-8") as file:
+            rows = list(csv.reader(file))
+
+        assert image_count == 1
+        assert rows[0] == ["front", "back", "tags"]
+        assert rows[1] == ['Say "hi"\nnow', 'See <img src="deck_fig.png">', "deck"]
+        assert rows[2][1] == "Answer, with comma"
+        assert sorted(rows[2][2].split()) == ["deck", "extra_tag"]
+
+    def test_export_to_folder_skips_missing_images(self, tmp_path):
+        exporter = AnkiExporter(config={"default_tags": []})
+        cards = [{"front": "[IMAGE: fig.png]", "back": "[IMAGE: gone.png]", "tags": []}]
+        images = [
+            {"original_filename": "assets/fig.png", "stored_filename": "deck_fig.png"},
+            {"original_filename": "gone.png", "stored_filename": "deck_gone.png"},
+        ]
+        (tmp_path / "deck_fig.png").write_bytes(b"png")
+
+        export_dir, image_count = exporter.export_to_folder(
+            cards, images, tmp_path, tmp_path / "export"
+        )
+
+        with open(export_dir / "cards.csv", newline="", encoding="utf-8") as file:
+            rows = list(csv.reader(file))
+
+        assert image_count == 1
+        assert (export_dir / "deck_fig.png").read_bytes() == b"png"
+        assert not (export_dir / "deck_gone.png").exists()
+        assert rows[1][:2] == ['<img src="deck_fig.png">', '<img src="deck_gone.png">']
+
+
+class TestPrompts:
+    """Tests for the prompt templates module."""
+
+    def test_clean_prompt(self):
+        # Trailing and whitespace-only lines spelled out so editors keep them
+        raw = (
+            "\n"
+            "            First line   \n"
+            "\n"
+            "            \n"
+            "\n"
+            "            Indented body\n"
+            "                - nested item\n"
+            "        "
+        )
+
+        assert clean_prompt(raw) == "First line\n\nIndented body\n    - nested item"
+
+    def test_format_image_list(self):
+        assert format_image_list(["a.png", "b.png"]) == "- a.png\n- b.png"
+        assert format_image_list([]) == ""
+
+
+class TestCoverage:
+    """Tests for the coverage module."""
+
+    def test_should_continue(self):
+        doc_text = "Photosynthesis converts light energy into chemical energy in chloroplasts."
+        covering = [
+            FlashCard(
+                front="What does photosynthesis convert?",
+                back="Light energy into chemical energy, in chloroplasts",
+            )
+        ]
+        partial = [FlashCard(front="What is photosynthesis?", back="A process")]
+
+        assert not should_continue(covering, doc_text, threshold=0.85)
+        assert should_continue(partial, doc_text, threshold=0.85)
+        assert should_continue([], doc_text, threshold=0.85)
+
+
+class TestAnkiConnectClient:
+    """Tests for the AnkiConnect client module."""
+
+    def test_store_media_files_batches_into_multi(self, tmp_path):
+        files = []
+        for i in range(3):
+            path = tmp_path / f"img{i}.png"
+            path.write_bytes(b"data%d" % i)
+            files.append((path.name, path))
+        files.append(("missing.png", tmp_path / "missing.png"))
+        files.append(("bad.png", Path("bad\0name.png")))
+
+        requests = []
+
+        def handler(request):
+            payload = json.loads(request.content)
+            requests.append(payload)
+            results = [{"result": a["params"]["filename"], "error": None} for a in payload["params"]["actions"]]
+            results[0] = {"result": None, "error": "disk full"}
+            return httpx.Response(200, json={"result": results, "error": None})
+
+        async def run():
+            client = AnkiConnectClient()
+            client._client = httpx.AsyncClient(
+                base_url=client.url, transport=httpx.MockTransport(handler)
+            )
+            async with client:
+                return await client.store_media_files(files)
+
+        errors = asyncio.run(run())
+
+        assert len(requests) == 1
+        assert requests[0]["action"] == "multi"
+        assert len(requests[0]["params"]["actions"]) == 3
+        assert errors["img0.png"] == "disk full"
+        assert "missing.png" in errors
+        assert "bad.png" in errors
+        assert len(errors) == 3
+
+    def test_request_retries_only_idempotent_actions(self):
+        calls = []
+
+        def handler(request):
+            calls.append(json.loads(request.content)["action"])
+            if len(calls) in (1, 3):
+                return httpx.Response(200, json={"result": None, "error": "collection is not available"})
+            return httpx.Response(200, json={"result": 42, "error": None})
+
+        async def run():
+            client = AnkiConnectClient()
+            client._client = httpx.AsyncClient(
+                base_url=client.url, transport=httpx.MockTransport(handler)
+            )
+            async with client:
+                deck_id = await client.create_deck("Deck")
+                with pytest.raises(AnkiConnectError):
+                    await client.add_notes([])
+                return deck_id
+
+        assert asyncio.run(run()) == 42
+        assert calls == ["createDeck", "createDeck", "addNotes"]
+
+
+class TestLLMCache:
+    """Tests for the LLM response cache module."""
+
+    def test_get_set_and_expiry(self, tmp_path):
+        cache = LLMCache(tmp_path / "cache.sqlite3")
+        key = LLMCache.make_key(provider="openai", user="prompt", temperature=0)
+
+        assert cache.get(key) is None
+        cache.set(key, "response ✓")
+        assert cache.get(key) == "response ✓"
+        assert LLMCache.make_key(temperature=0, user="prompt", provider="openai") == key
+
+        cache.set(key, "stale", ttl=-1)
+        assert cache.get(key) is None
+        cache.close()
+
+    def test_key_normalization_and_purge(self, tmp_path):
+        cache = LLMCache(tmp_path / "cache.sqlite3")
+        key = LLMCache.make_key(user="line one\r\nline two\n", temperature=0)
+
+        assert key == LLMCache.make_key(user="  line one\nline two", temperature=0)
+
+        cache.set(key, "response", model="model-a")
+        cache.set("other", "response", model="model-b")
+        assert cache.purge(model="model-a") == 1
+        assert cache.get(key) is None
+        assert cache.get("other") == "response"
+        cache.close()
+
+    def test_semantic_cache_matches_within_scope(self):
+        cache = SemanticCache(threshold=0.95)
+        cache.set("scope-a", [1.0, 0.0, 0.0], "cached")
+
+        assert cache.get("scope-a", [2.0, 0.1, 0.0]) == "cached"
+        assert cache.get("scope-a", [0.0, 1.0, 0.0]) is None
+        assert cache.get("scope-b", [1.0, 0.0, 0.0]) is None
+
+
+class TestLLMInterface:
+    """Tests for the LLM interface module."""
+
+    def test_json_schema_from_example(self):
+        schema = json_schema_from_example({"cards": [{"front": "Q", "back": "A"}], "count": 1})
+
+        assert schema["required"] == ["cards", "count"]
+        assert schema["additionalProperties"] is False
+        assert schema["properties"]["count"] == {"type": "integer"}
+        card_schema = schema["properties"]["cards"]["items"]
+        assert card_schema["properties"]["front"] == {"type": "string"}
+
+    def test_format_artifacts_memoized_by_identity(self):
+        output_format = {"cards": [{"front": "", "back": ""}]}
+
+        artifacts = _format_artifacts(output_format)
+
+        assert json.loads(artifacts.description) == output_format
+        assert _format_artifacts(output_format).schema is artifacts.schema
+        assert _format_artifacts(dict(output_format)).schema is not artifacts.schema
+
+    def test_shape_check(self):
+        check = _format_artifacts({"cards": [{"front": ""}], "summary": ""}).check
+
+        assert check({"cards": [], "summary": "x"}) is None
+        assert check([]) == "expected a JSON object"
+        assert check({"cards": []}) == 'missing key "summary"'
+        assert check({"cards": {}, "summary": ""}) == '"cards" must be an array'
+
+    def test_structured_output_uses_anthropic_tool_input(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("config.settings.ANTHROPIC_API_KEY", "test-key")
+        llm = LLMInterface(provider="anthropic", cache=LLMCache(tmp_path / "cache.sqlite3"))
+        llm.client = MagicMock()
+        tool_block = MagicMock(type="tool_use", input={"cards": []})
+        message = MagicMock(content=[tool_block])
+        llm.client.messages.create.return_value = message
+        llm.client.messages.stream.return_value.__enter__.return_value.get_final_message.return_value = message
+        output_format = {"cards": [{"front": "", "back": ""}]}
+
+        result = llm.generate_structured_output("prompt", output_format, max_tokens=1000)
+
+        assert result == {"cards": []}
+        call_kwargs = llm.client.messages.create.call_args.kwargs
+        assert call_kwargs["tool_choice"]["type"] == "tool"
+        assert call_kwargs["system"][0]["cache_control"] == {"type": "ephemeral"}
+
+        # Large output budgets go through the streaming API
+        assert llm.generate_structured_output("prompt", output_format, max_tokens=32768) == result
+        assert llm.client.messages.stream.call_args.kwargs["max_tokens"] == 32768
+        assert llm.client.messages.create.call_count == 1
+
+    def test_prompted_structured_output_recovers_fenced_json_after_prose(self, monkeypatch):
+        monkeypatch.setattr("config.settings.OPENAI_API_KEY", "test-key")
+        llm = LLMInterface(provider="openai", cache=None)
+        llm.client = MagicMock()
+        llm.client.chat.completions.create.return_value.choices = [
+            MagicMock(message=MagicMock(content='Here are the cards:\n```json\n{"cards": []}\n```'))
+        ]
+
+        assert llm.generate_structured_output("prompt", {"cards": []}) == {"cards": []}
+        assert llm.client.chat.completions.create.call_count == 1
+        assert "stop" not in llm.client.chat.completions.create.call_args.kwargs
+
+    def test_structured_output_caches_only_parsed_replies(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("config.settings.OPENAI_API_KEY", "test-key")
+        llm = LLMInterface(provider="openai", cache=LLMCache(tmp_path / "cache.sqlite3"))
+        llm._completer = MagicMock(side_effect=["not json", '{"cards": []}', '{"cards": []}'])
+
+        assert llm.generate_structured_output("prompt", {"cards": []}) == {"cards": []}
+        # The malformed first reply was not cached, so the re-run asks again
+        assert llm.generate_structured_output("prompt", {"cards": []}) == {"cards": []}
+        assert llm._completer.call_count == 3
+        # ...and its valid reply is served from the cache from then on
+        assert llm.generate_structured_output("prompt", {"cards": []}) == {"cards": []}
+        assert llm._completer.call_count == 3
+
+    def test_native_json_rejection_is_remembered_across_instances(self, monkeypatch):
+        monkeypatch.setattr("config.settings.OPENAI_API_KEY", "test-key")
+        monkeypatch.setattr("modules.llm_interface._NATIVE_JSON_UNSUPPORTED", set())
+        rejection = openai.BadRequestError(
+            "json_schema not supported",
+            response=httpx.Response(400, request=httpx.Request("POST", "https://api.openai.com")),
+            body=None,
+        )
+        reply = MagicMock(choices=[MagicMock(message=MagicMock(content='{"cards": []}'))])
+
+        first = LLMInterface(provider="openai", cache=None)
+        first.client = MagicMock()
+        first.client.chat.completions.create.side_effect = [rejection, reply]
+        assert first.generate_structured_output("prompt", {"cards": []}) == {"cards": []}
+
+        second = LLMInterface(provider="openai", cache=None)
+        second.client = MagicMock()
+        second.client.chat.completions.create.return_value = reply
+        assert second.generate_structured_output("prompt", {"cards": []}) == {"cards": []}
+        assert second.client.chat.completions.create.call_count == 1
+        assert "response_format" not in second.client.chat.completions.create.call_args.kwargs
+
+    def test_semantic_cache_matches_source_text_not_shared_template(self, monkeypatch):
+        monkeypatch.setattr("config.settings.OPENAI_API_KEY", "test-key")
+        llm = LLMInterface(
+            provider="openai", cache=None, semantic_cache=SemanticCache(threshold=0.95)
+        )
+        template = "Make flashcards from the content below.\n\n"
+        # Whole prompts embed alike because the shared template dominates them
+        llm._embed = lambda text: (
+            [1.0, 0.0] if text.startswith(template) else [0.0, 1.0] if "cells" in text else [0.6, 0.8]
+        )
+        llm._completer = MagicMock(return_value='{"cards": []}')
+
+        for chunk in ("Mitochondria power cells.", "Jupiter is the largest planet."):
+            llm.generate_structured_output(template + chunk, {"cards": []}, source_text=chunk)
+
+        assert llm._completer.call_count == 2
+
+    def test_iter_json_array_items_yields_items_as_they_complete(self):
+        text = '```json\n{"improved_cards": [{"front": "Q1?", "back": "[A1]"}, {"front": "Q2?", "back": "A2"}]}\n```'
+        chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+
+        items = list(iter_json_array_items(chunks, "improved_cards"))
+
+        assert items == [{"front": "Q1?", "back": "[A1]"}, {"front": "Q2?", "back": "A2"}]
+        assert list(iter_json_array_items(["[1", "2, 3]"], "missing")) == []
+        assert list(iter_json_array_items(['{"n": [1', "2, 3]}"], "n")) == [12, 3]
+
+    def test_generate_completions_batch_keeps_prompt_order(self, monkeypatch):
+        monkeypatch.setattr("config.settings.OPENAI_API_KEY", "test-key")
+        llm = LLMInterface(provider="openai", cache=None)
+        llm._completer = lambda prompt, system_prompt, **kwargs: prompt.upper()
+
+        assert llm.generate_completions_batch(["a", "b", "c"], concurrency=2) == ["A", "B", "C"]
+        assert llm.generate_completions_batch([]) == []
+
+    def test_cache_none_disables_the_shared_cache(self, monkeypatch):
+        monkeypatch.setattr("config.settings.OPENAI_API_KEY", "test-key")
+
+        with patch("modules.llm_interface.get_default_cache") as default_cache:
+            assert LLMInterface(provider="openai", cache=None).cache is None
+            default_cache.assert_not_called()
+
+    def test_async_completion_uses_semantic_cache_without_exact_cache(self, monkeypatch):
+        monkeypatch.setattr("config.settings.OPENAI_API_KEY", "test-key")
+        llm = LLMInterface(
+            provider="openai", cache=None, semantic_cache=SemanticCache(threshold=0.95)
+        )
+        llm._embed = lambda text: [1.0, 0.0] if "cards" in text else [0.0, 1.0]
+        llm._acompleter = MagicMock(side_effect=lambda *args, **kwargs: asyncio.sleep(0, "fresh"))
+
+        assert asyncio.run(llm.agenerate_completion("make cards")) == "fresh"
+        assert asyncio.run(llm.agenerate_completion("make some cards")) == "fresh"
+        assert llm._acompleter.call_count == 1
+        assert asyncio.run(llm.agenerate_completion("other")) == "fresh"
+        assert llm._acompleter.call_count == 2
+
+    def test_retry_delay_honours_retry_after(self):
+        import anthropic
+        import openai
+
+        def rate_limited(headers):
+            response = MagicMock(status_code=429, headers=headers)
+            return openai.RateLimitError("Too many requests", response=response, body=None)
+
+        assert _retry_delay(rate_limited({"retry-after": "2"}), 0) == 2.0
+        assert _retry_delay(rate_limited({"retry-after-ms": "50"}), 0) == 0.25
+        assert _retry_delay(rate_limited({"retry-after": "600"}), 0) == 60.0
+        assert 1.0 <= _retry_delay(rate_limited({}), 0) < 2.0
+        assert _retry_delay(rate_limited({"retry-after": "2"}), 5) is None
+        assert _retry_delay(openai.APIConnectionError(request=MagicMock()), 0) == 1.0
+        assert _retry_delay(anthropic.APITimeoutError(request=MagicMock()), 0) == 1.0
+        assert _retry_delay(ValueError("rate limit exceeded"), 0) is None
+
+    def test_encode_pdf_pages_keeps_selected_pages(self, monkeypatch, tmp_path):
+        import base64
+
+        import fitz
+
+        pdf_path = tmp_path / "doc.pdf"
+        with fitz.open() as doc:
+            for number in range(3):
+                doc.new_page().insert_text((72, 72), f"page {number}")
+            doc.save(pdf_path)
+        monkeypatch.setattr("config.settings.ANTHROPIC_API_KEY", "test-key")
+        llm = LLMInterface(provider="anthropic", cache=LLMCache(tmp_path / "cache.sqlite3"))
+
+        data, pages = llm._encode_pdf_pages_to_base64(pdf_path, [2, 0, 7])
+
+        assert pages == [2, 0]
+        with fitz.open(stream=base64.b64decode(data), filetype="pdf") as subset:
+            assert [page.get_text().strip() for page in subset] == ["page 2", "page 0"]
+
+    def test_strip_fences(self):
+        assert _strip_fences('```json\n{"a": 1}\n```') == '{"a": 1}'
+        assert _strip_fences('  ```\n[1]\n```\n') == "[1]"
+        assert _strip_fences(' {"a": "```"} ') == '{"a": "```"}'
+        assert _strip_fences('```json\n{"a": 1}') == '{"a": 1}'
+
+    def test_generate_from_pdf_serves_repeats_from_cache(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("config.settings.ANTHROPIC_API_KEY", "test-key")
+        llm = LLMInterface(provider="anthropic", cache=LLMCache(tmp_path / "cache.sqlite3"))
+        llm._call_anthropic_with_pdf = MagicMock(return_value="cards")
+        pdf_path = tmp_path / "doc.pdf"
+        pdf_path.write_bytes(b"%PDF-1.4 test")
+
+        assert llm.generate_from_pdf(pdf_path, "prompt") == "cards"
+        assert llm.generate_from_pdf(pdf_path, "prompt") == "cards"
+        assert llm._call_anthropic_with_pdf.call_count == 1
+
+        pdf_path.write_bytes(b"%PDF-1.4 changed")
+        llm.generate_from_pdf(pdf_path, "prompt")
+        assert llm._call_anthropic_with_pdf.call_count == 2
+
+    def test_structured_from_pdf_encodes_once_across_retries(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("config.settings.ANTHROPIC_API_KEY", "test-key")
+        llm = LLMInterface(provider="anthropic", cache=None)
+        llm._call_anthropic_with_pdf = MagicMock(side_effect=["not json", '{"cards": []}'])
+        pdf_path = tmp_path / "doc.pdf"
+        pdf_path.write_bytes(b"%PDF-1.4 test")
+
+        with patch.object(llm, "_encode_pdf_to_base64", return_value="cGRm") as encode:
+            result = llm.generate_structured_from_pdf(pdf_path, "prompt", {"cards": []})
+
+        assert result == {"cards": []}
+        assert encode.call_count == 1
+        assert llm._call_anthropic_with_pdf.call_count == 2
+
+    def test_encode_image_reuses_cached_encoding(self, monkeypatch, tmp_path):
+        monkeypatch.setattr("config.settings.OPENAI_API_KEY", "test-key")
+        llm = LLMInterface(provider="openai", cache=None)
+        image_path = tmp_path / "figure.PNG"
+        image_path.write_bytes(b"image bytes")
+
+        with patch("modules.llm_interface._b64encode_file", return_value="encoded") as encode:
+            assert llm._encode_image_to_base64(image_path) == ("encoded", "image/png")
+            assert llm._encode_image_to_base64(image_path) == ("encoded", "image/png")
+            assert encode.call_count == 1
+
+            image_path.write_bytes(b"new image bytes")
+            llm._encode_image_to_base64(image_path)
+            assert encode.call_count == 2
+
+    def test_parse_json_response_recovers_object_from_prose(self):
+        response = 'Here you go: {"cards": [{"front": "Why {x}?", "back": "a \\"}\\""}]} Hope it helps!'
+
+        assert LLMInterface._parse_json_response(response) == {
+            "cards": [{"front": "Why {x}?", "back": 'a "}"'}]
+        }
+        with pytest.raises(json.JSONDecodeError):
+            LLMInterface._parse_json_response("no json here")
+
+    def test_b64encode_file_matches_whole_file_encoding(self, tmp_path):
+        import base64
+
+        for size in (0, 1, 3 * 64 * 1024, 3 * 64 * 1024 + 2):
+            data = bytes(i % 251 for i in range(size))
+            path = tmp_path / f"file{size}.bin"
+            path.write_bytes(data)
+
+            assert _b64encode_file(path) == base64.b64encode(data).decode("ascii")
+
+    def test_retry_on_rate_limit_retries_then_returns(self):
+        import openai
+
+        rate_limited = openai.RateLimitError(
+            "Too many requests", response=MagicMock(status_code=429), body=None
+        )
+        call = MagicMock(side_effect=[rate_limited, "ok"])
+
+        with patch("modules.llm_interface.time.sleep") as sleep:
+            assert _retry_on_rate_limit(call, 1, key="v") == "ok"
+
+        assert call.call_count == 2
+        call.assert_called_with(1, key="v")
+        sleep.assert_called_once()
+
+        failing = MagicMock(side_effect=ValueError("rate limit mentioned in a message"))
+        with pytest.raises(ValueError):
+            _retry_on_rate_limit(failing)
+        assert failing.call_count == 1
@@ -4,13 +4,15 @@ Pipeline Module
 Coordinates the entire flashcard generation process.
 """
 
+import asyncio
+import contextlib
 import logging
 import time
 from pathlib import Path
 
 from tqdm import tqdm
 
-from config.settings import DEFAULT_LLM_PROVIDER
+from config import settings
 from modules.anki_integration import AnkiExporter
 from modules.card_generation import CardGenerator, FlashCard
 from modules.llm_interface import LLMInterface
@@ -22,16 +24,24 @@ logger = logging.getLogger(__name__)
 class Pipeline:
     """Main pipeline for coordinating the flashcard generation process."""
 
-    def __init__(self, llm_provider: str = DEFAULT_LLM_PROVIDER, max_cards: int = 50):
+    def __init__(
+        self,
+        llm_provider: str | None = None,
+        max_cards: int = 50,
+        max_concurrency: int = 8,
+    ):
         """
         Initialize the pipeline.
 
         Args:
-            llm_provider: LLM provider to use
+            llm_provider: LLM provider to use; defaults to DEFAULT_LLM_PROVIDER
             max_cards: Maximum number of cards to generate in total
+            max_concurrency: Maximum number of chunks processed concurrently
         """
+        llm_provider = llm_provider or settings.DEFAULT_LLM_PROVIDER
         self.llm_provider = llm_provider
         self.max_cards = max_cards
+        self.max_concurrency = max_concurrency
 
         # Initialize components
         self.pdf_processor = PDFProcessor()
@@ -55,20 +65,55 @@ class Pipeline:
         Returns:
             Deduplicated list of FlashCard objects
         """
-        seen_fronts = set()
-        unique_cards = []
-
+        # Keyed by normalized front (lowercase, stripped); setdefault keeps the
+        # first card per key and the dict preserves first-seen order
+        by_front: dict[str, FlashCard] = {}
+        keep_first = by_front.setdefault
         for card in cards:
-            # Normalize the front text for comparison (lowercase, strip whitespace)
-            normalized_front = card.front.lower().strip()
-
-            if normalized_front not in seen_fronts:
-                seen_fronts.add(normalized_front)
-                unique_cards.append(card)
+            keep_first(card.front.lower().strip(), card)
+        unique_cards = list(by_front.values())
 
         logger.info(f"Deduplicated cards: {len(cards)} → {len(unique_cards)}")
         return unique_cards
 
+    async def _generate_cards(self, chunks: list[str], metadata: dict) -> list[FlashCard]:
+        """
+        Generate and validate cards, running up to max_concurrency chunks at once.
+
+        A new chunk starts whenever one finishes, and chunks still in flight
+        are cancelled once max_cards is reached instead of paying for every
+        chunk up front.
+
+        Args:
+            chunks: Content chunks from the PDF
+            metadata: Document metadata
+
+        Returns:
+            Generated cards, in chunk order, capped at max_cards
+        """
+        all_cards = []
+        cards_needed = self.max_cards
+        if cards_needed <= 0:
+            return all_cards
+
+        results = self.card_generator.iter_generate_all(
+            chunks, metadata, max_concurrency=self.max_concurrency
+        )
+
+        # Use tqdm for a progress bar
+        with tqdm(total=len(chunks), desc="Generating cards", unit="chunk") as progress:
+            async with contextlib.aclosing(results):
+                async for improved_cards in results:
+                    progress.update(1)
+
+                    # Add the cards to our collection
+                    all_cards.extend(improved_cards[:cards_needed])
+                    cards_needed -= len(improved_cards)
+                    if cards_needed <= 0:
+                        break
+
+        return all_cards
+
     def run(self, pdf_path: str | Path, output_path: str | Path | None = None) -> dict:
         """
         Run the full pipeline to generate flashcards from a PDF.
@@ -90,28 +135,8 @@ class Pipeline:
         chunks, metadata = self.pdf_processor.process_pdf(pdf_path)
         logger.info(f"Processed PDF into {len(chunks)} chunks")
 
-        # Step 2: Generate cards from chunks
-        all_cards = []
-        cards_needed = self.max_cards
-
-        # Use tqdm for a progress bar
-        for chunk in tqdm(chunks, desc="Generating cards", unit="chunk"):
-            # Skip if we've reached the maximum number of cards
-            if cards_needed <= 0:
-                break
-
-            # Generate cards from the current chunk
-            chunk_cards = self.card_generator.generate_cards_from_chunk(chunk, metadata)
-
-            # Validate and improve the generated cards
-            improved_cards = self.card_generator.validate_cards(chunk_cards)
-
-            # Add the cards to our collection
-            all_cards.extend(improved_cards[:cards_needed])
-            cards_needed -= len(improved_cards)
-
-            # Small delay to avoid rate limits
-            time.sleep(0.5)
+        # Step 2: Generate cards from chunks (concurrently, in one event loop)
+        all_cards = asyncio.run(self._generate_cards(chunks, metadata))
 
         # Step 3: Deduplicate cards
         unique_cards = self._deduplicate_cards(all_cards)